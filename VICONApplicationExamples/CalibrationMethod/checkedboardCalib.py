@@ -118,7 +118,7 @@ while True:
 
     if k == ord('m') :
         h, w = img.shape[:2]
-        mapx, mapy = cv2.initUndistortRectifyMap(mtx, dist, None, newcameramtx, (w, h), 5)
+        mapx, mapy = cv2.initUndistortRectifyMap(mtx, dist, None, newcameramtx, (w, h), cv2.CV_16SC2)
         dst = cv2.remap(img, mapx, mapy, cv2.INTER_LINEAR)
         # crop the image
         x, y, w, h = roi
@@ -7,9 +7,13 @@ The image projection indicate accuracy of the marker tracking.
 
 import cv2 as cv
 from VICONSystem import systemInit as system
+from VICONSystem import videoVicon
+from VICONSystem import featureSet
 from VICONFileOperations import settingsGenerator
 import os
-from VICONFileOperations import rwOperations
+from VICONMath import sessionProjection
+from VICONMath import frameSelection
+from VICONMath import imageOperations as imageOp
 
 # Debug Function to print the calibration Information
 def printCalibInformation(camInstances):
@@ -23,7 +27,7 @@ def printCalibInformation(camInstances):
         print("Camera Type", camera["cameraType"])
 
 def getFeaturesInViconSpace(viconObjects,transformationParamDict):
-    featureDictViconSpace = {}
+    featureDictViconSpace = featureSet.FeatureSet(3)
     # Loop through objects, if tracked then transfer those feature from object space to vicon space
     for j in range(len(viconObjects)):
         objName = viconObjects[j].__getattribute__("name")
@@ -76,7 +80,23 @@ def makeEntryToFile(fileName, frameNo):
     file.close()
 
 
-def main(settingsFile, writeVideo = False):
+def showFullResolution(event, x, y, flags, param):
+    """
+    Mouse callback of the proxy windows, a left click shows the full resolution region around the clicked point
+    :param param: (ProxyVideoVicon, dict with the displayed frame no)
+    :return: None
+    """
+    if event != cv.EVENT_LBUTTONDOWN:
+        return
+    video, state = param
+    image = video.getFullResolutionFrame(state["frameNo"])
+    if image is None:
+        return
+    roi, valid = imageOp.computeRoiArray(video.proxyToFullResolution([x, y]), image.shape[0], image.shape[1], size=200)
+    if valid:
+        cv.imshow("fullResolution", image[roi[2]:roi[3], roi[0]:roi[1]])
+
+def main(settingsFile, writeVideo = False, useProxies = True):
     projectSettings = settingsGenerator.xmlSettingsParser(settingsFile)
     directoryName = projectSettings.settingsDict["rootDirectory"]
 
@@ -93,10 +113,17 @@ def main(settingsFile, writeVideo = False):
     c3dDataObject = viconSystemData.c3dDataObject
     viconObjects = viconSystemData.viconObjects
 
-    videoObjects = viconSystemData.viconVideoObjects
+    videoObjects = list(viconSystemData.viconVideoObjects)
     viconCamObjects = viconSystemData.viconCameraObjets
     imageObjects = viconSystemData.viconImageObjects
 
+    # Browse the low resolution proxies if they are generated (generateProxyVideos.py), features are scaled for drawing
+    featureScales = [None] * len(videoObjects)
+    if useProxies:
+        for j in range(len(videoObjects)):
+            if os.path.exists(videoVicon.proxyFileName(videoObjects[j].videoFilePath)):
+                videoObjects[j] = videoVicon.ProxyVideoVicon(videoObjects[j].videoFilePath, videoObjects[j].objectID)
+                featureScales[j] = 1 / videoObjects[j].scale
 
     #setting up 3D File
     c3dDataObject.printMetaData()
@@ -104,13 +131,16 @@ def main(settingsFile, writeVideo = False):
     subjects = ["backpack","head"] # todo : Important to know which names exist in the c3d data
     subjectToLableMapping = c3dDataObject.findLableMapping(subjectNames=subjects)
 
-    # Define window names
+    # Define window names, a click in a proxy window shows the region of the full resolution frame
     windowNames = []
     maxFrameNo = []
+    displayState = {"frameNo": 0}
     for video in videoObjects:
         windowNames.append(video.windowName)
         cv.namedWindow(video.windowName, cv.WINDOW_NORMAL)
         maxFrameNo.append(video.totalFrameCount)
+        if isinstance(video, videoVicon.ProxyVideoVicon):
+            cv.setMouseCallback(video.windowName, showFullResolution, (video, displayState))
 
     # Check if all videos have same number of frames and reassigns the variable to one single value
     if maxFrameNo.count(maxFrameNo[0]) == len(maxFrameNo):
@@ -152,6 +182,7 @@ def main(settingsFile, writeVideo = False):
         getFeaturesInImageSpace(imageObjects,viconCamObjects)
 
         # Get image frame and draw the information on image space
+        displayState["frameNo"] = frameNo
         for j in range(len(videoObjects)):
             tempImage = videoObjects[j].getFrame(frameNo)
             font = cv.FONT_HERSHEY_SIMPLEX
@@ -160,7 +191,7 @@ def main(settingsFile, writeVideo = False):
             cv.putText(tempImage, "Step Size : " + str(stepSize), (10, 150), font, 1,
                        (255, 255, 255), 2, cv.LINE_AA)
             if tempImage is not None:
-                imageObjects[j].drawFeatures(tempImage)
+                imageObjects[j].drawFeatures(tempImage, featureScale=featureScales[j])
                 cv.imshow(windowNames[j], tempImage)
 
         k = cv.waitKey(10)
@@ -193,9 +224,50 @@ def main(settingsFile, writeVideo = False):
             print("n : Next frame \n ")
             print("b : previous frame \n ")
             print("S : Enter frame status in log file \n ")
+            print("Click : full resolution region around the point (proxy videos) \n ")
 
         print("Program terminated frame No/totalFrame : ", frameNo, "/", maxFrameNo)
 
+def readFramesFromFile(fileName):
+    """
+    Frames already listed in the frames to capture file (same parsing as the annotation tools)
+    :param fileName: str
+    :return: list of int
+    """
+    if not os.path.exists(fileName):
+        return []
+    with open(fileName, "r") as file:
+        return [int(line.strip()) for line in file if line.strip().isdigit()]
+
+def mainAutomatic(settingsFile, noOfFrames = 100, stepSize = 2, fullyVisibleOnly = True):
+    """
+    Select the frames for annotation without user interaction. The most diverse frames (posture, visibility in the
+    cameras, tracking validity) of the whole session are appended to the frames to capture file, frames already in the
+    file are kept and the new frames are chosen to differ from them.
+    :param settingsFile: str
+    :param noOfFrames: number of frames to add
+    :param stepSize: step between candidate video frames
+    :param fullyVisibleOnly: bool, only frames with all objects tracked and all features inside all images
+    :return: array of selected video frames
+    """
+    projectSettings = settingsGenerator.xmlSettingsParser(settingsFile)
+    directoryName = projectSettings.settingsDict["rootDirectory"]
+
+    viconSystemData, projection, videoFrames, poses, validity, cameraColumns = \
+        sessionProjection.loadSessionProjection(projectSettings, stepSize, computeColumns=False)
+
+    fileToAnnotate = os.path.join(directoryName, projectSettings.settingsDict["framesToCaptureFile"])
+    previousFrames = readFramesFromFile(fileToAnnotate)
+    frames = frameSelection.selectDiverseFrames(projection, videoFrames, poses, validity, noOfFrames,
+                                                excludeFrames=previousFrames, fullyVisibleOnly=fullyVisibleOnly)
+
+    with open(fileToAnnotate, "a") as file:
+        for frameNo in frames:
+            file.write(str(frameNo) + "\n")
+
+    print("Frames added to ", fileToAnnotate, " : ", len(frames), " previous frames : ", len(previousFrames))
+    return frames
+
 
 if __name__ == '__main__':
     # In this section we pass the arguments required for the main function to perform any operation.
@@ -204,3 +276,5 @@ if __name__ == '__main__':
     settingsFile = "D:\\BirdTrackingProject\\20190618_PigeonPostureDataset\\settings_session02.xml"
 
     main(settingsFile)
+    # Selection without user interaction
+    # mainAutomatic(settingsFile, noOfFrames=100)
@@ -6,9 +6,19 @@ The final projected points are stored in the .csv file to create a database for
 
 import cv2 as cv
 from VICONSystem import systemInit as system
+from VICONSystem import featureSet
 from VICONFileOperations import settingsGenerator
 import os
+import sys
+import time
+import argparse
+import hashlib
+import json
+import tempfile
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from VICONFileOperations import rwOperations
+from VICONMath import sessionProjection
 
 # Debug Function to print the calibration Information
 def printCalibInformation(camInstances):
@@ -21,34 +31,76 @@ def printCalibInformation(camInstances):
         print("Cam ID", camera["serialNo"])
         print("Camera Type", camera["cameraType"])
 
-def getFeaturesInViconSpace(viconObjects,transformationParamDict):
-    featureDictViconSpace = {}
-    # Loop through objects, if tracked then transfer those feature from object space to vicon space
+def getFeaturesInViconSpace(viconObjects,transformationParamDict, out = None, objectOuts = None):
+    """
+    Features of the tracked objects in vicon space
+    :param out: FeatureSet returned for the previous frame, updated in place (cleared if other objects are tracked)
+    :param objectOuts: list (one per object) of FeatureSets reused by transferFeaturesToViconSpace, updated in place
+    :return: FeatureSet
+    """
+    featureDictViconSpace = featureSet.FeatureSet(3) if out is None else out
+    trackedObjects = []
     for j in range(len(viconObjects)):
         objName = viconObjects[j].__getattribute__("name")
         if transformationParamDict[objName + "_validity"] == True:
-            viconObjects[j].setTransformationParameters(transformationParamDict[objName + "_rotation"],
-                                                        transformationParamDict[objName + "_translation"])
+            trackedObjects.append(j)
 
-            featureDictViconSpace.update(viconObjects[j].transferFeaturesToViconSpace())
+    # Features of the previous frame are overwritten without changing the feature table if the same objects are tracked
+    if list(featureDictViconSpace) != [feature for j in trackedObjects for feature in viconObjects[j].featureDict]:
+        featureDictViconSpace.clear()
+
+    # Loop through objects, if tracked then transfer those feature from object space to vicon space
+    for j in trackedObjects:
+        objName = viconObjects[j].__getattribute__("name")
+        viconObjects[j].setTransformationParameters(transformationParamDict[objName + "_rotation"],
+                                                    transformationParamDict[objName + "_translation"])
+        objectFeatures = viconObjects[j].transferFeaturesToViconSpace(None if objectOuts is None else objectOuts[j])
+        if objectOuts is not None:
+            objectOuts[j] = objectFeatures
+        featureDictViconSpace.update(objectFeatures)
 
     return featureDictViconSpace
 
-def getFeaturesInCameraSpace(viconCamObjects,featureDictViconSpace):
+def setFeaturesInPlace(targetObject, features):
+    """
+    Set the features of a camera or image object for a new frame, the features are cleared only if the feature table
+    changed
+    :param targetObject: instance of ObjectVicon or ImageVicon
+    :param features: FeatureSet
+    :return: None
+    """
+    if list(targetObject.featureDict) != list(features):
+        targetObject.clearFeatures()
+    targetObject.setFeatures(features)
 
+def getFeaturesInCameraSpace(viconCamObjects,featureDictViconSpace, cameraOuts = None):
+    """
+    Transfer the features to the space of every camera
+    :param cameraOuts: list (one per camera) of FeatureSets reused by transferFeaturesToObjectSpace, updated in place
+    :return: True
+    """
     for j in range(len(viconCamObjects)):  # Loop through camera objects and find image projections
-        viconCamObjects[j].clearFeatures()
-        # Dictionary operations
-        featureDictCamSpace = viconCamObjects[j].transferFeaturesToObjectSpace(featureDictViconSpace)
-        viconCamObjects[j].setFeatures(featureDictCamSpace)
+        featureDictCamSpace = viconCamObjects[j].transferFeaturesToObjectSpace(
+            featureDictViconSpace, None if cameraOuts is None else cameraOuts[j])
+        if cameraOuts is not None:
+            cameraOuts[j] = featureDictCamSpace
+        setFeaturesInPlace(viconCamObjects[j], featureDictCamSpace)
         # print("CameraFeatures : ", featureDictCamSpace)
     return True
 
-def getFeaturesInImageSpace(imageObjects,viconCamObjects):
+def getFeaturesInImageSpace(imageObjects,viconCamObjects, imageOuts = None):
+    """
+    Project the camera space features of every camera to its image
+    :param imageOuts: list (one per camera) of FeatureSets reused by projectFeaturesFromCamSpaceToImageSpace, updated in
+                      place
+    :return: None
+    """
     for j in range(len(viconCamObjects)):  # Loop through camera objects and find image projections
-        imageObjects[j].clearFeatures()
-        imageFeaturesDict = imageObjects[j].projectFeaturesFromCamSpaceToImageSpace(viconCamObjects[j].featureDict)
-        imageObjects[j].setFeatures(imageFeaturesDict)
+        imageFeaturesDict = imageObjects[j].projectFeaturesFromCamSpaceToImageSpace(
+            viconCamObjects[j].featureDict, None if imageOuts is None else imageOuts[j])
+        if imageOuts is not None:
+            imageOuts[j] = imageFeaturesDict
+        setFeaturesInPlace(imageObjects[j], imageFeaturesDict)
         # print("ImageFeatures : ", imageFeaturesDict)
 
 def videoWriter(windowNames, FPS = 30, imageWidth = 1920, imageHeight = 1080):
@@ -79,7 +131,7 @@ def main(settingsFile, writeVideo = False, showImages = False):
     First part of software gets information about the current session, associated .csv files produced by vicon
     and calibration information for video cameras,
     """
-    viconSystemData = system.VICONSystemInit(projectSettings,directoryName)
+    viconSystemData = system.VICONSystemInit(projectSettings,directoryName, parallelLoad=True, useSnapshot=True)
     # viconSystemData.printSysteInfo()
 
     # Part 2 : Read data frame and create vicon objects
@@ -93,18 +145,13 @@ def main(settingsFile, writeVideo = False, showImages = False):
     viconCamObjects = viconSystemData.viconCameraObjets
     imageObjects = viconSystemData.viconImageObjects
 
-    # Define window names
-    windowNames = []
-    maxFrameNo = []
-    for video in videoObjects:
-        windowNames.append(video.windowName)
-        maxFrameNo.append(video.totalFrameCount)
-        if showImages:
-            cv.namedWindow(video.windowName, cv.WINDOW_NORMAL)
-
-    # Check if all videos have same number of frames and reassigns the variable to one single value
-    if maxFrameNo.count(maxFrameNo[0]) == len(maxFrameNo):
-        maxFrameNo = maxFrameNo[0]
+    # Frames of all cameras are decoded in parallel, raises error if the videos do not have same number of frames
+    videoReader = viconSystemData.loadMultiCameraReader()
+    windowNames = videoReader.windowNames
+    maxFrameNo = videoReader.totalFrameCount
+    if showImages:
+        for windowName in windowNames:
+            cv.namedWindow(windowName, cv.WINDOW_NORMAL)
 
     # Video writing
     if writeVideo:
@@ -118,25 +165,38 @@ def main(settingsFile, writeVideo = False, showImages = False):
         path = os.path.join(directoryName, dataBaseFile)
         dataBaseObjects.append( rwOperations.annotationDatabase(path, featureList, resetPreviousAnnotations= True) )
 
+    # Frames are decoded in sequence on background threads, one per camera
+    if showImages:
+        frameIterator = videoReader.iterateFrames(0, maxFrameNo, 2)
+
+    # Feature sets of the objects and cameras are reused for all frames
+    featureDictViconSpace = featureSet.FeatureSet(3)
+    objectOuts = [None] * len(viconObjects)
+    cameraOuts = [None] * len(viconCamObjects)
+    imageOuts = [None] * len(imageObjects)
+
     # Part 3 : Process frame information ( Frame by Frame or All together)
     for i in range(0,maxFrameNo,2):
 
         print("Processing data for Frame No : ", i)
+        if showImages:
+            images = next(frameIterator)[1]
         # Get all rotation and translation
         transformationParamDict = dataObject.getDataForVideoFrame(i)
-        featureDictViconSpace = getFeaturesInViconSpace(viconObjects,transformationParamDict)
+        featureDictViconSpace = getFeaturesInViconSpace(viconObjects,transformationParamDict, featureDictViconSpace,
+                                                        objectOuts)
 
         if len(featureDictViconSpace) == 0:
             print("No tracking data skip Projection for frame : ", i)
             continue
 
-        getFeaturesInCameraSpace(viconCamObjects,featureDictViconSpace)
-        getFeaturesInImageSpace(imageObjects,viconCamObjects)
+        getFeaturesInCameraSpace(viconCamObjects,featureDictViconSpace, cameraOuts)
+        getFeaturesInImageSpace(imageObjects,viconCamObjects, imageOuts)
 
         # Get image frame and draw the information on image space
         for j in range(len(videoObjects)):
             if showImages:
-                tempImage = videoObjects[j].getFrame(i)
+                tempImage = images[j]
                 if tempImage is not None:
                     #imageObjects[j].drawFeatures(image= tempImage, pointSize= 2)
                     imageObjects[j].drawPosture(tempImage)
@@ -150,7 +210,8 @@ def main(settingsFile, writeVideo = False, showImages = False):
             bBoxDict = imageObjects[j].computeBoundingBox()
             dataBaseObjects[j].updateDataBase(i, imageObjects[j].featureDict, viconCamObjects[j].featureDict, bBoxDict)
 
-        k = cv.waitKey(10)
+        # Headless runs (e.g. batchRunner.py) do not need the GUI event loop
+        k = cv.waitKey(10) if showImages else -1
         if k == ord('q'):
             cv.destroyAllWindows()
             if writeVideo:
@@ -161,6 +222,364 @@ def main(settingsFile, writeVideo = False, showImages = False):
         if k == ord('n'):
             continue
 
+    if showImages:
+        frameIterator.close()
+    videoReader.close()
+
+def getShardFileName(shardDirectory, cameraId, chunkIndex):
+    """
+    File name of the columnar shard of one camera and one chunk of frames
+    :return: str
+    """
+    return os.path.join(shardDirectory, "camera{}_chunk{:05d}.npz".format(cameraId, chunkIndex))
+
+def processChunk(projection, chunkIndex, videoFrames, poses, validity, shardDirectory, cameraIndices = None):
+    """
+    Compute the annotation of one chunk of frames for the cameras and save one shard (.npz, one array per column) per
+    camera. Executed in worker processes.
+    :param projection: instance of sessionProjection.SessionProjection
+    :param chunkIndex: int
+    :param videoFrames: array (F,) of video frames of the chunk
+    :param poses: array (F,O,7)
+    :param validity: array (F,O)
+    :param shardDirectory: str
+    :param cameraIndices: list of cameras to compute, default all cameras
+    :return: chunk index, dict {camera index: shard file}
+    """
+    if cameraIndices is None:
+        cameraIndices = list(range(len(projection.cameraIds)))
+    cameraColumns = projection.compute(videoFrames, poses, validity, cameraIndices)
+    shardFiles = {}
+    for cameraIndex, columns in zip(cameraIndices, cameraColumns):
+        shardFile = getShardFileName(shardDirectory, projection.cameraIds[cameraIndex], chunkIndex)
+        # Written under temporary name, an interrupted write does not leave a valid shard
+        temporaryFile = shardFile + ".tmp.npz"
+        np.savez(temporaryFile, **columns)
+        os.replace(temporaryFile, shardFile)
+        shardFiles[cameraIndex] = shardFile
+
+    return chunkIndex, shardFiles
+
+def computeFingerprint(*items):
+    """
+    Hash of the given arrays and values, used to detect changed inputs of the checkpointed chunks
+    :return: str
+    """
+    fingerprint = hashlib.sha1()
+    for item in items:
+        if isinstance(item, np.ndarray):
+            fingerprint.update(str((item.shape, item.dtype.str)).encode())
+            fingerprint.update(np.ascontiguousarray(item).tobytes())
+        else:
+            fingerprint.update(repr(item).encode())
+    return fingerprint.hexdigest()
+
+def loadCheckpoint(checkpointFile):
+    """
+    Read the checkpoint of a previous run
+    :return: dict {shard name: fingerprint}
+    """
+    if not os.path.exists(checkpointFile):
+        return {}
+    try:
+        with open(checkpointFile, "r") as file:
+            checkpoint = json.load(file)
+    except ValueError:
+        print("Checkpoint corrupt, all chunks are computed : ", checkpointFile)
+        return {}
+    if checkpoint.get("version") != 1:
+        return {}
+    return checkpoint["shards"]
+
+def saveCheckpoint(checkpointFile, shardFingerprints):
+    """
+    Save the fingerprints of the completed shards, the file is replaced atomically
+    :return: None
+    """
+    temporaryFile = checkpointFile + ".tmp"
+    with open(temporaryFile, "w") as file:
+        json.dump({"version": 1, "shards": shardFingerprints}, file, indent=1, sort_keys=True)
+    os.replace(temporaryFile, checkpointFile)
+
+def mergeShards(shardFiles, dataBaseObject):
+    """
+    Merge the shards of one camera (in chunk order) and write the annotation database once
+    :param shardFiles: list of shard files
+    :param dataBaseObject: instance of rwOperations.annotationDatabase
+    :return: number of frames
+    """
+    shards = [np.load(shardFile) for shardFile in shardFiles]
+    columns = {}
+    for column in dataBaseObject.defaultDataSeries:
+        columns[column] = np.concatenate([shard[column] for shard in shards]) if len(shards) != 0 else np.zeros(0)
+    for shard in shards:
+        shard.close()
+
+    dataBaseObject.updateDataBaseFromColumns(columns)
+    return len(columns["frame"])
+
+def mainHeadless(settingsFile, chunkSize = 1000, noOfWorkers = None, stepSize = 2):
+    """
+    Headless automatic annotation. The frame range is split in chunks which are projected for all frames at once in
+    worker processes, each worker writes one shard per camera and the shards are merged in the annotation databases.
+    Completed shards are recorded in a checkpoint, a restarted run only computes missing shards and shards whose
+    inputs changed.
+    :param settingsFile: str
+    :param chunkSize: number of frames per chunk
+    :param noOfWorkers: number of processes, 1 to process the chunks in this process
+    :param stepSize: step between annotated video frames
+    :return: None
+    """
+    startTime = time.perf_counter()
+    projectSettings = settingsGenerator.xmlSettingsParser(settingsFile)
+    directoryName = projectSettings.settingsDict["rootDirectory"]
+
+    viconSystemData, projection, videoFrames, poses, validity, cameraColumns = \
+        sessionProjection.loadSessionProjection(projectSettings, stepSize, computeColumns=False)
+    featureList = projection.featureList
+
+    shardDirectory = os.path.join(directoryName, projectSettings.settingsDict["session"] + ".annotationShards")
+    os.makedirs(shardDirectory, exist_ok=True)
+
+    # A shard is valid if the inputs of its camera and chunk did not change: camera parameters, object features and
+    # feature list, tracker data of the chunk and settings of the run
+    checkpointFile = os.path.join(shardDirectory, "checkpoint.json")
+    shardFingerprints = loadCheckpoint(checkpointFile)
+    featuresFingerprint = computeFingerprint(projection.featureList, projection.features, *projection.objectFeatures)
+    cameraFingerprints = [computeFingerprint(projection.cameraIds[cameraIndex], projection.cameraRotations[cameraIndex],
+                                             projection.cameraTranslations[cameraIndex],
+                                             projection.intrinsicMatrices[cameraIndex],
+                                             projection.distortionMatrices[cameraIndex])
+                          for cameraIndex in range(len(projection.cameraIds))]
+
+    chunks = [slice(start, start + chunkSize) for start in range(0, len(videoFrames), chunkSize)]
+    chunkTasks = []
+    expectedFingerprints = {}
+    for chunkIndex, chunk in enumerate(chunks):
+        chunkFingerprint = computeFingerprint(stepSize, chunkSize, videoFrames[chunk], poses[chunk], validity[chunk])
+        cameraIndices = []
+        for cameraIndex, cameraId in enumerate(projection.cameraIds):
+            shardFile = getShardFileName(shardDirectory, cameraId, chunkIndex)
+            fingerprint = computeFingerprint(featuresFingerprint, cameraFingerprints[cameraIndex], chunkFingerprint)
+            expectedFingerprints[os.path.basename(shardFile)] = fingerprint
+            if shardFingerprints.get(os.path.basename(shardFile)) != fingerprint or not os.path.exists(shardFile):
+                cameraIndices.append(cameraIndex)
+        if len(cameraIndices) != 0:
+            chunkTasks.append((chunkIndex, chunk, cameraIndices))
+
+    # Shards of removed chunks or cameras are not part of the checkpoint anymore
+    shardFingerprints = {shard: fingerprint for shard, fingerprint in shardFingerprints.items()
+                         if expectedFingerprints.get(shard) == fingerprint}
+    print("Frames : ", len(videoFrames), " Chunks : ", len(chunks), " Chunks to compute : ", len(chunkTasks))
+
+    def completeChunk(chunkIndex, shardFiles):
+        for shardFile in shardFiles.values():
+            shardFingerprints[os.path.basename(shardFile)] = expectedFingerprints[os.path.basename(shardFile)]
+        saveCheckpoint(checkpointFile, shardFingerprints)
+
+    if noOfWorkers == 1:
+        for chunkIndex, chunk, cameraIndices in chunkTasks:
+            completeChunk(*processChunk(projection, chunkIndex, videoFrames[chunk], poses[chunk], validity[chunk],
+                                        shardDirectory, cameraIndices))
+    elif len(chunkTasks) != 0:
+        with ProcessPoolExecutor(max_workers=noOfWorkers) as executor:
+            futures = [executor.submit(processChunk, projection, chunkIndex, videoFrames[chunk], poses[chunk],
+                                       validity[chunk], shardDirectory, cameraIndices)
+                       for chunkIndex, chunk, cameraIndices in chunkTasks]
+            # Checkpoint is updated as soon as a chunk is done, an interrupted run resumes with the missing chunks
+            for future in as_completed(futures):
+                completeChunk(*future.result())
+
+    dataBaseFiles = projectSettings.settingsDict["annotationDataBaseFiles"]
+    for cameraIndex, dataBaseFile in enumerate(dataBaseFiles):
+        path = os.path.join(directoryName, dataBaseFile)
+        dataBaseObject = rwOperations.annotationDatabase(path, featureList, resetPreviousAnnotations=True)
+        shardFiles = [getShardFileName(shardDirectory, projection.cameraIds[cameraIndex], chunkIndex)
+                      for chunkIndex in range(len(chunks))]
+        noOfFrames = mergeShards(shardFiles, dataBaseObject)
+        print("Annotation database : ", path, " frames : ", noOfFrames)
+
+    print("Automatic annotation finished in {:.2f} s".format(time.perf_counter() - startTime))
+
+def mainVectorized(settingsFile, stepSize = 2):
+    """
+    Whole session automatic annotation in one process, the features of all frames and cameras are projected with a few
+    array operations (same database content as main)
+    :param settingsFile: str
+    :param stepSize: step between annotated video frames
+    :return: None
+    """
+    startTime = time.perf_counter()
+    projectSettings = settingsGenerator.xmlSettingsParser(settingsFile)
+    directoryName = projectSettings.settingsDict["rootDirectory"]
+
+    viconSystemData, projection, videoFrames, poses, validity, cameraColumns = \
+        sessionProjection.loadSessionProjection(projectSettings, stepSize, computeColumns=False)
+    featureList = projection.featureList
+    projectionTime = time.perf_counter()
+    cameraColumns = projection.compute(videoFrames, poses, validity)
+    projectionTime = time.perf_counter() - projectionTime
+
+    dataBaseFiles = projectSettings.settingsDict["annotationDataBaseFiles"]
+    for dataBaseFile, columns in zip(dataBaseFiles, cameraColumns):
+        path = os.path.join(directoryName, dataBaseFile)
+        dataBaseObject = rwOperations.annotationDatabase(path, featureList, resetPreviousAnnotations=True)
+        dataBaseObject.updateDataBaseFromColumns(columns)
+        print("Annotation database : ", path, " frames : ", len(columns["frame"]))
+
+    print("Projection of {} frames : {:.3f} s ({:.0f} frames/s)".format(len(videoFrames), projectionTime,
+                                                                       len(videoFrames) / max(projectionTime, 1e-9)))
+    print("Automatic annotation finished in {:.2f} s".format(time.perf_counter() - startTime))
+
+def mainOverlayExport(settingsFile, stepSize = 2, noOfWorkers = None, outputDirectory = None, fps = 15.0):
+    """
+    Overlay videos (features, posture lines and bounding boxes) of all cameras, rendered in parallel without display
+    :param settingsFile: str
+    :param stepSize: step between annotated video frames
+    :param noOfWorkers: number of processes
+    :param outputDirectory: folder of the videos, default <rootDirectory>/<session>.overlay
+    :param fps: frame rate of the overlay videos
+    :return: dict {camera id: output file}
+    """
+    from VICONDrawingOperations import overlayRenderer
+
+    projectSettings = settingsGenerator.xmlSettingsParser(settingsFile)
+    directoryName = projectSettings.settingsDict["rootDirectory"]
+    if outputDirectory is None:
+        outputDirectory = os.path.join(directoryName, projectSettings.settingsDict["session"] + ".overlay")
+
+    viconSystemData, projection, videoFrames, poses, validity, cameraColumns = \
+        sessionProjection.loadSessionProjection(projectSettings, stepSize)
+
+    videoFiles = [video.videoFilePath for video in viconSystemData.viconVideoObjects]
+    return overlayRenderer.exportOverlayVideos(videoFiles, projection.cameraIds, cameraColumns, projection.featureList,
+                                               outputDirectory, fps=fps, noOfWorkers=noOfWorkers)
+
+def createTestSession(directory, noOfFrames = 500, noOfCameras = 2, seed = 0):
+    """
+    Synthetic session for the tests : Tracker CSV with two objects (with missing data), vicon, camera and image objects
+    :param directory: str, folder for the Tracker CSV
+    :return: data object, vicon objects, camera objects, image objects, feature list
+    """
+    from VICONSystem import objectVicon
+    from VICONSystem import imageVicon
+    from VICONMath import transformations as tf
+
+    randomGenerator = np.random.RandomState(seed)
+    objectNames = ["head", "backpack"]
+    objectFeatures = {"head": {"head_beak": [30, 0, 0], "head_leftEye": [10, 10, 5], "head_rightEye": [10, -10, 5]},
+                      "backpack": {"body_tail": [-120, 0, 0], "body_leftShoulder": [0, 30, 0]}}
+
+    # Tracker CSV : 3 header lines, column names, units, data (quaternion x,y,z,w and translation per object)
+    noOfDataFrames = 2 * noOfFrames + 1
+    quaternions = randomGenerator.normal(size=(noOfDataFrames, len(objectNames), 4))
+    translations = randomGenerator.uniform(-200, 200, size=(noOfDataFrames, len(objectNames), 3))
+    translations[..., 2] += 1000
+    data = np.concatenate([quaternions, translations], axis=2)
+    data[randomGenerator.rand(noOfDataFrames, len(objectNames)) < 0.1] = np.nan
+    columns = ["Frame", "Sub Frame"] + ["{}_{}".format(name, index) for name in objectNames for index in range(7)]
+    rows = [[frame + 1, 0] + list(data[frame].reshape(-1)) for frame in range(noOfDataFrames)]
+    # Some data frames are missing in the file
+    rows = [row for row in rows if row[0] % 17 != 0]
+
+    dataFile = os.path.join(directory, "trackerTest.csv")
+    with open(dataFile, "w") as file:
+        file.write("Objects\n100\n,," + ",".join(name + ",,,,,," for name in objectNames) + "\n")
+        file.write(",".join(columns) + "\n")
+        file.write(",".join(["" for column in columns]) + "\n")
+        for row in rows:
+            file.write(",".join("" if np.isnan(value) else repr(float(value)) for value in row) + "\n")
+    dataObject = rwOperations.TrackerDatabaseReader(dataFile, objectNames)
+
+    viconObjects = []
+    for name in objectNames:
+        viconObject = objectVicon.ObjectVicon(name=name)
+        viconObject.setFeatures(objectFeatures[name])
+        viconObjects.append(viconObject)
+
+    viconCamObjects = []
+    imageObjects = []
+    for cameraIndex in range(noOfCameras):
+        rotation = list(randomGenerator.normal(scale=0.1, size=3)) + [1]
+        viconCamObjects.append(objectVicon.ObjectVicon(tf.invertQuaternion(rotation), [0, 0, -500 * cameraIndex],
+                                                       cameraIndex))
+        intrinsicMatrix = np.array([[1500, 0, 960], [0, 1500, 540], [0, 0, 1]], dtype=np.float64)
+        distortionMatrix = np.array([[0.01, -0.001, 0, 0, 0]])
+        imageObjects.append(imageVicon.ImageVicon(cameraIndex, distortionMatrix, intrinsicMatrix))
+
+    featureList = ["head_beak", "head_leftEye", "body_tail", "body_leftShoulder", "missingFeature"]
+    return dataObject, viconObjects, viconCamObjects, imageObjects, featureList
+
+def computeLegacyAnnotation(dataObject, viconObjects, viconCamObjects, imageObjects, featureList, videoFrames):
+    """
+    Database rows of the frame by frame loop of main
+    :return: list (one per camera) of list of data series (dict)
+    """
+    dataBaseObjects = [rwOperations.annotationDatabase(os.devnull + ".csv", featureList) for camera in imageObjects]
+    cameraRows = [[] for camera in imageObjects]
+    featureDictViconSpace = featureSet.FeatureSet(3)
+    objectOuts = [None] * len(viconObjects)
+    cameraOuts = [None] * len(viconCamObjects)
+    imageOuts = [None] * len(imageObjects)
+    for i in videoFrames:
+        transformationParamDict = dataObject.getDataForVideoFrame(i)
+        featureDictViconSpace = getFeaturesInViconSpace(viconObjects, transformationParamDict, featureDictViconSpace,
+                                                        objectOuts)
+        if len(featureDictViconSpace) == 0:
+            continue
+        getFeaturesInCameraSpace(viconCamObjects, featureDictViconSpace, cameraOuts)
+        getFeaturesInImageSpace(imageObjects, viconCamObjects, imageOuts)
+
+        for j in range(len(imageObjects)):
+            bBoxDict = imageObjects[j].computeBoundingBox()
+            dataSeries = dataBaseObjects[j].defaultDataSeries.copy()
+            dataSeries["frame"] = i
+            dataBaseObjects[j].updateDataSeries(dataSeries, imageObjects[j].featureDict, "2D")
+            dataBaseObjects[j].updateDataSeries(dataSeries, viconCamObjects[j].featureDict, "3D")
+            dataBaseObjects[j].updateDataSeries(dataSeries, bBoxDict, "bBox")
+            cameraRows[j].append(dataSeries)
+
+    return cameraRows
+
+def testVectorizedEquivalence(noOfFrames = 500, tolerance = 1e-6):
+    """
+    Compare the database content of the vectorized path with the frame by frame loop on a synthetic session and print
+    the frames per second of both paths
+    :return: bool, True if the content is the same
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        dataObject, viconObjects, viconCamObjects, imageObjects, featureList = createTestSession(directory, noOfFrames)
+        videoFrames = np.arange(0, noOfFrames, 2)
+
+        startTime = time.perf_counter()
+        legacyRows = computeLegacyAnnotation(dataObject, viconObjects, viconCamObjects, imageObjects, featureList,
+                                             videoFrames)
+        legacyTime = time.perf_counter() - startTime
+
+        startTime = time.perf_counter()
+        projection = sessionProjection.SessionProjection(viconObjects, viconCamObjects, imageObjects, featureList)
+        poses, validity = sessionProjection.getPosesForVideoFrames(dataObject, videoFrames)
+        cameraColumns = projection.compute(videoFrames, poses, validity)
+        vectorizedTime = time.perf_counter() - startTime
+
+    equal = True
+    for rows, columns in zip(legacyRows, cameraColumns):
+        if len(rows) != len(columns["frame"]):
+            print("Number of frames differ : ", len(rows), len(columns["frame"]))
+            equal = False
+            continue
+        for column in projection.columns:
+            legacyValues = np.array([row[column] for row in rows], dtype=np.float64)
+            if not np.allclose(legacyValues, columns[column], rtol=0, atol=tolerance):
+                print("Column differs : ", column, np.max(np.abs(legacyValues - columns[column])))
+                equal = False
+
+    print("Frames with data : ", [len(rows) for rows in legacyRows], " / ", len(videoFrames))
+    print("Frame by frame : {:.0f} frames/s, vectorized : {:.0f} frames/s".format(
+        len(videoFrames) / legacyTime, len(videoFrames) / max(vectorizedTime, 1e-9)))
+    print("Vectorized path equivalent : ", equal)
+    return equal
+
 
 if __name__ == '__main__':
     # In this section we pass the arguments required for the main function to perform any operation.
@@ -168,7 +587,22 @@ if __name__ == '__main__':
 
     settingsFile = "D:\\BirdTrackingProject\\20190620_PigeonPostureDataset4\\settings_session07.xml"
 
-    main(settingsFile, showImages= True)
-
-
-
+    parser = argparse.ArgumentParser(description="Project the features of the tracked objects to the annotation databases")
+    parser.add_argument("settingsFile", nargs="?", default=settingsFile)
+    parser.add_argument("--vectorized", action="store_true", help="Whole session at once without display")
+    parser.add_argument("--headless", action="store_true", help="Chunks of frames in worker processes without display")
+    parser.add_argument("--overlay", action="store_true", help="Overlay videos of all cameras without display")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes for --headless and --overlay")
+    parser.add_argument("--test", action="store_true", help="Compare vectorized and frame by frame path (benchmark)")
+    arguments = parser.parse_args()
+
+    if arguments.test:
+        sys.exit(0 if testVectorizedEquivalence() else 1)
+    elif arguments.vectorized:
+        mainVectorized(arguments.settingsFile)
+    elif arguments.headless:
+        mainHeadless(arguments.settingsFile, noOfWorkers=arguments.workers)
+    elif arguments.overlay:
+        mainOverlayExport(arguments.settingsFile, noOfWorkers=arguments.workers)
+    else:
+        main(arguments.settingsFile, showImages= True)
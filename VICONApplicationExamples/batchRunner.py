@@ -0,0 +1,153 @@
+"""
+The file runs one pipeline stage headless for all sessions of a dataset.
+1. The settings files (settings_*.xml) are discovered under the dataset root.
+2. The sessions are processed in a process pool, the output of each session is written to its own log file.
+3. Completed sessions are marked with a .done file and skipped in the next run (unless forced). Sessions without input
+   for the stage (e.g. no Nexus file for the validation) are reported as skipped and not marked.
+4. A summary (.csv) with status and duration of all sessions is written to the dataset root.
+"""
+
+import argparse
+import contextlib
+import glob
+import importlib
+import json
+import os
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+
+# Pipeline stages that can run without user interaction : (module, function, keyword arguments)
+pipelineStages = {
+    "proxies": ("VICONApplicationExamples.generateProxyVideos", "main", {}),
+    "validation": ("VICONApplicationExamples.exampleNexusProjectionToImage", "main", {"validateOnly": True}),
+    # Sessions already run in parallel, the chunks of a session are processed in the session process
+    "automaticAnnotation": ("VICONApplicationExamples.automaticAnnotationTool", "mainHeadless", {"noOfWorkers": 1}),
+    "triangulation": ("VICONApplicationExamples.createFeaturesUsingAnnotation", "mainBatch", {}),
+}
+
+
+def discoverSettingsFiles(datasetRoot, pattern = "settings_*.xml"):
+    """
+    Find the settings files of all sessions under the dataset root
+    :param datasetRoot: str
+    :param pattern: file name pattern of the settings files
+    :return: sorted list of paths
+    """
+    return sorted(glob.glob(os.path.join(datasetRoot, "**", pattern), recursive=True))
+
+
+def getSessionName(settingsFile):
+    """
+    Unique name of the session used for logs and markers, the name of the folder and the settings file
+    :param settingsFile: str
+    :return: str
+    """
+    folderName = os.path.basename(os.path.dirname(os.path.abspath(settingsFile)))
+    return folderName + "_" + os.path.splitext(os.path.basename(settingsFile))[0]
+
+
+def runSession(stage, settingsFile, logDirectory):
+    """
+    Run the stage for one session, executed in a worker process. The output is redirected to the log of the session.
+    :param stage: str, key of pipelineStages
+    :param settingsFile: str
+    :param logDirectory: str
+    :return: dict with session, status, duration and log file
+    """
+    sessionName = getSessionName(settingsFile)
+    logFile = os.path.join(logDirectory, sessionName + ".log")
+    moduleName, functionName, kwargs = pipelineStages[stage]
+    status = "done"
+
+    startTime = time.perf_counter()
+    with open(logFile, "w") as log, contextlib.redirect_stdout(log), contextlib.redirect_stderr(log):
+        print("Stage : ", stage, " Settings file : ", settingsFile)
+        try:
+            function = getattr(importlib.import_module(moduleName), functionName)
+            # A stage returns False if the session has nothing to process (e.g. no Nexus file for the validation)
+            if function(settingsFile, **kwargs) is False:
+                status = "skipped"
+        except Exception:
+            status = "failed"
+            traceback.print_exc(file=log)
+        duration = time.perf_counter() - startTime
+        print("Status : ", status, " Duration : {:.2f} s".format(duration))
+
+    result = {"session": sessionName, "settingsFile": settingsFile, "status": status, "duration": duration,
+              "logFile": logFile}
+    if status == "done":
+        with open(os.path.join(logDirectory, sessionName + ".done"), "w") as marker:
+            json.dump(result, marker)
+
+    return result
+
+
+def runBatch(datasetRoot, stage, noOfWorkers = 2, force = False, pattern = "settings_*.xml"):
+    """
+    Run the stage for all sessions of the dataset
+    :param datasetRoot: str
+    :param stage: str, key of pipelineStages
+    :param noOfWorkers: number of sessions processed in parallel
+    :param force: bool, process completed sessions again
+    :param pattern: file name pattern of the settings files
+    :return: data frame (pandas) of the summary
+    """
+    if stage not in pipelineStages:
+        raise ValueError("Unknown stage : " + stage + ", available stages : " + ", ".join(pipelineStages))
+
+    logDirectory = os.path.join(datasetRoot, "batchLogs", stage)
+    os.makedirs(logDirectory, exist_ok=True)
+
+    settingsFiles = discoverSettingsFiles(datasetRoot, pattern)
+    print("Sessions found : ", len(settingsFiles))
+
+    results = []
+    sessionsToRun = []
+    for settingsFile in settingsFiles:
+        markerFile = os.path.join(logDirectory, getSessionName(settingsFile) + ".done")
+        if os.path.exists(markerFile) and not force:
+            with open(markerFile, "r") as marker:
+                result = json.load(marker)
+            result["status"] = "skipped"
+            results.append(result)
+        else:
+            sessionsToRun.append(settingsFile)
+
+    startTime = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=noOfWorkers) as executor:
+        futures = {executor.submit(runSession, stage, settingsFile, logDirectory): settingsFile
+                   for settingsFile in sessionsToRun}
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+            except Exception as error:
+                # Worker process died (e.g. out of memory), no log is written by the session itself
+                settingsFile = futures[future]
+                result = {"session": getSessionName(settingsFile), "settingsFile": settingsFile,
+                          "status": "failed", "duration": float("nan"), "logFile": repr(error)}
+            print("Session : ", result["session"], " Status : ", result["status"])
+            results.append(result)
+
+    summary = pd.DataFrame(results, columns=["session", "settingsFile", "status", "duration", "logFile"])
+    summary = summary.sort_values("session").reset_index(drop=True)
+    summaryFile = os.path.join(datasetRoot, "batch_" + stage + "_summary.csv")
+    summary.to_csv(summaryFile, index=False)
+
+    print("Finished in {:.2f} s".format(time.perf_counter() - startTime))
+    print(summary["status"].value_counts().to_string())
+    print("Summary written to : ", summaryFile)
+    return summary
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Run a pipeline stage for all sessions of a dataset")
+    parser.add_argument("datasetRoot", help="Folder containing the session folders with settings files")
+    parser.add_argument("stage", choices=sorted(pipelineStages))
+    parser.add_argument("--workers", type=int, default=2, help="Number of sessions processed in parallel")
+    parser.add_argument("--force", action="store_true", help="Process completed sessions again")
+    parser.add_argument("--pattern", default="settings_*.xml", help="File name pattern of the settings files")
+    arguments = parser.parse_args()
+
+    runBatch(arguments.datasetRoot, arguments.stage, arguments.workers, arguments.force, arguments.pattern)
@@ -13,7 +13,10 @@ from VICONFileOperations import rwOperations as fileOp
 from VICONSystem import objectVicon as viconObj
 from VICONSystem import videoVicon as videoObj
 from VICONSystem import imageVicon as imageObj
+from VICONSystem import featureSet
 from VICONMath import stereoComputation as stereo
+from VICONMath import imageOperations as imageOp
+from VICONMath import sessionProjection
 import pandas as pd
 from VICONFileOperations import settingsGenerator
 
@@ -165,6 +168,15 @@ def createTriangulatedFeatures(projectSettings):
     # Create a triangulator class which would compute traingulated points for the given cameras
     stereoTriangulator = stereo.StereoTrinagulator(viconCamObjects, imageObjects)
 
+    # Feature sets of the objects and cameras are reused for all frames (arrays are reused while the features stay the
+    # same)
+    triangulatedOut = None
+    objectSpaceOuts = [None] * len(viconObjects)
+    objectOuts = [None] * len(viconObjects)
+    cameraOuts = [None] * len(viconCamObjects)
+    imageOuts = [None] * len(imageObjects)
+    transferredFeatureDictViconSpace = featureSet.FeatureSet(3)
+
     # Part 3 : Process frame wise information and triangular the features given in the annotation file
     for frameNo in commonAnnotatedFrames[0]:
 
@@ -192,7 +204,8 @@ def createTriangulatedFeatures(projectSettings):
 
         # Set features in cam space and transform features to vicon space
         viconCamObjects[0].setFeatures(triangulatedDict)
-        featureDictViconSpace = viconCamObjects[0].transferFeaturesToViconSpace()
+        featureDictViconSpace = viconCamObjects[0].transferFeaturesToViconSpace(out=triangulatedOut)
+        triangulatedOut = featureDictViconSpace
 
         print("feature dict" , featureDictViconSpace)
 
@@ -208,7 +221,9 @@ def createTriangulatedFeatures(projectSettings):
                 viconObjects[j].setTransformationParameters(transformationParamDict[object + "_rotation"],
                                                             transformationParamDict[object + "_translation"])
 
-                featureDictObjectSpace = viconObjects[j].transferFeaturesToObjectSpace(featureDictViconSpace)
+                featureDictObjectSpace = viconObjects[j].transferFeaturesToObjectSpace(featureDictViconSpace,
+                                                                                       out=objectSpaceOuts[j])
+                objectSpaceOuts[j] = featureDictObjectSpace
                 #print("Features Object Space: ", featureDictObjectSpace)
 
                 objectSpecificFeatureDict = {}
@@ -229,18 +244,22 @@ def createTriangulatedFeatures(projectSettings):
                 print("Invalid transformation for object : ", object, "for frame : ", frameNo )
 
         # Transfer all the points from object space to vicon space (Feature points + Newly traingulated points
-        transferredFeatureDictViconSpace = {}
+        transferredFeatureDictViconSpace.clear()
         for i in range(len(viconObjects)):
-            dict = viconObjects[i].transferFeaturesToViconSpace()
-            transferredFeatureDictViconSpace.update(dict)
+            objectOuts[i] = viconObjects[i].transferFeaturesToViconSpace(out=objectOuts[i])
+            transferredFeatureDictViconSpace.update(objectOuts[i])
 
         # Now transfer all points from VICON object space to Camera space
         for j in range(len(viconCamObjects)): # Loop through camera objects and find image projections
             # Dictionary operations
-            featureDictCamSpace = viconCamObjects[j].transferFeaturesToObjectSpace(transferredFeatureDictViconSpace)
+            featureDictCamSpace = viconCamObjects[j].transferFeaturesToObjectSpace(transferredFeatureDictViconSpace,
+                                                                                   out=cameraOuts[j])
+            cameraOuts[j] = featureDictCamSpace
             #print("Features vicon -> camera space : ", featureDictCamSpace)
             viconCamObjects[j].setFeatures(featureDictCamSpace)
-            imageFeaturesDict = imageObjects[j].projectFeaturesFromCamSpaceToImageSpace(featureDictCamSpace)
+            imageFeaturesDict = imageObjects[j].projectFeaturesFromCamSpaceToImageSpace(featureDictCamSpace,
+                                                                                        out=imageOuts[j])
+            imageOuts[j] = imageFeaturesDict
             imageObjects[j].setFeatures(imageFeaturesDict)
             # print("image Projections Features: ", imageObjects[j].__getattribute__("featureDict"))
 
@@ -283,10 +302,150 @@ def createTriangulatedFeatures(projectSettings):
     print("Final Point Dict: ", finalPointDict)
     fileOp.writeFeaturePointsToFile(outputFeatureFileName, finalPointDict)
 
+def readAnnotationArrays(annotationFiles, customFeatures):
+    """
+    Read the 2D annotations of all cameras once
+    :param annotationFiles: list of annotation files (.csv), one per camera
+    :param customFeatures: list of features
+    :return: array (F,) of frames annotated in all cameras, list (one per camera) of arrays (F,M,2) of points
+    """
+    annotations = [fileOp.ImageAnnotationDatabaseReader(annotationFile, customFeatures).data
+                   for annotationFile in annotationFiles]
+    frames = annotations[0]["frame"].values
+    for data in annotations[1:]:
+        frames = np.intersect1d(frames, data["frame"].values)
+
+    pointArrays = []
+    for data in annotations:
+        # First row of each frame, like ImageAnnotationDatabaseReader.getDataForVideoFrame
+        data = data.drop_duplicates("frame").set_index("frame").loc[frames]
+        points = np.zeros((len(frames), len(customFeatures), 2))
+        for index, feature in enumerate(customFeatures):
+            points[:, index, 0] = data[feature + "_x"].values
+            points[:, index, 1] = data[feature + "_y"].values
+        pointArrays.append(points)
+
+    return np.sort(frames), pointArrays
+
+def computeReprojectionErrors(viconPoints, viconCamObjects, imageObjects, pointArrays):
+    """
+    Reprojection error of the triangulated points in all cameras
+    :param viconPoints: array (F,M,3) of points in vicon space (NaN if not triangulated)
+    :param pointArrays: list (one per camera) of arrays (F,M,2) of annotated points
+    :return: array (F,M) of the largest error over the cameras (NaN if not triangulated)
+    """
+    errors = np.full(viconPoints.shape[:2], np.nan)
+    valid = ~np.any(np.isnan(viconPoints), axis=2)
+    if not np.any(valid):
+        return errors
+
+    cameraErrors = []
+    for viconCamObject, imageObject, points in zip(viconCamObjects, imageObjects, pointArrays):
+        rotationMatrixInv, translation = tf.transformationParamListToMatrix(viconCamObject.rotation,
+                                                                            viconCamObject.translation, inversion=True)
+        cameraPoints = tf.transformPointArray(viconPoints[valid], np.asarray(rotationMatrixInv),
+                                              np.asarray(translation).reshape(3), inverse=True)
+        imagePoints = imageOp.projectPointArrayCamSpaceToImgSpace(cameraPoints, imageObject.intrinsicMatrix,
+                                                                  imageObject.distortionMatrix)
+        cameraErrors.append(np.linalg.norm(imagePoints - points[valid], axis=1))
+
+    errors[valid] = np.max(cameraErrors, axis=0)
+    return errors
+
+def createTriangulatedFeaturesBatch(projectSettings, maxReprojectionError = 5.0):
+    """
+    Headless version of createTriangulatedFeatures. All annotated frames are triangulated with one call, transferred to
+    the space of the objects with the pose arrays and accepted if the reprojection error of all their features is below
+    the threshold. The 3D database, the error report and the 3D feature file are written once at the end.
+    :param projectSettings: instance of settingsGenerator.xmlSettingsParser
+    :param maxReprojectionError: largest accepted reprojection error in pixels
+    :return: data frame (pandas) of the error report
+    """
+    settingsDict = projectSettings.settingsDict
+    directoryName = settingsDict["rootDirectory"]
+    objectsToTrack = settingsDict["objectsToTrack"]
+
+    viconSystemData = system.VICONSystemInit(projectSettings, directoryName, parallelLoad=True, useSnapshot=True)
+    dataObject = viconSystemData.dataObject
+    viconCamObjects = viconSystemData.viconCameraObjets
+    imageObjects = viconSystemData.viconImageObjects
+    assert (len(viconCamObjects) == 2), "Currently triangulation not supported for more than two cameras"
+
+    annotationFiles = list(viconSystemData.generate2DAnnotationFileNames().values())
+    featureFileName = os.path.join(directoryName, settingsDict["customFeatureFile"])
+    outputFeatureFileName = os.path.join(directoryName, settingsDict["customFeatureFile3D"])
+    customFeatures = fileOp.readFeaturesFromFile(featureFileName)
+    frames, pointArrays = readAnnotationArrays(annotationFiles, customFeatures)
+    print("Frames annotated in all cameras : ", len(frames))
+
+    # Features annotated in both the images, not annotated points are stored as 0,0
+    annotated = np.any(pointArrays[0] != 0, axis=2) & np.any(pointArrays[1] != 0, axis=2)
+    cameraPoints = np.full(annotated.shape + (3,), np.nan)
+    cameraPoints[annotated] = stereo.triangulatePointArray(imageObjects[0], viconCamObjects[0], imageObjects[1],
+                                                           viconCamObjects[1], pointArrays[0][annotated],
+                                                           pointArrays[1][annotated])
+    # Camera 1 space -> vicon space
+    rotationMatrix, translation = tf.transformationParamListToMatrix(viconCamObjects[0].rotation,
+                                                                     viconCamObjects[0].translation)
+    viconPoints = tf.transformPointArray(cameraPoints, np.asarray(rotationMatrix), np.asarray(translation).reshape(3))
+    errors = computeReprojectionErrors(viconPoints, viconCamObjects, imageObjects, pointArrays)
+
+    # Vicon space -> space of the object the feature belongs to (object name must be in feature name)
+    poses, validity = sessionProjection.getPosesForVideoFrames(dataObject, frames)
+    columns = {"frame": frames}
+    stored = np.zeros(annotated.shape, dtype=bool)
+    for feature in customFeatures:
+        columns[feature + "_x"] = np.zeros(len(frames))
+        columns[feature + "_y"] = np.zeros(len(frames))
+        columns[feature + "_z"] = np.zeros(len(frames))
+    for object in objectsToTrack:
+        featureIndex = [index for index, feature in enumerate(customFeatures) if object in feature]
+        # Poses are in the order of the objects of the data reader
+        objectIndex = dataObject.objectsToTrack.index(object)
+        objectValidity = validity[:, objectIndex]
+        if len(featureIndex) == 0 or not np.any(objectValidity):
+            continue
+        pose = poses[objectValidity, objectIndex]
+        rotationMatrixInv = tf.quaternionViconArrayToMatrix(pose[:, 0:4], inversion=True)
+        objectPoints = tf.transformPointArray(viconPoints[objectValidity][:, featureIndex], rotationMatrixInv,
+                                              pose[:, 4:7], inverse=True)
+        for position, index in enumerate(featureIndex):
+            valid = annotated[objectValidity, index]
+            rows = np.flatnonzero(objectValidity)[valid]
+            for axis, suffix in enumerate(["_x", "_y", "_z"]):
+                columns[customFeatures[index] + suffix][rows] = objectPoints[valid, position, axis]
+            stored[rows, index] = True
+
+    # Frame is accepted if all its stored features reproject within the threshold
+    with np.errstate(invalid='ignore'):
+        frameErrors = np.max(np.where(stored, errors, 0), axis=1)
+    accepted = np.any(stored, axis=1) & (frameErrors <= maxReprojectionError)
+
+    dataFrame3DFeatures = pd.DataFrame(columns)[accepted].reset_index(drop=True)
+    dataFrame3DFeatures.to_csv(os.path.join(directoryName, settingsDict["dataFile3D"]), index=False)
+
+    report = pd.DataFrame({"frame": frames, "triangulatedFeatures": np.sum(stored, axis=1),
+                           "maxReprojectionError": np.where(np.any(stored, axis=1), frameErrors, np.nan),
+                           "accepted": accepted})
+    for index, feature in enumerate(customFeatures):
+        report[feature + "_error"] = errors[:, index]
+    reportFile = os.path.join(directoryName, settingsDict["dataFile3D"] + ".reprojectionErrors.csv")
+    report.to_csv(reportFile, index=False)
+    print("Accepted frames : ", int(np.sum(accepted)), "/", len(frames), " Error report : ", reportFile)
+
+    finalPointDict = getFinalPoints(dataFrame3DFeatures, customFeatures)
+    print("Final Point Dict: ", finalPointDict)
+    fileOp.writeFeaturePointsToFile(outputFeatureFileName, finalPointDict)
+    return report
+
 def main(settingsFile):
     projectSettings = settingsGenerator.xmlSettingsParser(settingsFile)
     createTriangulatedFeatures(projectSettings)
 
+def mainBatch(settingsFile, maxReprojectionError = 5.0):
+    projectSettings = settingsGenerator.xmlSettingsParser(settingsFile)
+    return createTriangulatedFeaturesBatch(projectSettings, maxReprojectionError)
+
 
 if __name__ == '__main__':
     # In this section we pass the arguments required for the main function to perform any operation.
@@ -294,5 +453,7 @@ if __name__ == '__main__':
 
     settingsFile = "D:\\BirdTrackingProject\\20190618_PigeonPostureDataset\\settings_session02.xml"
     main(settingsFile)
+    # Without user interaction, frames are accepted by the reprojection error
+    # mainBatch(settingsFile, maxReprojectionError=5.0)
 
 
@@ -8,6 +8,7 @@ on the image space.
 
 import cv2 as cv
 from VICONSystem import systemInit as system
+from VICONSystem import featureSet
 from VICONFileOperations import settingsGenerator
 import os
 from VICONFileOperations import rwOperations
@@ -24,7 +25,7 @@ def printCalibInformation(camInstances):
         print("Camera Type", camera["cameraType"])
 
 def getFeaturesInViconSpace(viconObjects,transformationParamDict):
-    featureDictViconSpace = {}
+    featureDictViconSpace = featureSet.FeatureSet(3)
     # Loop through objects, if tracked then transfer those feature from object space to vicon space
     for j in range(len(viconObjects)):
         objName = viconObjects[j].__getattribute__("name")
@@ -5,12 +5,12 @@ and project them directly on the image space.
 """
 
 import cv2 as cv
-import pandas as pd
 from VICONSystem import systemInit as system
+from VICONSystem import featureSet
 from VICONFileOperations import settingsGenerator
 import os
 from VICONFileOperations import rwOperations
-from VICONMath import mathPointOperations as pointOp
+from VICONMath import sessionDiscrepancy as discrepancy
 
 # Debug Function to print the calibration Information
 def printCalibInformation(camInstances):
@@ -24,7 +24,7 @@ def printCalibInformation(camInstances):
         print("Camera Type", camera["cameraType"])
 
 def getFeaturesInViconSpace(viconObjects,transformationParamDict):
-    featureDictViconSpace = {}
+    featureDictViconSpace = featureSet.FeatureSet(3)
     # Loop through objects, if tracked then transfer those feature from object space to vicon space
     for j in range(len(viconObjects)):
         objName = viconObjects[j].__getattribute__("name")
@@ -73,26 +73,58 @@ def createFeaturesForNexus(trackingObjects):
 
     return list
 
-def updateDistDataFrame(frameNo, dict1, dict2, dataFrame):
-    allObjectFeatures = dataFrame.columns
-    allObjectFeatures["Frame"] = frameNo
-    distanceDict = pointOp.pointDistance3D(dict1, dict2)
-    allObjectFeatures.update(distanceDict)
-    dataFrame.append(allObjectFeatures)
+def validateSession(dataObject, nexusDataObject, viconObjects, outputPrefix):
+    """
+    Compare Tracker and Nexus points for the whole session and write the error summary and the full error array
+    :param dataObject: instance of TrackerDatabaseReader
+    :param nexusDataObject: instance of NexusDatabaseReader
+    :param viconObjects: list of vicon objects
+    :param outputPrefix: str, path of the report files without extension
+    :return: data frame (pandas) of the summary
+    """
+    comparison = discrepancy.SessionDiscrepancy(dataObject, nexusDataObject, viconObjects)
+    comparison.compute()
+    summary = comparison.writeReport(outputPrefix)
+    print("Tracker vs Nexus error per marker : \n", summary)
+    return summary
 
-def main(settingsFile, writeVideo = False):
+def getNexusDataFile(projectSettings, nexusFile = None):
+    """
+    Path of the Nexus output of the session, given directly or from the settings file (files/nexusDataFile)
+    :param projectSettings: instance of xmlSettingsParser
+    :param nexusFile: str, file name relative to the root directory (or absolute path), None to use the settings file
+    :return: str or None if the session has no Nexus file
+    """
+    if nexusFile is None:
+        nexusFile = projectSettings.settingsDict.get("nexusDataFile")
+    if nexusFile is None:
+        return None
 
+    nexusDataset = os.path.join(projectSettings.settingsDict["rootDirectory"], nexusFile)
+    if not os.path.exists(nexusDataset):
+        return None
+    return nexusDataset
+
+def main(settingsFile, writeVideo = False, validateOnly = False, nexusFile = None):
+    """
+    Project the Tracker and Nexus points to the images, with validateOnly only the Tracker vs Nexus report is written
+    :param settingsFile: str
+    :param writeVideo: bool
+    :param validateOnly: bool
+    :param nexusFile: str, Nexus output relative to the root directory, None to read it from the settings file
+    :return: False if the session has no Nexus file (nothing done), None otherwise
+    """
     projectSettings = settingsGenerator.xmlSettingsParser(settingsFile)
     directoryName = projectSettings.settingsDict["rootDirectory"]
 
-    # Hacking the file path
-    nexusDataset = os.path.join(directoryName, "nexus\\20190618_PigeonPostureDataset_session02_skeleton.csv")
+    nexusDataset = getNexusDataFile(projectSettings, nexusFile)
+    if nexusDataset is None:
+        print("No Nexus file for the session, skipped : ", settingsFile)
+        return False
 
-    nexusFeatures = []
-    if os.path.exists(nexusDataset):
-        trackingObjects = projectSettings.settingsDict["objectsToTrack"]
-        swapTrackingObjects = [trackingObjects[1],trackingObjects[0]]
-        nexusFeatures = createFeaturesForNexus(swapTrackingObjects)
+    trackingObjects = projectSettings.settingsDict["objectsToTrack"]
+    swapTrackingObjects = [trackingObjects[1],trackingObjects[0]]
+    nexusFeatures = createFeaturesForNexus(swapTrackingObjects)
 
     # Part 1 : Get system information
     """
@@ -107,6 +139,12 @@ def main(settingsFile, writeVideo = False):
 
     viconObjects = viconSystemData.viconObjects
 
+    # Compare Tracker and Nexus points for all frames at once
+    outputPrefix = os.path.join(directoryName, projectSettings.settingsDict["session"] + ".trackerVsNexus")
+    validateSession(dataObject, nexusDataObject, viconObjects, outputPrefix)
+    if validateOnly:
+        return
+
     # Create video objects
     videoFiles = viconSystemData.sessionVideoFiles #  __getattribute__("sessionVideoFiles")
     #viconSystemData.loadCustomTrackingFeaturesToTrackingObjects()
@@ -134,23 +172,12 @@ def main(settingsFile, writeVideo = False):
         path = os.path.join(directoryName, dataBaseFile)
         dataBaseObjects.append( rwOperations.annotationDatabase(path, featureList, resetPreviousAnnotations= True) )
 
-    allObjectFeatures = {"Frame": 0}
-    for object in viconObjects:
-        objectFeatures = object.featureDict
-        allObjectFeatures.update(objectFeatures)
-
-    testDataFrame = pd.DataFrame(columns= list(allObjectFeatures))
-
     pause = False
     # Part 3 : Process frame information ( Frame by Frame or All together)
     startValue = 150
     for i in range(startValue,maxFrameNo,2):
 
         print("Processing data for Frame No : ", i)
-        prevFeatureDictViconSpaceNexus = {}
-        if i != startValue :
-            prevFeatureDictViconSpaceNexus = featureDictViconSpaceNexus.copy()
-
         featureDictViconSpaceNexus = nexusDataObject.getDataForVideoFrame(i)
         print("Feature Nexus ", featureDictViconSpaceNexus)
         # Get all rotation and translation
@@ -158,16 +185,6 @@ def main(settingsFile, writeVideo = False):
         featureDictViconSpace = getFeaturesInViconSpace(viconObjects,transformationParamDict)
         print("Feature  : ", featureDictViconSpace)
 
-
-        # Add frame number
-        if i != startValue:
-        #updateDistDataFrame(i,prevFeatureDictViconSpaceNexus,featureDictViconSpaceNexus, testDataFrame)
-            allObjectFeatures["Frame"] = i
-            distanceDict = pointOp.pointDistance3D(prevFeatureDictViconSpaceNexus, featureDictViconSpaceNexus)
-            allObjectFeatures.update(distanceDict)
-            testDataFrame = testDataFrame.append(allObjectFeatures, ignore_index = True)
-
-
         featureDictViconSpace.update(featureDictViconSpaceNexus)
         #print("Feature Updated : ", featureDictViconSpace)
 
@@ -205,7 +222,6 @@ def main(settingsFile, writeVideo = False):
 
         k = cv.waitKey(waitValue)
         if k == ord('q'):
-            testDataFrame.to_csv("distData.csv", index= False)
             cv.destroyAllWindows()
             break
 
@@ -220,8 +236,9 @@ if __name__ == '__main__':
     # In this section we pass the arguments required for the main function to perform any operation.
     # Mostly it is the system information for calibration and the location of the VICON file
     settingsFile = "D:\\BirdTrackingProject\\20190618_PigeonPostureDataset\\settings_session02.xml"
+    nexusFile = "nexus\\20190618_PigeonPostureDataset_session02_skeleton.csv"
 
-    main(settingsFile)
+    main(settingsFile, nexusFile = nexusFile)
 
 
 
@@ -0,0 +1,183 @@
+"""
+The file extracts crops centred on keypoints and bounding boxes for all annotated frames of a session.
+1. The features of all frames are projected to all cameras at once (sessionProjection) and the crop windows of every
+   frame, camera and keypoint are computed as arrays.
+2. The frame range of every camera is split in chunks processed by a process pool, every frame is decoded once in
+   sequence and all its crops are cut as views of the frame.
+3. The crops are written as <output>/camera<id>/<frame>_<keypoint>.jpg, throughput and written bytes are reported.
+"""
+
+import os
+import sys
+import time
+import cv2 as cv
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from VICONSystem import videoVicon
+from VICONFileOperations import settingsGenerator
+from VICONMath import sessionProjection
+from VICONMath import imageOperations as imageOp
+
+
+def computeBoundingBoxWindows(columns, rows, cols):
+    """
+    Crop windows of the bounding boxes of the annotation columns
+    :param columns: dict {column: array} of sessionProjection.SessionProjection.compute
+    :param rows: image height
+    :param cols: image width
+    :return: array (F,4) of int windows [x1, x2, y1, y2], array (F,) bool validity
+    """
+    corners = np.stack([columns["lCorner_2d_x"], columns["rCorner_2d_x"],
+                        columns["lCorner_2d_y"], columns["rCorner_2d_y"]], axis=1)
+    windows = np.stack([np.minimum(corners[:, 0], corners[:, 1]), np.maximum(corners[:, 0], corners[:, 1]),
+                        np.minimum(corners[:, 2], corners[:, 3]), np.maximum(corners[:, 2], corners[:, 3])], axis=1)
+    windows = np.clip(np.trunc(windows), 0, [cols, cols, rows, rows]).astype(np.int64)
+    valid = np.any(corners != 0, axis=1) & (windows[:, 1] > windows[:, 0]) & (windows[:, 3] > windows[:, 2])
+    return windows, valid
+
+
+def computeCropWindows(columns, keypoints, includeBoundingBox, rows, cols, size = 100):
+    """
+    Crop windows of all frames of one camera
+    :param columns: dict {column: array} of sessionProjection.SessionProjection.compute
+    :param keypoints: list of features
+    :param includeBoundingBox: bool, add the bounding box as crop named "bBox"
+    :param rows: image height
+    :param cols: image width
+    :param size: half size of the keypoint windows
+    :return: list of crop names, array (F,K,4) of windows, array (F,K) validity
+    """
+    names = list(keypoints)
+    points = np.zeros((len(columns["frame"]), len(keypoints), 2))
+    for index, keypoint in enumerate(keypoints):
+        points[:, index, 0] = columns[keypoint + "_2d_x"]
+        points[:, index, 1] = columns[keypoint + "_2d_y"]
+    windows, valid = imageOp.computeRoiArray(points, rows, cols, size)
+
+    if includeBoundingBox:
+        boxWindows, boxValid = computeBoundingBoxWindows(columns, rows, cols)
+        names.append("bBox")
+        windows = np.concatenate([windows, boxWindows[:, np.newaxis]], axis=1)
+        valid = np.concatenate([valid, boxValid[:, np.newaxis]], axis=1)
+
+    return names, windows, valid
+
+
+def extractChunk(videoFile, cameraId, frames, names, windows, valid, outputDirectory, roiSize = 400, quality = 95):
+    """
+    Decode the frames of one chunk in sequence and write all their crops, executed in worker processes
+    :param videoFile: str
+    :param cameraId: camera id used in the output directory
+    :param frames: array (F,) of frames
+    :param names: list of crop names
+    :param windows: array (F,K,4)
+    :param valid: array (F,K)
+    :param outputDirectory: str
+    :param roiSize: size of the written crops, None to keep the size of the window
+    :param quality: JPEG quality
+    :return: number of crops, number of bytes written, number of decoded frames
+    """
+    cameraDirectory = os.path.join(outputDirectory, "camera{}".format(cameraId))
+    os.makedirs(cameraDirectory, exist_ok=True)
+    video = videoVicon.VideoVicon(videoFile, cameraId)
+
+    noOfCrops = 0
+    noOfBytes = 0
+    noOfFrames = 0
+    keep = np.any(valid, axis=1)
+    frameIterator = video.iterateFrames(frameNumbers=frames[keep])
+    for (frameNo, image), frameWindows, frameValid in zip(frameIterator, windows[keep], valid[keep]):
+        noOfFrames += 1
+        if image is None:
+            print("Frame could not be decoded, skip : ", frameNo, " camera : ", cameraId)
+            continue
+        for name, window, isValid in zip(names, frameWindows, frameValid):
+            if not isValid:
+                continue
+            # View on the frame, no copy of the full image
+            crop = image[window[2]:window[3], window[0]:window[1]]
+            if crop.size == 0:
+                continue
+            if roiSize is not None:
+                crop = cv.resize(crop, (roiSize, roiSize), interpolation=cv.INTER_AREA)
+            ret, encoded = cv.imencode(".jpg", crop, [cv.IMWRITE_JPEG_QUALITY, quality])
+            with open(os.path.join(cameraDirectory, "{:06d}_{}.jpg".format(int(frameNo), name)), "wb") as file:
+                file.write(encoded.tobytes())
+            noOfCrops += 1
+            noOfBytes += encoded.nbytes
+    frameIterator.close()
+
+    return noOfCrops, noOfBytes, noOfFrames
+
+
+def extractCrops(videoFiles, cameraIds, cameraColumns, keypoints, outputDirectory, includeBoundingBox = True,
+                 roiSize = 400, size = 100, chunkSize = 500, noOfWorkers = None, imageSizes = None):
+    """
+    Extract the crops of all cameras in parallel
+    :param videoFiles: list of video files, one per camera
+    :param cameraIds: list of camera ids
+    :param cameraColumns: list (one per camera) of dict {column: array} of sessionProjection.SessionProjection.compute
+    :param keypoints: list of features
+    :param outputDirectory: str
+    :param includeBoundingBox: bool, also extract the bounding boxes
+    :param roiSize: size of the written crops
+    :param size: half size of the keypoint windows
+    :param chunkSize: number of frames per task
+    :param noOfWorkers: number of processes
+    :param imageSizes: list of (height, width) of the videos, default 1080 x 1920
+    :return: dict with crops, bytes, frames and duration
+    """
+    startTime = time.perf_counter()
+    if imageSizes is None:
+        imageSizes = [(1080, 1920)] * len(videoFiles)
+    tasks = []
+    for videoFile, cameraId, columns, (rows, cols) in zip(videoFiles, cameraIds, cameraColumns, imageSizes):
+        names, windows, valid = computeCropWindows(columns, keypoints, includeBoundingBox, rows, cols, size)
+        frames = np.asarray(columns["frame"], dtype=np.int64)
+        for start in range(0, len(frames), chunkSize):
+            chunk = slice(start, start + chunkSize)
+            tasks.append((videoFile, cameraId, frames[chunk], names, windows[chunk], valid[chunk], outputDirectory,
+                          roiSize))
+
+    statistics = {"crops": 0, "bytes": 0, "frames": 0}
+    with ProcessPoolExecutor(max_workers=noOfWorkers) as executor:
+        futures = [executor.submit(extractChunk, *task) for task in tasks]
+        for future in as_completed(futures):
+            noOfCrops, noOfBytes, noOfFrames = future.result()
+            statistics["crops"] += noOfCrops
+            statistics["bytes"] += noOfBytes
+            statistics["frames"] += noOfFrames
+
+    statistics["duration"] = time.perf_counter() - startTime
+    print("Crops : {} Frames decoded : {} Written : {:.1f} MB".format(statistics["crops"], statistics["frames"],
+                                                                     statistics["bytes"] / 1e6))
+    print("Duration : {:.2f} s Throughput : {:.1f} crops/s {:.1f} frames/s".format(
+        statistics["duration"], statistics["crops"] / max(statistics["duration"], 1e-9),
+        statistics["frames"] / max(statistics["duration"], 1e-9)))
+    return statistics
+
+
+def main(settingsFile, keypoints = ("body_leftShoulder",), includeBoundingBox = True, stepSize = 2, roiSize = 400,
+         noOfWorkers = None, outputDirectory = None):
+    projectSettings = settingsGenerator.xmlSettingsParser(settingsFile)
+    directoryName = projectSettings.settingsDict["rootDirectory"]
+    if outputDirectory is None:
+        outputDirectory = os.path.join(directoryName, projectSettings.settingsDict["session"] + ".crops")
+
+    viconSystemData, projection, videoFrames, poses, validity, cameraColumns = \
+        sessionProjection.loadSessionProjection(projectSettings, stepSize, computeColumns=False)
+    missing = [keypoint for keypoint in keypoints if keypoint not in projection.featureList]
+    if len(missing) != 0:
+        raise ValueError("Keypoints not in the feature file : " + ", ".join(missing))
+    cameraColumns = projection.compute(videoFrames, poses, validity)
+
+    videoFiles = [video.videoFilePath for video in viconSystemData.viconVideoObjects]
+    return extractCrops(videoFiles, projection.cameraIds, cameraColumns, list(keypoints), outputDirectory,
+                        includeBoundingBox, roiSize, noOfWorkers=noOfWorkers, imageSizes=projection.imageSizes)
+
+
+if __name__ == '__main__':
+    defaultSettingFile = "D:\\BirdTrackingProject\\20190620_PigeonPostureDataset4\\settings_session07.xml"
+    if len(sys.argv) > 1:
+        defaultSettingFile = sys.argv[1]
+    main(defaultSettingFile)
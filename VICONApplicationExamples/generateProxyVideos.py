@@ -0,0 +1,28 @@
+"""
+The file generates low resolution proxies (MJPEG, all frames are keyframes) of the session videos. The frame selection
+tools browse the proxies if they exist, only the annotation view decodes the full resolution videos.
+The proxies are saved next to the videos as <video>.proxy.avi, the videos of the cameras are transcoded in parallel.
+"""
+
+import os
+import sys
+from VICONSystem import videoVicon
+from VICONFileOperations import settingsGenerator
+
+
+def main(settingsFile, scale = 0.25, overwrite = False):
+    projectSettings = settingsGenerator.xmlSettingsParser(settingsFile)
+    settings = projectSettings.settingsDict
+
+    videoFiles = [os.path.join(settings["rootDirectory"], videoFile) for videoFile in settings["videoFiles"]]
+    proxyFiles = videoVicon.generateProxyVideos(videoFiles, scale=scale, overwrite=overwrite)
+
+    for videoFile, proxyFile in zip(videoFiles, proxyFiles):
+        print(videoFile, " -> ", proxyFile)
+
+
+if __name__ == '__main__':
+    defaultSettingFile = "D:\\BirdTrackingProject\\20190620_PigeonPostureDataset4\\settings_session07.xml"
+    if len(sys.argv) > 1:
+        defaultSettingFile = sys.argv[1]
+    main(defaultSettingFile)
@@ -8,25 +8,23 @@
 """
 
 from vicon_dssdk import ViconDataStream
+from VICONSystem import dataStreamClient
 from VICONMath import absoluteOrientation
 from VICONFileOperations import rwOperations
-import numpy as np
 from VICONMath import transformations
 
 def main(**kwargs):
-    #call for the vicon client
-    client = ViconDataStream.Client()
-    print('Connecting')
-    while not client.IsConnected():
-        print('.')
-        if kwargs and kwargs['IP']:
-            remoteAddress = kwargs['IP']
-            client.Connect(remoteAddress + ':801')
-        else:
-            client.Connect('localhost:801')
-
-    #To control stream reading
-    i = 0
+    """
+    Frames are received by dataStreamClient on its own thread, the pose computation reads the arrays of the frame
+    records (subject order of the subjects list) without SDK calls
+    :param IP: address of Tracker or Nexus
+    :param path: folder of the .mp files of the subjects
+    :param subjects: list of subjects
+    :param client: object with the ViconDataStream.Client interface (e.g. dataStreamReplay.ReplayViconClient)
+    :param noOfFrames: number of processed frames
+    """
+    remoteAddress = kwargs.get('IP') or 'localhost'
+    noOfFrames = kwargs.get('noOfFrames', 10)
 
     #Read marker positions
     subjectPath = kwargs['path']
@@ -37,72 +35,50 @@ def main(**kwargs):
         markerPositionsArray = rwOperations.readFeaturePointsFromViconFileAsArray(path=subjectPath + "{}.mp".format(subject))
         markerPositionsinSubjectFrameDict[subject] = markerPositionsArray
 
+    streamClient = dataStreamClient.DataStreamClient(remoteAddress + ':801', client=kwargs.get('client'),
+                                                     subjects=subjectNames, readQuality=True)
+    print('Connecting')
     try:
-        while client.IsConnected() and i < 10:
-
-            rotation_matrix_vicon = 0
-            translation_vicon = 0
-            #Enable required readout
-            client.EnableMarkerData()
-            client.EnableSegmentData()
-
-
-            if client.GetFrame():
-                # Get the frame data
-                #client.ClearSubjectFilter()
-                #client.AddToSubjectFilter('object1')
-                #client.GetFrame()
-                # Part 1 - Set reading configuration
-                frame = client.GetFrameNumber()
-                subjects = client.GetSubjectNames()
-                print('Frame: {}, Subjects: {} '.format(frame,subjects))
-                for subject in subjects:
+        with streamClient:
+            #To control stream reading
+            i = 0
+            while i < noOfFrames:
+                frame = streamClient.getFrame(timeout=5.0)
+                if frame is None:
+                    print("No frame received")
+                    break
+
+                print('Frame: {}, Subjects: {} '.format(frame.frameNumber, frame.subjectNames))
+                for subjectIndex, subject in enumerate(frame.subjectNames):
                     print("Subject for pose : {}".format(subject))
-                    segments = client.GetSegmentNames(subject)
-                    for segment in segments:
-                        """
-                        Important: Note that the R/t is not streamed with Nexus, It is only streamed with Tracker 
-                        """
-                        rotation_quat, occlusion = client.GetSegmentGlobalRotationQuaternion(subject, segment)
-                        translation_vicon, occlusion = client.GetSegmentGlobalTranslation(subject, segment)
-
-                        if occlusion is True:
-                            print("The subject is occluded or it is filtered by the stream reader.")
-
-                        # rotation_euler, occlusion = client.GetSegmentGlobalRotationEulerXYZ(subject, segment)
-                        translation_vicon = np.array(translation_vicon)# tuple to array conversion
-                        translation_vicon = translation_vicon.reshape(3,1)
-                        rotation_quat_list = list(rotation_quat)
-                        print("Rotation: {} , Translations: {} ".format(rotation_quat, translation_vicon))
-                        #Convert the list to a matrix
-                        rotation_matrix_vicon = transformations.quaternionViconListToMatrix(rotation_quat_list)
+                    """
+                    Important: Note that the R/t is not streamed with Nexus, It is only streamed with Tracker 
+                    """
+                    if frame.segmentOcclusions[subjectIndex]:
+                        print("The subject is occluded or it is filtered by the stream reader.")
+
+                    # Views on the frame record, (3,1) translation and quaternion of the root segment
+                    translation_vicon = frame.translations[subjectIndex].reshape(3,1)
+                    rotation_quat = frame.rotations[subjectIndex]
+                    print("Rotation: {} , Translations: {} ".format(rotation_quat, translation_vicon))
+                    #Convert the list to a matrix
+                    rotation_matrix_vicon = transformations.quaternionViconListToMatrix(list(rotation_quat))
 
                     """Printing quality of the pose according to the VICON computation"""
-                    try:
-                        print('Object Quality: ', client.GetObjectQuality(subject))  # ONLY for Tracker
-                    except ViconDataStream.DataStreamException as e:
-                        print('Not present', e)
+                    print('Object Quality: ', frame.qualities[subjectIndex])  # ONLY for Tracker, NaN otherwise
 
                     """
                     Important: Not that marker names are in sequence and useful for computer R/t without the help of 
                     the Nexus or tracker, could be useful when Nexus is used for streaming. 
                     """
-                    markerNames = client.GetMarkerNames(subject)
-                    markerPositions = []
-                    for markerName, parentSegment in markerNames:
-                        point, occlusion = client.GetMarkerGlobalTranslation(subject, markerName)
-                        # print("{}:{}".format(markerName,point))
-                        markerPositions.append(point)
-
-                    # Computing rotation translation of the object with custom code
-                    markerPositionsInViconFrame = np.array(markerPositions)
-                    if markerPositionsInViconFrame.shape == (4, 3):
-                        markerPositionsInViconFrame = markerPositionsInViconFrame.T
-
-                    try:
-                        markerPositionsInSubjectFrame = markerPositionsinSubjectFrameDict[subject]
-                    except ValueError:
-                        print("The subject names do not match with the stream")
+                    # Computing rotation translation of the object with custom code, 3xN view on the marker positions
+                    noOfMarkers = frame.noOfMarkers[subjectIndex]
+                    markerPositionsInViconFrame = frame.markerPositions[subjectIndex, :noOfMarkers].T
+
+                    markerPositionsInSubjectFrame = markerPositionsinSubjectFrameDict[subject]
+                    if markerPositionsInSubjectFrame.shape != markerPositionsInViconFrame.shape:
+                        print("The markers of the stream do not match with the subject file")
+                        continue
 
                     # Computing Error using transformation computed with VICON
                     transformedMarkerPositionsInViconFrame = transformations.transformPoints(markerPositionsInSubjectFrame, rotation_matrix_vicon, translation_vicon)
@@ -127,8 +103,7 @@ def main(**kwargs):
     except ViconDataStream.DataStreamException as e:
         print('Error', e)
 
-    print('client disconnected')
-    client.Disconnect()
+    print('client disconnected', streamClient.getStatistics())
 
 
 if __name__ == '__main__':
@@ -6,7 +6,9 @@
  Follow documentation on VICON Datastream SDK for latest information
 """
 
+import asyncio
 from vicon_dssdk import ViconDataStream
+from VICONSystem import dataStreamClient
 
 def main(**kwargs):
     #call for the client
@@ -93,9 +95,41 @@ def main(**kwargs):
     print('client disconnected')
     client.Disconnect()
 
+async def printFrames(client, noOfFrames):
+    count = 0
+    async for frame in client:
+        # Processing and printing run in the event loop, frames are received meanwhile on the client thread
+        print(frame.frameNumber, 'Subjects: ', frame.subjectNames)
+        for subjectIndex, subject in enumerate(frame.subjectNames):
+            print(" Subject {}: Rotation {} Translation {} Occluded {}".format(
+                subject, frame.rotations[subjectIndex], frame.translations[subjectIndex],
+                frame.segmentOcclusions[subjectIndex]))
+            for markerIndex, markerName in enumerate(frame.markerNames[subjectIndex]):
+                print(markerName, 'position', frame.markerPositions[subjectIndex, markerIndex], ' and occlusion',
+                      frame.markerOcclusions[subjectIndex, markerIndex])
+        count += 1
+        if count >= noOfFrames:
+            break
+
+def mainStreaming(IP = 'localhost', noOfFrames = 10, policy = dataStreamClient.dropOldest, client = None):
+    """
+    Reads the stream with the receive thread of dataStreamClient, slow printing does not delay the reception
+    :param IP: address of Tracker or Nexus
+    :param noOfFrames: number of printed frames
+    :param policy: dataStreamClient.dropOldest or dataStreamClient.dropNewest
+    :param client: object with the ViconDataStream.Client interface (e.g. dataStreamClient.FakeViconClient)
+    :return: statistics of the stream (received, dropped frames and frame gaps)
+    """
+    streamClient = dataStreamClient.DataStreamClient(IP + ':801', client=client, policy=policy)
+    with streamClient:
+        asyncio.run(printFrames(streamClient, noOfFrames))
+    statistics = streamClient.getStatistics()
+    print('client disconnected', statistics)
+    return statistics
+
 
 if __name__ == '__main__':
     # Send the
-    main(IP = '10.0.21.11')
-    #main()
+    mainStreaming(IP = '10.0.21.11')
+    #main(IP = '10.0.21.11')
 
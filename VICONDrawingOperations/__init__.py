@@ -2,4 +2,6 @@
 from VICONDrawingOperations import drawOp
 from VICONDrawingOperations import generatePointsOp
 from VICONDrawingOperations import imageAnnotation
-from VICONDrawingOperations import makeMovie
\ No newline at end of file
+from VICONDrawingOperations import makeMovie
+from VICONDrawingOperations import postureRenderer
+from VICONDrawingOperations import overlayRenderer
\ No newline at end of file
@@ -1,7 +1,19 @@
 # The file contains list of functions which will draw the content on the given image file
 import cv2 as cv
+import numpy as np
+from functools import lru_cache
 from VICONDrawingOperations import generatePointsOp as pointGen
 
+# Edges of the 3D bounding box (corner indices of generatePointsOp.getBoundingBox)
+boundingBoxEdges = np.array([[0, 3], [0, 1], [0, 4], [2, 1], [2, 6], [2, 3],
+                             [5, 1], [5, 6], [5, 4], [7, 4], [7, 6], [7, 3]])
+
+# Posture lines (first feature, second feature, BGR color)
+defaultSkeleton = [("head_beak", "head_leftEye", (0, 0, 255)),
+                   ("head_beak", "head_rightEye", (0, 255, 255)),
+                   ("body_tail", "body_leftShoulder", (255, 255, 0)),
+                   ("body_tail", "body_rightShoulder", (255, 0, 255))]
+
 
 def getColor( keyPoint):
     if "beak" in keyPoint :
@@ -27,6 +39,21 @@ def getColor( keyPoint):
     else:
         return (255,200,200)
 
+@lru_cache(maxsize=None)
+def getCachedColor(keyPoint):
+    """
+    getColor computed once per name
+    """
+    return getColor(keyPoint)
+
+def getColorTable(keyPoints):
+    """
+    Colors of the given key points, the color of each name is computed once
+    :param keyPoints: list of names
+    :return: array (N,3) of BGR colors
+    """
+    return np.array([getCachedColor(keyPoint) for keyPoint in keyPoints], dtype=np.int64).reshape(len(keyPoints), 3)
+
 def drawCoordinateAxis(undistortedImage, axisPointsImgSpace):
     """
     Draws coordinate system in the image based on the given points. Format : Origin, XAxis, YAxis, ZAxis
@@ -52,6 +79,49 @@ def drawPoint(undistortedImage, point, size = 5, color = (255,255,0) ):
     cv.circle(undistortedImage,(int(point[0]),int(point[1])),
                    size , color,-1)
 
+def groupByColor(colors):
+    """
+    Indices of consecutive elements with the same color, only runs are merged so overlapping elements are drawn in the
+    given order
+    :param colors: array (N,3)
+    :return: list of (color tuple, array of indices)
+    """
+    colors = np.asarray(colors, dtype=np.int64).reshape(-1, 3)
+    if len(colors) == 0:
+        return []
+    runStarts = np.concatenate([[0], np.flatnonzero(np.any(colors[1:] != colors[:-1], axis=1)) + 1, [len(colors)]])
+    return [(tuple(int(value) for value in colors[start]), np.arange(start, end))
+            for start, end in zip(runStarts[:-1], runStarts[1:])]
+
+def drawPointArray(undistortedImage, points, colorGroups, size = 5):
+    """
+    Draws filled points with one cv.polylines call per color, same pixels as drawPoint
+    :param undistortedImage: Image Matrix
+    :param points: array (N,2)
+    :param colorGroups: list of (color, indices) of groupByColor
+    :param size: radius of the points
+    """
+    # Zero length segment with thickness 2*size is the filled circle of radius size
+    segments = np.repeat(np.trunc(np.asarray(points, dtype=np.float64)).astype(np.int32)[:, np.newaxis], 2, axis=1)
+    for color, indices in colorGroups:
+        if len(indices) != 0:
+            cv.polylines(undistortedImage, list(segments[indices]), False, color, 2 * size)
+
+def drawLineArray(undistortedImage, firstPoints, secondPoints, colorGroups, lineWidth = 3):
+    """
+    Draws lines between pairs of points with one cv.polylines call per color
+    :param undistortedImage: Image Matrix
+    :param firstPoints: array (N,2)
+    :param secondPoints: array (N,2)
+    :param colorGroups: list of (color, indices) of groupByColor
+    :param lineWidth: int
+    """
+    segments = np.stack([firstPoints, secondPoints], axis=1)
+    segments = np.trunc(np.asarray(segments, dtype=np.float64)).astype(np.int32)
+    for color, indices in colorGroups:
+        if len(indices) != 0:
+            cv.polylines(undistortedImage, list(segments[indices]), False, color, lineWidth)
+
 def drawMarkerPoints (undistortedImage, markerProjections, size = 5):
     """
     Projects markers on the image, markers belong to single pattern
@@ -62,37 +132,13 @@ def drawMarkerPoints (undistortedImage, markerProjections, size = 5):
 
 
 def drawBoundingBox(undistortedImage, bBoxPoints):
-    # Line 1-4, 1-2, 1-5
-    cv.line(undistortedImage, (int(bBoxPoints[0][0]), int(bBoxPoints[0][1])),
-            (int(bBoxPoints[3][0]), int(bBoxPoints[3][1])), (0, 255, 0), 1)
-    cv.line(undistortedImage, (int(bBoxPoints[0][0]), int(bBoxPoints[0][1])),
-            (int(bBoxPoints[1][0]), int(bBoxPoints[1][1])), (0, 255, 0), 1)
-    cv.line(undistortedImage, (int(bBoxPoints[0][0]), int(bBoxPoints[0][1])),
-            (int(bBoxPoints[4][0]), int(bBoxPoints[4][1])), (0, 255, 0), 1)
-
-    # Line 3-2, 3-7, 3-4
-    cv.line(undistortedImage, (int(bBoxPoints[2][0]), int(bBoxPoints[2][1])),
-            (int(bBoxPoints[1][0]), int(bBoxPoints[1][1])), (0, 255, 0), 1)
-    cv.line(undistortedImage, (int(bBoxPoints[2][0]), int(bBoxPoints[2][1])),
-            (int(bBoxPoints[6][0]), int(bBoxPoints[6][1])), (0, 255, 0), 1)
-    cv.line(undistortedImage, (int(bBoxPoints[2][0]), int(bBoxPoints[2][1])),
-            (int(bBoxPoints[3][0]), int(bBoxPoints[3][1])), (0, 255, 0), 1)
-
-    # Line 6-2, 6-7, 6-5
-    cv.line(undistortedImage, (int(bBoxPoints[5][0]), int(bBoxPoints[5][1])),
-            (int(bBoxPoints[1][0]), int(bBoxPoints[1][1])), (0, 255, 0), 1)
-    cv.line(undistortedImage, (int(bBoxPoints[5][0]), int(bBoxPoints[5][1])),
-            (int(bBoxPoints[6][0]), int(bBoxPoints[6][1])), (0, 255, 0), 1)
-    cv.line(undistortedImage, (int(bBoxPoints[5][0]), int(bBoxPoints[5][1])),
-            (int(bBoxPoints[4][0]), int(bBoxPoints[4][1])), (0, 255, 0), 1)
-
-    # Line 8-5, 8-7, 8-4
-    cv.line(undistortedImage, (int(bBoxPoints[7][0]), int(bBoxPoints[7][1])),
-            (int(bBoxPoints[4][0]), int(bBoxPoints[4][1])), (0, 255, 0), 1)
-    cv.line(undistortedImage, (int(bBoxPoints[7][0]), int(bBoxPoints[7][1])),
-            (int(bBoxPoints[6][0]), int(bBoxPoints[6][1])), (0, 255, 0), 1)
-    cv.line(undistortedImage, (int(bBoxPoints[7][0]), int(bBoxPoints[7][1])),
-            (int(bBoxPoints[3][0]), int(bBoxPoints[3][1])), (0, 255, 0), 1)
+    """
+    Draws the 12 edges of the projected 3D bounding box with one call
+    :param undistortedImage: Image Matrix
+    :param bBoxPoints: 8 corners in image space
+    """
+    corners = np.asarray(bBoxPoints, dtype=np.float64)[:, 0:2].astype(np.int32)
+    cv.polylines(undistortedImage, list(corners[boundingBoxEdges]), False, (0, 255, 0), 1)
 
 def main():
     print("Hello this is main function, its just drawing things man")
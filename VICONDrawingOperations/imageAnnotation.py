@@ -259,7 +259,7 @@ class imageAnnotationTool:
         for i in range(len(self.videoFiles)):
             # destroy pre existing windows
             cv.destroyAllWindows()
-            videoObjects.append(vid.VideoVicon(self.videoFiles[i], i))
+            videoObjects.append(vid.VideoVicon(self.videoFiles[i], i, frameCache=vid.sharedFrameCache))
             windowName = videoObjects[i].__getattribute__("windowName")
             csvFileName = os.path.join(os.path.dirname(self.videoFiles[i]), windowName + ".csv")
 
@@ -302,30 +302,37 @@ class imageAnnotationTool:
             # Load information about annotation if it exists in the .csv file
             id = 0
             self.loadFromDatabase(int(listOfFrames[id]))
+            # State of the last drawn image, see below
+            drawnState = None
 
             while 0 <= id < len(listOfFrames):
 
                 frameNo = int(listOfFrames[id])
-                image = videoObjects[i].getFrame(frameNo)
-                clone = image.copy()
-
                 # Update points
                 self.setKeypointInfo(mode, self.point)
-                # Draw points on the image
-                self.drawKeypoints(clone, mode, frameNo)
-
-                height, width, channel = clone.shape
-
-                if (self.point[0] != 0 and self.point[1] != 0):
-                    roi = self.getRoi(height, width, 100 )
-                    roiWidth = roi[3] - roi[2] # x2 - x1
-                    roiHeight = roi[1] - roi[0] # y2 - y1
-                    roiImage = clone[roi[2]:roi[3] , roi[0]:roi[1], :]
-                    resized = cv.resize(roiImage, (400,400), interpolation = cv.INTER_AREA)
-                    clone[0:resized.shape[0], 0:resized.shape[1]] = resized
-                    cv.imshow("bBoxWindow", np.array(resized))
 
-                cv.imshow(windowName, clone)
+                # The image is only fetched and drawn again if the frame, mode or points changed, idle passes of the
+                # loop only wait for keys
+                drawState = (frameNo, mode, tuple(self.point), self.toggleAnnotationView, str(self.dataPoints))
+                if drawState != drawnState:
+                    drawnState = drawState
+                    # Frames are cached, redraws copy the cached frame instead of decoding it again
+                    clone = videoObjects[i].getFrame(frameNo)
+                    # Draw points on the image
+                    self.drawKeypoints(clone, mode, frameNo)
+
+                    height, width, channel = clone.shape
+
+                    if (self.point[0] != 0 and self.point[1] != 0):
+                        roi = self.getRoi(height, width, 100 )
+                        roiWidth = roi[3] - roi[2] # x2 - x1
+                        roiHeight = roi[1] - roi[0] # y2 - y1
+                        roiImage = clone[roi[2]:roi[3] , roi[0]:roi[1], :]
+                        resized = cv.resize(roiImage, (400,400), interpolation = cv.INTER_AREA)
+                        clone[0:resized.shape[0], 0:resized.shape[1]] = resized
+                        cv.imshow("bBoxWindow", np.array(resized))
+
+                    cv.imshow(windowName, clone)
 
                 k = cv.waitKey(10)
 
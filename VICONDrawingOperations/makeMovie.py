@@ -2,8 +2,147 @@ import matplotlib.pyplot as plt
 from matplotlib import cm
 from mpl_toolkits.mplot3d import axes3d
 import os, sys
+import queue
+import shutil
+import subprocess
+import threading
+import cv2 as cv
 import numpy as np
 
+# Codec of ffmpeg and fourcc of OpenCV used for the output extensions
+ffmpegCodecs = {'.mp4': 'libx264', '.avi': 'mjpeg', '.ogv': 'libtheora', '.gif': 'gif', '.mkv': 'libx264'}
+openCVFourcc = {'.mp4': 'mp4v', '.avi': 'MJPG', '.mkv': 'mp4v'}
+
+
+class VideoEncoderSink:
+    """
+    In process video encoder. Frames (numpy BGR images) are queued and encoded on a writer thread, either piped as raw
+    bytes to the stdin of ffmpeg or written with cv.VideoWriter if ffmpeg is not installed. The queue is bounded, write
+    blocks while the encoder is behind (back pressure), no frame is written to disk.
+    """
+    def __init__(self, output, fps = 30.0, backend = "auto", codec = None, queueSize = 8, quality = 23):
+        """
+        Initialize the sink, the encoder is started with the first frame (frame size)
+        :param output: output file, the extension selects the codec
+        :param fps: frame rate
+        :param backend: "ffmpeg", "opencv" or "auto" (ffmpeg if installed)
+        :param codec: ffmpeg codec, default from the extension
+        :param queueSize: number of frames waiting for the encoder
+        :param quality: crf of the x264 codec
+        """
+        self.output = output
+        self.fps = float(fps)
+        extension = os.path.splitext(output)[1].lower()
+        if backend == "auto":
+            backend = "ffmpeg" if shutil.which("ffmpeg") is not None else "opencv"
+        if backend == "opencv" and extension not in openCVFourcc:
+            raise ValueError("Output format {} needs ffmpeg".format(extension))
+        self.backend = backend
+        self.codec = codec if codec is not None else ffmpegCodecs.get(extension, 'libx264')
+        self.fourcc = openCVFourcc.get(extension, 'mp4v')
+        self.quality = quality
+        self.frameQueue = queue.Queue(maxsize=queueSize)
+        self.frameSize = None
+        self.thread = None
+        self.error = None
+        self.noOfFrames = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, excType, excValue, traceback):
+        self.close()
+
+    def start(self, frameSize):
+        """
+        Start the encoder and the writer thread
+        :param frameSize: (width, height)
+        :return: None
+        """
+        self.frameSize = frameSize
+        if self.backend == "ffmpeg":
+            command = ['ffmpeg', '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'bgr24',
+                       '-s', '{}x{}'.format(*frameSize), '-r', str(self.fps), '-i', '-', '-an', '-vcodec', self.codec]
+            if self.codec == 'libx264':
+                # yuv420p needs even frame size
+                command += ['-pix_fmt', 'yuv420p', '-crf', str(self.quality), '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+            encoder = subprocess.Popen(command + [self.output], stdin=subprocess.PIPE)
+        else:
+            encoder = cv.VideoWriter(self.output, cv.VideoWriter_fourcc(*self.fourcc), self.fps, frameSize, True)
+            if not encoder.isOpened():
+                raise ValueError("Video writer could not be opened : " + self.output)
+
+        self.thread = threading.Thread(target=self.run, args=(encoder,), daemon=True)
+        self.thread.start()
+
+    def run(self, encoder):
+        try:
+            while True:
+                frame = self.frameQueue.get()
+                if frame is None:
+                    break
+                if self.backend == "ffmpeg":
+                    encoder.stdin.write(frame.tobytes())
+                else:
+                    encoder.write(frame)
+        except Exception as error:
+            self.error = error
+            # Drain the queue so the producer is not blocked
+            while self.frameQueue.get() is not None:
+                pass
+        finally:
+            if self.backend == "ffmpeg":
+                try:
+                    encoder.stdin.close()
+                except OSError:
+                    pass
+                if encoder.wait() != 0 and self.error is None:
+                    self.error = RuntimeError("ffmpeg failed with code {}".format(encoder.returncode))
+            else:
+                encoder.release()
+
+    def write(self, frame):
+        """
+        Queue a frame for encoding, blocks while the queue is full
+        :param frame: BGR image (H,W,3) uint8, all frames have the same size
+        :return: None
+        """
+        if self.error is not None:
+            raise self.error
+        frame = np.ascontiguousarray(frame, dtype=np.uint8)
+        if frame.ndim == 2:
+            frame = cv.cvtColor(frame, cv.COLOR_GRAY2BGR)
+        if self.thread is None:
+            self.start((frame.shape[1], frame.shape[0]))
+        if (frame.shape[1], frame.shape[0]) != self.frameSize:
+            raise ValueError("Frame size {} differs from video size {}".format(frame.shape[1::-1], self.frameSize))
+        self.frameQueue.put(frame)
+        self.noOfFrames += 1
+
+    def close(self):
+        """
+        Encode the queued frames and finish the video
+        :return: number of written frames
+        """
+        if self.thread is not None:
+            self.frameQueue.put(None)
+            self.thread.join()
+            self.thread = None
+        if self.error is not None:
+            raise self.error
+        return self.noOfFrames
+
+
+def figure_to_image(fig):
+    """
+    Render a matplotlib figure (Agg canvas) to a BGR image without writing a file
+    :param fig: matplotlib figure
+    :return: BGR image (H,W,3) uint8
+    """
+    fig.canvas.draw()
+    image = np.asarray(fig.canvas.buffer_rgba())
+    return cv.cvtColor(image, cv.COLOR_RGBA2BGR)
+
 
 
 def make_video_from_images(fileFormat,fileName,FPS=30.0,width=1280,height=720,displayImages=False):
@@ -92,8 +231,9 @@ def make_strip(files, output, **kwargs):
 
 def rotanimate(ax, angles, output, **kwargs):
     """
-    Produces an animation (.mp4,.ogv,.gif,.jpeg,.png) from a 3D plot on
-    a 3D ax
+    Produces an animation (.mp4,.ogv,.gif,.avi,.jpeg,.png) from a 3D plot on
+    a 3D ax. The views are rendered in memory and encoded with VideoEncoderSink
+    (videos) or stacked to one image (strips), no picture files are written.
     Args:
         ax (3D axis): the ax containing the plot of interest
         angles (list): the list of angles (in degree) under which to
@@ -103,25 +243,30 @@ def rotanimate(ax, angles, output, **kwargs):
         **kwargs:
             - width : in inches
             - heigth: in inches
-            - framerate : frames per second
-            - delay : delay between frames in milliseconds
-            - repeat : True or False (.gif only)
+            - fps : frames per second
+            - delay : delay between frames in milliseconds (.gif only)
+            - elevation : elevation of the views
     """
 
-    output_ext = os.path.splitext(output)[1]
+    output_ext = os.path.splitext(output)[1].lower()
+    ax.figure.set_size_inches(kwargs.get('width', 4), kwargs.get('height', 3))
 
-    files = make_views(ax, angles, **kwargs)
+    def views():
+        for angle in angles:
+            ax.view_init(elev=kwargs.get('elevation'), azim=angle)
+            yield figure_to_image(ax.figure)
 
-    D = {'.mp4': make_movie,
-         '.ogv': make_movie,
-         '.gif': make_gif,
-         '.jpeg': make_strip,
-         '.png': make_strip}
+    if output_ext in ['.jpeg', '.jpg', '.png']:
+        cv.imwrite(output, np.concatenate(list(views()), axis=0))
+        return
 
-    D[output_ext](files, output, **kwargs)
+    fps = kwargs.get('fps', 10)
+    if output_ext == '.gif' and 'delay' in kwargs:
+        fps = 1000.0 / float(kwargs['delay'])
 
-    for f in files:
-        os.remove(f)
+    with VideoEncoderSink(output, fps=fps) as sink:
+        for image in views():
+            sink.write(image)
 
 
 ##### EXAMPLE
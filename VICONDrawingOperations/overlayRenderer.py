@@ -0,0 +1,242 @@
+# The file draws the annotation overlay (features, posture lines, 2D and 3D bounding boxes) on video frames. The renderer
+# is configured once with the feature list and the skeleton, the color table and the edge indices are precomputed and a
+# frame is drawn from the projection arrays with validity masks and one cv.polylines call per color.
+# The overlay videos of the cameras are rendered in parallel, one process per camera (see makeMovie.VideoEncoderSink).
+
+import os
+import time
+import numpy as np
+import cv2 as cv
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from VICONDrawingOperations import drawOp
+from VICONDrawingOperations import makeMovie
+from VICONMath import imageOperations as imageOp
+from VICONSystem import videoVicon
+
+
+class OverlayRenderer:
+    """
+    Draws the annotation of a frame from arrays, same drawing as ImageVicon.drawPosture, drawFeatures and drawBoundingBox
+    """
+    def __init__(self, featureList, skeleton = None, pointSize = 2, lineWidth = 3, boxColor = (255, 0, 0),
+                 boxWidth = 5, box3DColor = (0, 255, 0), box3DWidth = 1):
+        """
+        Initialize the color table and the skeleton edges
+        :param featureList: list of features, order of the points given to drawFrame
+        :param skeleton: list of (first feature, second feature, color), default drawOp.defaultSkeleton
+        :param pointSize: radius of the feature points
+        :param lineWidth: width of the posture lines
+        :param boxColor: color of the 2D bounding box
+        :param boxWidth: width of the 2D bounding box
+        :param box3DColor: color of the 3D bounding box
+        :param box3DWidth: width of the 3D bounding box
+        """
+        assert (pointSize > 0), " Error in point size"
+        if skeleton is None:
+            skeleton = drawOp.defaultSkeleton
+        self.featureList = list(featureList)
+        self.pointSize = pointSize
+        self.lineWidth = lineWidth
+        self.boxColor = tuple(boxColor)
+        self.boxWidth = boxWidth
+        self.box3DColor = tuple(box3DColor)
+        self.box3DWidth = box3DWidth
+        self.colors = drawOp.getColorTable(self.featureList)
+
+        # Edges of features which are not in the feature list are never drawn
+        featureIndex = {feature: index for index, feature in enumerate(self.featureList)}
+        edges = [(featureIndex[first], featureIndex[second], color) for first, second, color in skeleton
+                 if first in featureIndex and second in featureIndex]
+        self.edges = np.array([[first, second] for first, second, color in edges], dtype=np.int64).reshape(-1, 2)
+        self.edgeColors = np.array([color for first, second, color in edges], dtype=np.int64).reshape(-1, 3)
+
+    def drawFrame(self, image, points2D, present = None, boundingBox = None, box3D = None, featureScale = None):
+        """
+        Draw the overlay of one frame, the image is modified
+        :param image: BGR image
+        :param points2D: array (N,2) of the features in the order of the feature list
+        :param present: array (N,) bool, features with projection (default all), lines of missing features are skipped
+        :param boundingBox: array (2,2) left and right corner, drawn if both corners are inside the image
+        :param box3D: array (8,2) projected corners of the 3D bounding box (see drawOp.boundingBoxEdges)
+        :param featureScale: [sx, sy] scale of the coordinates for downscaled images (e.g. proxy videos), see
+                             imageOp.scaleImagePoints
+        :return: image
+        """
+        height, width = image.shape[0:2]
+        scale = np.ones(2) if featureScale is None else np.asarray(featureScale, dtype=np.float64)
+        points2D = imageOp.scaleImagePoints(points2D, scale)
+        present = np.isfinite(points2D).all(axis=1) if present is None else present & np.isfinite(points2D).all(axis=1)
+
+        # Posture lines (drawn below the points)
+        if len(self.edges) != 0:
+            edgeValid = present[self.edges[:, 0]] & present[self.edges[:, 1]]
+            edges = self.edges[edgeValid]
+            drawOp.drawLineArray(image, points2D[edges[:, 0]], points2D[edges[:, 1]],
+                                 drawOp.groupByColor(self.edgeColors[edgeValid]), self.lineWidth)
+
+        # Features, a marker at the origin shows that projected features are outside the image
+        inside = imageOp.computePointValidity(points2D, height, width)
+        valid = present & inside
+        drawOp.drawPointArray(image, points2D[valid], drawOp.groupByColor(self.colors[valid]), self.pointSize)
+        if np.any(present & ~inside):
+            drawOp.drawPoint(image, [0, 0], 8)
+
+        if boundingBox is not None:
+            corners = imageOp.scaleImagePoints(np.asarray(boundingBox, dtype=np.float64).reshape(2, 2), scale)
+            if np.all(imageOp.computePointValidity(corners, height, width)):
+                corners = corners.astype(np.int32)
+                cv.rectangle(image, tuple(corners[0].tolist()), tuple(corners[1].tolist()), self.boxColor,
+                             self.boxWidth)
+
+        if box3D is not None:
+            corners = imageOp.scaleImagePoints(np.asarray(box3D, dtype=np.float64)[:, 0:2], scale)
+            if np.all(np.isfinite(corners)):
+                segments = corners.astype(np.int32)[drawOp.boundingBoxEdges]
+                cv.polylines(image, list(segments), False, self.box3DColor, self.box3DWidth)
+
+        return image
+
+
+def getOverlayArrays(columns, featureList):
+    """
+    Arrays of all frames from the annotation columns of one camera
+    :param columns: dict {column: array} of sessionProjection.SessionProjection.compute (or the annotation database)
+    :param featureList: list of features
+    :return: array (F,N,2) points, array (F,N) bool present, array (F,2,2) bounding boxes, array (F,) bool box validity
+    """
+    noOfFrames = len(columns["frame"])
+    points = np.zeros((noOfFrames, len(featureList), 2))
+    for index, feature in enumerate(featureList):
+        points[:, index, 0] = columns[feature + "_2d_x"]
+        points[:, index, 1] = columns[feature + "_2d_y"]
+    # Features without projection are saved as 0 (see sessionProjection)
+    present = np.any(points != 0, axis=2)
+
+    boxes = np.zeros((noOfFrames, 2, 2))
+    boxes[:, 0, 0] = columns["lCorner_2d_x"]
+    boxes[:, 0, 1] = columns["lCorner_2d_y"]
+    boxes[:, 1, 0] = columns["rCorner_2d_x"]
+    boxes[:, 1, 1] = columns["rCorner_2d_y"]
+    boxValid = np.any(boxes != 0, axis=(1, 2))
+    return points, present, boxes, boxValid
+
+
+def exportCameraOverlay(videoFile, cameraId, columns, featureList, output, fps = 15.0, rendererSettings = None):
+    """
+    Draw the overlay on the annotated frames of one camera and encode the video, executed in worker processes
+    :param videoFile: str
+    :param cameraId: camera id
+    :param columns: dict {column: array} of sessionProjection.SessionProjection.compute
+    :param featureList: list of features
+    :param output: video file
+    :param fps: frame rate of the overlay video
+    :param rendererSettings: dict of keyword arguments of OverlayRenderer
+    :return: camera id, number of frames
+    """
+    renderer = OverlayRenderer(featureList, **(rendererSettings or {}))
+    points, present, boxes, boxValid = getOverlayArrays(columns, featureList)
+    frames = np.asarray(columns["frame"], dtype=np.int64)
+
+    video = videoVicon.VideoVicon(videoFile, cameraId)
+    frameIterator = video.iterateFrames(frameNumbers=frames)
+    with makeMovie.VideoEncoderSink(output, fps=fps) as sink:
+        for (frameNo, image), framePoints, framePresent, box, hasBox in zip(frameIterator, points, present, boxes,
+                                                                           boxValid):
+            if image is None:
+                print("Frame could not be decoded, skip : ", frameNo, " camera : ", cameraId)
+                continue
+            renderer.drawFrame(image, framePoints, framePresent, box if hasBox else None)
+            sink.write(image)
+        frameIterator.close()
+        noOfFrames = sink.noOfFrames
+
+    return cameraId, noOfFrames
+
+
+def exportOverlayVideos(videoFiles, cameraIds, cameraColumns, featureList, outputDirectory, fps = 15.0,
+                        noOfWorkers = None, extension = ".avi", **rendererSettings):
+    """
+    Overlay videos of all cameras in parallel, written as <outputDirectory>/camera<id>_overlay<extension>
+    :param videoFiles: list of video files, one per camera
+    :param cameraIds: list of camera ids
+    :param cameraColumns: list (one per camera) of dict {column: array} of sessionProjection.SessionProjection.compute
+    :param featureList: list of features
+    :param outputDirectory: str
+    :param fps: frame rate of the overlay videos
+    :param noOfWorkers: number of processes, 1 to render in this process
+    :param extension: video format
+    :param rendererSettings: keyword arguments of OverlayRenderer
+    :return: dict {camera id: output file}
+    """
+    startTime = time.perf_counter()
+    os.makedirs(outputDirectory, exist_ok=True)
+    outputs = {cameraId: os.path.join(outputDirectory, "camera{}_overlay{}".format(cameraId, extension))
+               for cameraId in cameraIds}
+    tasks = [(videoFile, cameraId, columns, list(featureList), outputs[cameraId], fps, rendererSettings)
+             for videoFile, cameraId, columns in zip(videoFiles, cameraIds, cameraColumns)]
+
+    totalFrames = 0
+    if noOfWorkers == 1:
+        results = [exportCameraOverlay(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=noOfWorkers) as executor:
+            futures = [executor.submit(exportCameraOverlay, *task) for task in tasks]
+            results = [future.result() for future in as_completed(futures)]
+    for cameraId, noOfFrames in results:
+        print("Overlay video : ", outputs[cameraId], " frames : ", noOfFrames)
+        totalFrames += noOfFrames
+
+    duration = time.perf_counter() - startTime
+    print("Overlay export : {} frames in {:.2f} s ({:.1f} frames/s)".format(totalFrames, duration,
+                                                                           totalFrames / max(duration, 1e-9)))
+    return outputs
+
+
+def unitTest():
+    """
+    Compare the renderer with the drawing of ImageVicon and measure the time per frame
+    :return: None
+    """
+    from VICONSystem import imageVicon
+
+    featureList = ["head_beak", "head_leftEye", "head_rightEye", "body_tail", "body_leftShoulder", "outside"]
+    points = np.array([[400, 300], [350, 250], [350, 350], [100, 300], [200, 200], [-50, 700]], dtype=np.float64)
+    imageObject = imageVicon.ImageVicon(0)
+    imageObject.featureDict.setFeatures({feature: list(point) for feature, point in zip(featureList, points)})
+    bBox = imageObject.computeBoundingBox()
+
+    legacyImage = np.zeros((600, 800, 3), np.uint8)
+    imageObject.drawPosture(legacyImage)
+    imageObject.drawFeatures(legacyImage)
+    imageObject.drawBoundingBox(legacyImage)
+
+    renderer = OverlayRenderer(featureList)
+    image = np.zeros((600, 800, 3), np.uint8)
+    renderer.drawFrame(image, points, boundingBox=[bBox["lCorner"], bBox["rCorner"]])
+    print("Same image as ImageVicon : ", np.array_equal(image, legacyImage))
+
+    # Overlapping points of alternating colors are drawn in the order of the features
+    overlapFeatures = ["head_beak", "body_tail", "head_beak2"]
+    overlapPoints = np.array([[50, 50], [53, 50], [56, 50]], dtype=np.float64)
+    legacyImage = np.zeros((100, 100, 3), np.uint8)
+    for feature, point in zip(overlapFeatures, overlapPoints):
+        drawOp.drawPoint(legacyImage, point, 5, drawOp.getColor(feature))
+    image = np.zeros((100, 100, 3), np.uint8)
+    OverlayRenderer(overlapFeatures, skeleton=[], pointSize=5).drawFrame(image, overlapPoints)
+    print("Same image for overlapping points : ", np.array_equal(image, legacyImage))
+
+    # Missing features do not show the marker of features outside the image
+    image = np.zeros((100, 100, 3), np.uint8)
+    OverlayRenderer(overlapFeatures, skeleton=[]).drawFrame(image, overlapPoints,
+                                                            present=np.array([True, True, False]))
+    print("No marker for missing features : ", not image[0:3, 0:3].any())
+
+    box3D = np.array([[100, 100], [300, 100], [300, 300], [100, 300], [150, 50], [350, 50], [350, 250], [150, 250]])
+    startTime = time.perf_counter()
+    for _ in range(200):
+        renderer.drawFrame(image, points, boundingBox=[bBox["lCorner"], bBox["rCorner"]], box3D=box3D)
+    print("Draw time per frame : {:.3f} ms".format(1000 * (time.perf_counter() - startTime) / 200))
+
+
+if __name__ == '__main__':
+    unitTest()
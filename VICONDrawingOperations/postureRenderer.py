@@ -0,0 +1,136 @@
+# The file renders 3D postures (points connected by bones) to images. The figure, the axes and the line artists are
+# created once, for every frame only the data of the lines is updated and the Agg canvas is copied to a numpy image.
+# Long sequences are split in chunks rendered by a process pool and encoded in order (see makeMovie.VideoEncoderSink).
+
+import os
+import numpy as np
+import cv2 as cv
+from concurrent.futures import ProcessPoolExecutor
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from mpl_toolkits.mplot3d import Axes3D
+from VICONDrawingOperations import makeMovie
+
+
+class PostureRenderer:
+    """
+    Renders postures with reused artists, only used through the Agg canvas (no window, safe in worker processes)
+    """
+    def __init__(self, bones, width = 7, height = 5, radius = 500, azimuth = 0, elevation = None, dpi = 100):
+        """
+        Initialize the figure and the artists
+        :param bones: list of (name, first point index, second point index, color)
+        :param width: width of the figure in inches
+        :param height: height of the figure in inches
+        :param radius: half size of the plotted box around the origin
+        :param azimuth: azimuth of the view
+        :param elevation: elevation of the view
+        :param dpi: resolution of the figure
+        """
+        self.bones = bones
+        self.figure = Figure(figsize=(width, height), dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_subplot(111, projection='3d')
+        self.axes.set_xlim3d([-radius, radius])
+        self.axes.set_ylim3d([-radius, radius])
+        self.axes.set_zlim3d([-radius, radius])
+        self.axes.view_init(elev=elevation, azim=azimuth)
+
+        self.lines = []
+        for name, first, second, color in bones:
+            line, = self.axes.plot([0, 0], [0, 0], [0, 0], lw=2, c=color, label=name)
+            self.lines.append(line)
+        self.axes.legend()
+
+    def render(self, points):
+        """
+        Render one posture
+        :param points: array (N,3) of points
+        :return: BGR image (H,W,3) uint8
+        """
+        points = np.asarray(points, dtype=np.float64)
+        for line, (name, first, second, color) in zip(self.lines, self.bones):
+            pair = points[[first, second]]
+            line.set_data_3d(pair[:, 0], pair[:, 1], pair[:, 2])
+
+        self.canvas.draw()
+        return cv.cvtColor(np.asarray(self.canvas.buffer_rgba()), cv.COLOR_RGBA2BGR)
+
+
+def renderChunk(bones, points, rendererSettings):
+    """
+    Render a chunk of postures, executed in worker processes
+    :param bones: see PostureRenderer
+    :param points: array (F,N,3)
+    :param rendererSettings: dict of keyword arguments of PostureRenderer
+    :return: array (F,H,W,3) of images
+    """
+    renderer = PostureRenderer(bones, **rendererSettings)
+    return np.stack([renderer.render(framePoints) for framePoints in points])
+
+
+def renderPostureVideo(bones, points, output, fps = 30.0, chunkSize = 50, noOfWorkers = None, **rendererSettings):
+    """
+    Render the postures of all frames in parallel and encode them in order
+    :param bones: see PostureRenderer
+    :param points: array (F,N,3) of points for all frames
+    :param output: video file
+    :param fps: frame rate
+    :param chunkSize: number of frames rendered by one task
+    :param noOfWorkers: number of processes, 1 to render in this process
+    :param rendererSettings: keyword arguments of PostureRenderer
+    :return: number of frames
+    """
+    chunks = [points[start:start + chunkSize] for start in range(0, len(points), chunkSize)]
+
+    with makeMovie.VideoEncoderSink(output, fps=fps) as sink:
+        if noOfWorkers == 1:
+            for chunk in chunks:
+                for image in renderChunk(bones, chunk, rendererSettings):
+                    sink.write(image)
+            return sink.noOfFrames
+
+        with ProcessPoolExecutor(max_workers=noOfWorkers) as executor:
+            # Limited number of chunks in flight, rendered images are not piled up in memory
+            maxPending = 2 * (noOfWorkers or os.cpu_count() or 1)
+            pending = []
+            for chunk in chunks:
+                pending.append(executor.submit(renderChunk, bones, chunk, rendererSettings))
+                if len(pending) >= maxPending:
+                    for image in pending.pop(0).result():
+                        sink.write(image)
+            for future in pending:
+                for image in future.result():
+                    sink.write(image)
+
+        return sink.noOfFrames
+
+
+def unitTest():
+    """
+    Render a rotating stick and compare the reused renderer with a new renderer
+    :return: None
+    """
+    import time
+    import tempfile
+
+    bones = [("body", 0, 1, "b"), ("wing", 0, 2, "#3498db")]
+    angles = np.linspace(0, 2 * np.pi, 60)
+    points = np.zeros((len(angles), 3, 3))
+    points[:, 1, 0] = 300 * np.cos(angles)
+    points[:, 1, 1] = 300 * np.sin(angles)
+    points[:, 2, 2] = 200
+
+    renderer = PostureRenderer(bones, width=4, height=3)
+    startTime = time.perf_counter()
+    images = [renderer.render(framePoints) for framePoints in points]
+    print("Render time per frame : {:.1f} ms".format(1000 * (time.perf_counter() - startTime) / len(points)))
+    newRenderer = PostureRenderer(bones, width=4, height=3)
+    print("Same image as new renderer: ", np.array_equal(images[10], newRenderer.render(points[10])))
+
+    output = os.path.join(tempfile.mkdtemp(), "posture.avi")
+    print("Frames written : ", renderPostureVideo(bones, points, output, chunkSize=16, noOfWorkers=2, width=4, height=3))
+
+
+if __name__ == '__main__':
+    unitTest()
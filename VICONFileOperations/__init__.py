@@ -5,4 +5,5 @@ from VICONFileOperations import settingsGenerator
 from VICONFileOperations import c3dReader
 from VICONFileOperations import prepareDataset
 from VICONFileOperations import convertVICONExport
-from VICONFileOperations import rwCustomC3DFiles
\ No newline at end of file
+from VICONFileOperations import rwCustomC3DFiles
+from VICONFileOperations import datasetExporter
\ No newline at end of file
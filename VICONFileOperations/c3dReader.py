@@ -1,9 +1,7 @@
 import c3d
 import numpy as np
-import os
-import matplotlib.pyplot as plt
 from mpl_toolkits.mplot3d import Axes3D
-from VICONDrawingOperations import makeMovie
+from VICONDrawingOperations import postureRenderer
 
 
 
@@ -66,66 +64,44 @@ def getColor(pair):
     else:
         return black
 
-def sampleAppPostureExtraction(fileName):
+# Connecting pairs for the posture, indexes of the first four points of the stream
+posturePairs = {'body': [0, 1],
+                'lWing1': [0, 2],
+                'lWind2': [1, 2],
+                'rWing1': [0, 3],
+                'rWing2': [1, 3]}
+
+def readPostureFrames(fileName, noOfPoints = 4, rootPosition = 0):
+    """
+    Read the posture points of all frames with all points present, normalised to the root point
+    :param fileName: .c3d file
+    :param noOfPoints: number of points of the posture (first points of the stream)
+    :param rootPosition: index of the root point
+    :return: array (F,) of frame numbers, array (F,N,3) of points
+    """
+    frames = []
+    points = []
     with open(fileName, 'rb') as handle:
         reader = c3d.Reader(handle)
-        # Define size for the graph
-        width = 7
-        height = 5
-
-        files = []
-        pretext = 'img'
-        angle = 0
-        imageIndex = 0
-
-        for i, points, analog in reader.read_frames():
-            # Read points foo each frame
-            print("points{}:{}".format(points.shape, points[0:4, :]))
-            featurePoints = points[0:4, 0:3]
-            status = validate(featurePoints)
-            rootPosition = 0
-            if False in status:
-                continue
-            # normalize point data for plotting in same position
-            featurePoints = normalize(featurePoints, rootPosition)
-            rootPoint = featurePoints[rootPosition, :]
-            m, n = featurePoints.shape
-            normalizeMat = np.tile(rootPoint, (m, 1))
-
-            fig = plt.figure()
-            ax = fig.add_subplot(111, projection='3d')
-            ax.figure.set_size_inches(width, height)
-            ax.set_aspect('equal')
-            # Define connecting pairs for the posture by making list of indexes
-            pairs = {'body': [0, 1],
-                     'lWing1': [0, 2],
-                     'lWind2': [1, 2],
-                     'rWing1': [0, 3],
-                     'rWing2': [1, 3]}
-            # Plot each pair of posture on the graph with specific box and viewing angle
-            for pair in pairs:
-                [x, y, z] = get_xyz(featurePoints, pairs[pair])
-                ax.plot(x, y, z, lw=2, c=getColor(pairs[pair]))
-                RADIUS = 500  # space around the subject
-                xroot, yroot, zroot = 0, 0, 0
-                ax.set_xlim3d([-RADIUS + xroot, RADIUS + xroot])
-                ax.set_zlim3d([-RADIUS + zroot, RADIUS + zroot])
-                ax.set_ylim3d([-RADIUS + yroot, RADIUS + yroot])
-                ax.view_init(elev=None, azim=angle)
-                ax.legend()
-
-            figName = "temp/{0}{1}.jpeg".format(pretext, imageIndex)
-            imageIndex += 1
-            ax.figure.savefig(figName)
-            plt.close(fig)
-            files.append(figName)
-
-        fileName = "video/output.mp4"
-        fileFormat = "temp/{0}%d.jpeg".format(pretext)
-        makeMovie.make_video_from_images(fileFormat, fileName, displayImages=True)
-        for f in files:
-            os.remove(f)
-        files.clear()
+        for i, framePoints, analog in reader.read_frames():
+            frames.append(i)
+            points.append(framePoints[0:noOfPoints, 0:3])
+
+    frames = np.array(frames, dtype=np.int64)
+    points = np.array(points, dtype=np.float64).reshape(len(frames), noOfPoints, 3)
+    # Frames with missing points (all zero) are skipped, see validate
+    valid = np.all(np.any(points != 0, axis=2), axis=1)
+    points = points[valid] - points[valid][:, rootPosition:rootPosition + 1]
+    return frames[valid], points
+
+def sampleAppPostureExtraction(fileName, output = "video/output.mp4", noOfWorkers = None):
+    frames, points = readPostureFrames(fileName)
+    print("Frames with posture : ", len(frames))
+
+    # Figure and artists are created once per worker, frames are encoded in memory
+    bones = [(pair, posturePairs[pair][0], posturePairs[pair][1], getColor(posturePairs[pair])) for pair in posturePairs]
+    postureRenderer.renderPostureVideo(bones, points, output, fps=30.0, noOfWorkers=noOfWorkers, width=7, height=5,
+                                       radius=500, azimuth=0)
 
 
 
@@ -0,0 +1,401 @@
+# The file exports the annotation databases of the sessions (see automaticAnnotationTool) and the matching video frames
+# as training dataset. Every camera of every session is streamed by its own worker into fixed size HDF5 shards (images or
+# crops, 2D keypoints, 3D keypoints and bounding boxes, chunked and compressed), a global index of all samples allows
+# random access during training.
+
+import os
+import numpy as np
+import pandas as pd
+import h5py
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from VICONFileOperations import rwOperations
+from VICONFileOperations import settingsGenerator
+from VICONSystem import videoVicon
+
+indexFileName = "index.csv"
+indexColumns = ["shard", "row", "session", "camera", "frame"]
+
+
+def getFeatureColumns(featureList):
+    """
+    Column names of the annotation database for the 2D keypoints, 3D keypoints and the bounding box
+    :param featureList: list of features
+    :return: list of 2D columns, list of 3D columns, list of bounding box columns
+    """
+    columns2D = [feature + "_2d_" + axis for feature in featureList for axis in ["x", "y"]]
+    columns3D = [feature + "_3d_" + axis for feature in featureList for axis in ["x", "y", "z"]]
+    columnsBoundingBox = ["lCorner_2d_x", "lCorner_2d_y", "rCorner_2d_x", "rCorner_2d_y"]
+    return columns2D, columns3D, columnsBoundingBox
+
+
+def computeValidRows(keypoints2D, imageSize):
+    """
+    Rows with all 2D keypoints inside the image, one mask for all features (see prepareDataset.processData)
+    :param keypoints2D: array (N,M,2)
+    :param imageSize: (height, width)
+    :return: array (N,) bool
+    """
+    height, width = imageSize
+    inside = ((keypoints2D[..., 0] > 0) & (keypoints2D[..., 0] < width) &
+              (keypoints2D[..., 1] > 0) & (keypoints2D[..., 1] < height))
+    return np.all(inside, axis=1)
+
+
+def readKeypoints3D(dataBaseFile, featureList):
+    """
+    Read only the 3D keypoints of an annotation database, used to share the 3D keypoints of the origin camera
+    :param dataBaseFile: str
+    :param featureList: list of features
+    :return: array (N,) of frames, array (N,M,3) of keypoints
+    """
+    columns3D = getFeatureColumns(featureList)[1]
+    data = pd.read_csv(dataBaseFile, usecols=["frame"] + columns3D).drop_duplicates("frame")
+    return data["frame"].values, data[columns3D].values.reshape(len(data), len(featureList), 3)
+
+
+def iterateAnnotationChunks(dataBaseFile, featureList, chunkSize = 1024, imageSize = (1080, 1920), origin3D = None):
+    """
+    Stream the annotation database in chunks of rows
+    :param dataBaseFile: str
+    :param featureList: list of features
+    :param chunkSize: number of rows read at once
+    :param imageSize: (height, width), rows with keypoints outside of the image are removed
+    :param origin3D: (frames, keypoints) of readKeypoints3D, replaces the 3D keypoints (frames missing there are removed)
+    :return: generator of (frames (N,), keypoints 2D (N,M,2), keypoints 3D (N,M,3), bounding boxes (N,4))
+    """
+    columns2D, columns3D, columnsBoundingBox = getFeatureColumns(featureList)
+    noOfFeatures = len(featureList)
+    if origin3D is not None:
+        originOrder = np.argsort(origin3D[0])
+        originFrames = origin3D[0][originOrder]
+
+    for data in pd.read_csv(dataBaseFile, chunksize=chunkSize):
+        frames = data["frame"].values.astype(np.int64)
+        keypoints2D = data[columns2D].values.reshape(len(data), noOfFeatures, 2)
+        keypoints3D = data[columns3D].values.reshape(len(data), noOfFeatures, 3)
+        boundingBoxes = data[columnsBoundingBox].values
+        valid = computeValidRows(keypoints2D, imageSize)
+
+        if origin3D is not None:
+            # 3D keypoints of all cameras are given in the space of the origin camera
+            position = np.clip(np.searchsorted(originFrames, frames), 0, max(len(originFrames) - 1, 0))
+            found = np.zeros(len(frames), dtype=bool)
+            if len(originFrames) != 0:
+                found = originFrames[position] == frames
+            keypoints3D = origin3D[1][originOrder[position]] if len(originFrames) != 0 else keypoints3D
+            valid &= found
+
+        if np.any(valid):
+            yield frames[valid], keypoints2D[valid], keypoints3D[valid], boundingBoxes[valid]
+
+
+def cropImage(image, center, cropSize):
+    """
+    Square crop of the image around the given center, parts outside of the image are black
+    :param image: image (H,W,3)
+    :param center: (x, y)
+    :param cropSize: int
+    :return: crop (cropSize,cropSize,3), origin (x, y) of the crop in the image
+    """
+    originX = int(round(center[0] - cropSize / 2))
+    originY = int(round(center[1] - cropSize / 2))
+    crop = np.zeros((cropSize, cropSize) + image.shape[2:], dtype=image.dtype)
+    x1, y1 = max(originX, 0), max(originY, 0)
+    x2, y2 = min(originX + cropSize, image.shape[1]), min(originY + cropSize, image.shape[0])
+    if x1 < x2 and y1 < y2:
+        crop[y1 - originY:y2 - originY, x1 - originX:x2 - originX] = image[y1:y2, x1:x2]
+    return crop, np.array([originX, originY], dtype=np.float64)
+
+
+class ShardWriter:
+    """
+    Writes samples of one camera to fixed size HDF5 shards. Images are written one by one (one compressed chunk per
+    image), so only one image is kept in memory; the keypoints are written when the shard is closed.
+    """
+    def __init__(self, outputDirectory, prefix, shardSize = 512, compression = "gzip", compressionLevel = 4):
+        """
+        Initialize the writer
+        :param outputDirectory: str
+        :param prefix: str, shard files are named <prefix>_<shard number>.h5
+        :param shardSize: number of samples per shard
+        :param compression: HDF5 compression filter ("gzip", "lzf" or None)
+        :param compressionLevel: level of gzip compression
+        """
+        self.outputDirectory = outputDirectory
+        self.prefix = prefix
+        self.shardSize = shardSize
+        self.compression = compression
+        self.compressionOptions = compressionLevel if compression == "gzip" else None
+        self.shardNo = 0
+        self.file = None
+        self.fileName = None
+        self.rows = []
+        self.index = []
+
+    def openShard(self, imageShape):
+        """
+        Create the next shard file
+        :param imageShape: shape of the images
+        :return: None
+        """
+        self.fileName = "{}_{:05d}.h5".format(self.prefix, self.shardNo)
+        self.file = h5py.File(os.path.join(self.outputDirectory, self.fileName), "w")
+        self.file.create_dataset("images", shape=(self.shardSize,) + imageShape, maxshape=(None,) + imageShape,
+                                 dtype=np.uint8, chunks=(1,) + imageShape, compression=self.compression,
+                                 compression_opts=self.compressionOptions)
+        self.rows = []
+
+    def append(self, image, sample):
+        """
+        Append one sample to the current shard
+        :param image: image or crop (H,W,3), all images of a writer have the same shape
+        :param sample: dict of arrays (frame, keypoints2D, keypoints3D, boundingBox, cropOrigin) and str (session, camera)
+        :return: None
+        """
+        if self.file is None:
+            self.openShard(image.shape)
+        self.file["images"][len(self.rows)] = image
+        self.rows.append(sample)
+        self.index.append([self.fileName, len(self.rows) - 1, sample["session"], sample["camera"], sample["frame"]])
+        if len(self.rows) == self.shardSize:
+            self.closeShard()
+
+    def closeShard(self):
+        """
+        Write the keypoints of the samples and close the current shard
+        :return: None
+        """
+        if self.file is None:
+            return
+        noOfRows = len(self.rows)
+        # Last shard of a camera is smaller
+        self.file["images"].resize(noOfRows, axis=0)
+        for key in ["frame", "keypoints2D", "keypoints3D", "boundingBox", "cropOrigin"]:
+            values = np.array([row[key] for row in self.rows])
+            self.file.create_dataset(key, data=values, chunks=values.shape, compression=self.compression, compression_opts=self.compressionOptions)
+        self.file.attrs["size"] = noOfRows
+        self.file.close()
+        self.file = None
+        self.shardNo += 1
+
+    def close(self):
+        """
+        Close the last shard
+        :return: list of index rows [shard, row, session, camera, frame]
+        """
+        self.closeShard()
+        return self.index
+
+
+def exportCamera(dataBaseFile, videoFile, featureList, outputDirectory, sessionName, cameraName, shardSize = 512,
+                 cropSize = None, origin3DFile = None, imageSize = (1080, 1920), compression = "gzip"):
+    """
+    Export the annotations of one camera and the matching video frames, executed in worker processes
+    :param dataBaseFile: annotation database of the camera (.csv)
+    :param videoFile: video of the camera
+    :param featureList: list of features
+    :param outputDirectory: str
+    :param sessionName: str
+    :param cameraName: str
+    :param shardSize: number of samples per shard
+    :param cropSize: int, store square crops around the bounding box instead of full images
+    :param origin3DFile: annotation database of the origin camera, its 3D keypoints are used for this camera
+    :param imageSize: (height, width) of the images
+    :param compression: HDF5 compression filter
+    :return: list of index rows
+    """
+    origin3D = None
+    if origin3DFile is not None and os.path.abspath(origin3DFile) != os.path.abspath(dataBaseFile):
+        origin3D = readKeypoints3D(origin3DFile, featureList)
+
+    video = videoVicon.VideoVicon(videoFile, cameraName)
+    writer = ShardWriter(outputDirectory, sessionName + "_" + str(cameraName), shardSize, compression)
+    for frames, keypoints2D, keypoints3D, boundingBoxes in iterateAnnotationChunks(dataBaseFile, featureList,
+                                                                                   shardSize, imageSize, origin3D):
+        # Rows of a chunk are decoded in sequence, repeated frames are decoded once
+        order = np.argsort(frames, kind="stable")
+        frameNumbers = np.unique(frames)
+        images = {}
+        frameIterator = video.iterateFrames(frameNumbers=frameNumbers)
+        for row in order:
+            while frames[row] not in images:
+                frameNo, image = next(frameIterator)
+                images = {frameNo: image}
+            image = images[frames[row]]
+            if image is None:
+                print("Frame could not be decoded, skip : ", frames[row], " camera : ", cameraName)
+                continue
+
+            cropOrigin = np.zeros(2)
+            if cropSize is not None:
+                center = (boundingBoxes[row, 0:2] + boundingBoxes[row, 2:4]) / 2
+                image, cropOrigin = cropImage(image, center, cropSize)
+
+            writer.append(image, {"frame": frames[row], "session": sessionName, "camera": str(cameraName),
+                                  "keypoints2D": keypoints2D[row] - cropOrigin,
+                                  "keypoints3D": keypoints3D[row],
+                                  "boundingBox": boundingBoxes[row] - np.tile(cropOrigin, 2),
+                                  "cropOrigin": cropOrigin})
+        frameIterator.close()
+
+    return writer.close()
+
+
+def exportDataset(settingsFiles, outputDirectory, shardSize = 512, cropSize = None, noOfWorkers = None,
+                  originCameraIndex = 0, compression = "gzip"):
+    """
+    Export all cameras of the given sessions in parallel and write the global index
+    :param settingsFiles: list of settings files (.xml)
+    :param outputDirectory: str
+    :param shardSize: number of samples per shard
+    :param cropSize: int, store square crops around the bounding box instead of full images
+    :param noOfWorkers: number of processes
+    :param originCameraIndex: camera whose 3D keypoints are used for all cameras of a session
+    :param compression: HDF5 compression filter
+    :return: data frame (pandas) of the index
+    """
+    os.makedirs(outputDirectory, exist_ok=True)
+    jobs = []
+    for settingsFile in settingsFiles:
+        settingsDict = settingsGenerator.xmlSettingsParser(settingsFile).settingsDict
+        rootDirectory = settingsDict["rootDirectory"]
+        featureList = rwOperations.readFeaturesFromFile(os.path.join(rootDirectory, settingsDict["customFeatureFile"]))
+        dataBaseFiles = [os.path.join(rootDirectory, file) for file in settingsDict["annotationDataBaseFiles"]]
+        videoFiles = [os.path.join(rootDirectory, file) for file in settingsDict["videoFiles"]]
+        for cameraIndex, (dataBaseFile, videoFile) in enumerate(zip(dataBaseFiles, videoFiles)):
+            jobs.append((dataBaseFile, videoFile, featureList, outputDirectory, settingsDict["session"],
+                         settingsDict["cameras"][cameraIndex], shardSize, cropSize, dataBaseFiles[originCameraIndex]))
+
+    index = []
+    with ProcessPoolExecutor(max_workers=noOfWorkers) as executor:
+        futures = [executor.submit(exportCamera, *job, compression=compression) for job in jobs]
+        for future in as_completed(futures):
+            index.extend(future.result())
+
+    index = pd.DataFrame(index, columns=indexColumns).sort_values(["session", "camera", "frame"])
+    index = index.reset_index(drop=True)
+    index.to_csv(os.path.join(outputDirectory, indexFileName), index=False)
+    print("Samples exported : ", len(index), " Shards : ", index["shard"].nunique())
+    return index
+
+
+class DatasetReader:
+    """
+    Random access to the samples of an exported dataset through the global index. Shards are opened on first access
+    in the process which reads them (safe for data loader worker processes).
+    """
+    def __init__(self, datasetDirectory):
+        """
+        Initialize the reader
+        :param datasetDirectory: output directory of exportDataset
+        """
+        self.datasetDirectory = datasetDirectory
+        self.index = pd.read_csv(os.path.join(datasetDirectory, indexFileName), dtype={"camera": str, "session": str})
+        self.files = {}
+        self.processId = os.getpid()
+
+    def __len__(self):
+        return len(self.index)
+
+    def getShard(self, shard):
+        if self.processId != os.getpid():
+            # Handles of the parent process can not be used after fork
+            self.files = {}
+            self.processId = os.getpid()
+        if shard not in self.files:
+            self.files[shard] = h5py.File(os.path.join(self.datasetDirectory, shard), "r")
+        return self.files[shard]
+
+    def getBatch(self, indices):
+        """
+        Read the samples with the given positions in the index, rows of a shard are read with one call
+        :param indices: list of positions
+        :return: dict of arrays (images, keypoints2D, keypoints3D, boundingBox, cropOrigin, frame), first axis is the
+                 position in indices
+        """
+        indices = np.asarray(indices, dtype=np.int64)
+        rows = self.index.iloc[indices]
+        batch = {}
+        for shard, group in rows.groupby("shard", sort=False):
+            file = self.getShard(shard)
+            positions = np.flatnonzero(rows["shard"].values == shard)
+            shardRows = group["row"].values
+            # HDF5 needs increasing unique rows
+            uniqueRows, inverse = np.unique(shardRows, return_inverse=True)
+            for key in ["images", "keypoints2D", "keypoints3D", "boundingBox", "cropOrigin", "frame"]:
+                values = file[key][uniqueRows][inverse]
+                if key not in batch:
+                    batch[key] = np.empty((len(indices),) + values.shape[1:], dtype=values.dtype)
+                batch[key][positions] = values
+        return batch
+
+    def __getitem__(self, position):
+        sample = {key: value[0] for key, value in self.getBatch([position]).items()}
+        sample["session"] = self.index["session"].iloc[position]
+        sample["camera"] = self.index["camera"].iloc[position]
+        return sample
+
+    def sample(self, batchSize, randomGenerator = None):
+        """
+        Random batch of samples
+        :param batchSize: int
+        :param randomGenerator: numpy RandomState
+        :return: dict of arrays, see getBatch
+        """
+        if randomGenerator is None:
+            randomGenerator = np.random
+        return self.getBatch(randomGenerator.randint(0, len(self), batchSize))
+
+    def close(self):
+        for file in self.files.values():
+            file.close()
+        self.files = {}
+
+
+def unitTest():
+    """
+    Export a synthetic video with annotations of two features and read random samples
+    :return: None
+    """
+    import tempfile
+    import cv2 as cv
+
+    directory = tempfile.mkdtemp()
+    videoFile = os.path.join(directory, "camera.avi")
+    writer = cv.VideoWriter(videoFile, cv.VideoWriter_fourcc(*"MJPG"), 30, (64, 48))
+    for frameNo in range(20):
+        writer.write(np.full((48, 64, 3), frameNo * 10, dtype=np.uint8))
+    writer.release()
+
+    featureList = ["head_beak", "body_tail"]
+    frames = np.arange(0, 20, 2)
+    data = {"frame": frames}
+    for featureIndex, feature in enumerate(featureList):
+        data[feature + "_2d_x"] = 10 + featureIndex * 20 + frames
+        data[feature + "_2d_y"] = 20 + np.zeros(len(frames))
+        for axis in ["x", "y", "z"]:
+            data[feature + "_3d_" + axis] = frames * 1.0
+    data["lCorner_2d_x"], data["lCorner_2d_y"] = np.full(len(frames), 5), np.full(len(frames), 5)
+    data["rCorner_2d_x"], data["rCorner_2d_y"] = np.full(len(frames), 55), np.full(len(frames), 40)
+    # Frame 18 has a keypoint outside of the image and is removed
+    data["body_tail_2d_x"][-1] = 100
+    dataBaseFile = os.path.join(directory, "camera.database.csv")
+    pd.DataFrame(data).to_csv(dataBaseFile, index=False)
+
+    outputDirectory = os.path.join(directory, "dataset")
+    os.makedirs(outputDirectory)
+    index = exportCamera(dataBaseFile, videoFile, featureList, outputDirectory, "session", "1", shardSize=4,
+                         imageSize=(48, 64))
+    pd.DataFrame(index, columns=indexColumns).to_csv(os.path.join(outputDirectory, indexFileName), index=False)
+
+    reader = DatasetReader(outputDirectory)
+    print("Samples (should be 9): ", len(reader), " Shards (should be 3): ", reader.index["shard"].nunique())
+    sample = reader[5]
+    print("Frame (should be 10): ", sample["frame"], " Mean pixel (about 100): ", sample["images"].mean())
+    batch = reader.sample(6, np.random.RandomState(0))
+    print("Batch frames: ", batch["frame"], " image shape: ", batch["images"].shape)
+    reader.close()
+
+
+if __name__ == '__main__':
+    unitTest()
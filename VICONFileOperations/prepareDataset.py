@@ -1,5 +1,5 @@
 
-#
+# Legacy export of the annotation databases to one HDF5 file per database, see datasetExporter for the sharded export
 
 from VICONFileOperations import rwOperations
 import glob
@@ -254,6 +254,23 @@ class annotationDatabase:
 
         return True
 
+    def updateDataBaseFromColumns(self, columns):
+        """
+        Update database with many frames at once and save it, rows of existing frames are replaced
+        :param columns: dict {column: array}, columns of the default data series (missing columns are set to 0)
+        :return: bool
+        """
+        noOfRows = len(columns["frame"])
+        data = pd.DataFrame({column: columns[column] if column in columns else np.zeros(noOfRows)
+                             for column in self.defaultDataSeries})
+        if not self.dataBase.empty:
+            previousData = self.dataBase[~self.dataBase["frame"].isin(data["frame"])]
+            data = pd.concat([previousData, data], ignore_index=True).sort_values("frame", kind="stable")
+        self.dataBase = data.reset_index(drop=True)
+        self.saveDataBase()
+
+        return True
+
     def readDataFrame(self, data):
         """
         Read the given data frame and save the feature in the feature dictionary
@@ -376,6 +393,19 @@ class NexusDatabaseReader:
         dataFrameNo = ( videoFrameNo * int(1/self.videoCameraFrameRateRatio) ) + 1 + self.startIndex
         return np.floor(dataFrameNo)
 
+    def getPointArrays(self):
+        """
+        Returns the 3D points of all frames at once, the features follow the order of the feature list
+        :return: array (F,) of data frame numbers, array (F,N,3) of points (NaN if the point is missing)
+        """
+        subData = self.dataFrame.values[:, 2:].astype(np.float64)
+        if len(self.featureList) * 3 != subData.shape[1]:
+            raise ValueError("Feature and column list of data do not meet")
+
+        frames = self.dataFrame["Frame"].values.astype(np.int64)
+        points = subData.reshape(subData.shape[0], len(self.featureList), 3)
+        return frames, points
+
     def getDataForVideoFrame(self, videoFrameNumber):
         """
         returns rotation, translation data for the query video frame
@@ -446,6 +476,27 @@ class TrackerDatabaseReader:
         self.videoCameraFrameRateRatio = videoToIRDataCaptureRatio
         self.startIndex = readOutStartIndex
 
+    @classmethod
+    def fromDataFrame(cls, fileName, objectsToTrack, data, videoToIRDataCaptureRatio = 0.5, readOutStartIndex = 0):
+        """
+        Create the database from already filtered data (e.g. restored from a session snapshot), the file is not read
+        :param fileName: str : name of the file the data was read from
+        :param objectsToTrack: list of objects to track
+        :param data: data frame (pandas) with the rows having tracking data (Sub Frame == 0)
+        :param videoToIRDataCaptureRatio: Vicon Frame Rate / Video frame rate
+        :param readOutStartIndex: Frame mapping between 1st frame of vicon and video
+        :return: TrackerDatabaseReader
+        """
+        assert (len(objectsToTrack) != 0), "No features to read"
+        dataObject = cls.__new__(cls)
+        dataObject.dataBaseFile = fileName
+        dataObject.objectsToTrack = objectsToTrack
+        dataObject.objectParamDict = dataObject.createDict()
+        dataObject.data = data
+        dataObject.videoCameraFrameRateRatio = videoToIRDataCaptureRatio
+        dataObject.startIndex = readOutStartIndex
+        return dataObject
+
     def checkDataValidity(self, objectRotation, objectTranslation):
         """
         Check if the given rotation and translation parameters are valid
@@ -517,14 +568,38 @@ class TrackerDatabaseReader:
     def computeDataFrameNoFromVideoFrameNo(self, videoFrameNo):
         """
         Computes the corresponding data frame number using given video frame number
-        :param videoFrameNo: video frame no for which data is required
+        :param videoFrameNo: video frame no (or array of them) for which data is required
         :return: data frame no, the frame number registered by VICON system
         """
-        assert (videoFrameNo >= 0), "Video frame number can not be less than 0"
+        assert (np.all(np.asarray(videoFrameNo) >= 0)), "Video frame number can not be less than 0"
 
         dataFrameNo = ( videoFrameNo * int(1/self.videoCameraFrameRateRatio) ) + 1 + self.startIndex
         return np.floor(dataFrameNo)
 
+    def computeVideoFrameNoFromDataFrameNo(self, dataFrameNo):
+        """
+        Inverse of computeDataFrameNoFromVideoFrameNo, works on single values and arrays
+        :param dataFrameNo: data frame no (or array of them) registered by VICON system
+        :return: video frame no, NaN if the data frame has no matching video frame
+        """
+        step = int(1/self.videoCameraFrameRateRatio)
+        offset = np.asarray(dataFrameNo, dtype=np.float64) - 1 - self.startIndex
+        return np.where(np.mod(offset, step) == 0, offset / step, np.nan)
+
+    def getPoseArrays(self):
+        """
+        Returns rotation and translation of all objects for all frames at once
+        :return: array (F,) of data frame numbers, array (F,O,7) of [rot (4), trans (3)] per object, array (F,O) validity
+        """
+        noOfObjects = len(self.objectsToTrack)
+        subData = self.data.values[:, 2:].astype(np.float64)
+        assert (subData.shape[1] == 7 * noOfObjects), " Object param mismatch, given object length does not match with object data in .csv"
+
+        frames = self.data["Frame"].values.astype(np.int64)
+        poses = subData.reshape(subData.shape[0], noOfObjects, 7)
+        validity = ~np.any(np.isnan(poses), axis=2)
+        return frames, poses, validity
+
     def getDataForVideoFrame(self, videoFrameNumber):
         """
         returns rotation, translation data for the query video frame
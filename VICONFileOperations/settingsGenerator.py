@@ -63,6 +63,7 @@ class xmlSettingsParser:
         ET.SubElement(files, "framesToCaptureFile").text =  dataFile + ".framesToCapture.txt"
         ET.SubElement(files, "customFeatureFile").text = "customFeatures.txt"
         ET.SubElement(files, "customFeatureFile3D").text = dataFile + ".customFeatures" + ".txt"
+        ET.SubElement(files, "nexusDataFile").text = os.path.join("nexus", dataFile + "_skeleton.csv")
 
         files = ET.SubElement(root, "videoFiles")
         for camid in cameraIDs:
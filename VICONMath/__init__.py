@@ -3,4 +3,7 @@ from VICONMath import transformations
 from VICONMath import imageOperations
 from VICONMath import stereoComputation
 from VICONMath import mathPointOperations
-from VICONMath import absoluteOrientation
\ No newline at end of file
+from VICONMath import absoluteOrientation
+from VICONMath import sessionDiscrepancy
+from VICONMath import sessionProjection
+from VICONMath import frameSelection
\ No newline at end of file
@@ -0,0 +1,221 @@
+# The file selects frames for annotation automatically. A descriptor of every frame (posture of the objects relative to
+# each other, visibility of the features in all cameras and validity of the poses) is computed for the whole session
+# with array operations and the most diverse frames are picked with farthest point sampling.
+
+import warnings
+import numpy as np
+from VICONMath import transformations as tf
+
+
+def computeReferenceObject(validity, projection):
+    """
+    Object used as reference for the posture, the object with features which is tracked in most frames
+    :param validity: array (F,O)
+    :param projection: instance of sessionProjection.SessionProjection
+    :return: int, index of the object
+    """
+    counts = np.sum(validity, axis=0) * projection.objectHasFeatures
+    return int(np.argmax(counts))
+
+
+def computeFrameDescriptors(projection, poses, validity):
+    """
+    Descriptor of all frames. Every block (posture, visibility, validity) is standardised and weighted with the square
+    root of its size, the blocks contribute equally to the distance between frames.
+    :param projection: instance of sessionProjection.SessionProjection
+    :param poses: array (F,O,7)
+    :param validity: array (F,O)
+    :return: array (F,D) descriptors (float32), array (F,) bool frames with all objects tracked and all features (with
+             3D position) visible
+    """
+    noOfFrames = poses.shape[0]
+    viconPoints, pointValidity = projection.computeViconSpacePoints(poses, validity)
+
+    # Posture : features in the coordinate system of the reference object, independent of position and heading
+    referenceObject = computeReferenceObject(validity, projection)
+    referenceValidity = validity[:, referenceObject]
+    rotationMatrix = tf.quaternionViconArrayToMatrix(poses[:, referenceObject, 0:4], inversion=True)
+    rotationMatrix[~referenceValidity] = np.identity(3)
+    translation = np.where(referenceValidity[:, np.newaxis], poses[:, referenceObject, 4:7], 0)
+    posture = tf.transformPointArray(viconPoints, rotationMatrix, translation, inverse=True)
+    postureValidity = pointValidity & referenceValidity[:, np.newaxis]
+    posture[~postureValidity] = np.nan
+    posture = posture.reshape(noOfFrames, -1)
+
+    # Visibility : feature in front of the camera and inside the image. Features without 3D position in an object
+    # (e.g. custom features not annotated yet) can never be visible, they are left out
+    ownedFeatures = np.flatnonzero(projection.featureObject >= 0)
+    if len(ownedFeatures) != len(projection.features):
+        print("Features without 3D position are not used for the visibility : ",
+              [feature for feature, owner in zip(projection.features, projection.featureObject) if owner < 0])
+    visibility = np.zeros((noOfFrames, len(projection.cameraIds), len(ownedFeatures)), dtype=bool)
+    if noOfFrames != 0 and len(ownedFeatures) != 0:
+        ownedPoints = viconPoints[:, ownedFeatures]
+        ownedValidity = pointValidity[:, ownedFeatures]
+        for cameraIndex, (height, width) in enumerate(projection.imageSizes):
+            cameraPoints, imagePoints = projection.projectToCamera(ownedPoints, cameraIndex)
+            visibility[:, cameraIndex] = (ownedValidity & (cameraPoints[..., 2] > 0) &
+                                          (0 <= imagePoints[..., 0]) & (imagePoints[..., 0] < width) &
+                                          (0 <= imagePoints[..., 1]) & (imagePoints[..., 1] < height))
+
+    fullyVisible = np.all(validity | ~projection.objectHasFeatures, axis=1) & np.all(visibility, axis=(1, 2))
+
+    blocks = []
+    for block in [posture, visibility.reshape(noOfFrames, -1).astype(np.float64), validity.astype(np.float64)]:
+        # Columns without any value (e.g. features never tracked) give empty slice warnings, they are removed below
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)
+            mean = np.nanmean(block, axis=0) if noOfFrames != 0 else np.zeros(block.shape[1])
+            std = np.nanstd(block, axis=0) if noOfFrames != 0 else np.ones(block.shape[1])
+        # Constant columns carry no information, missing values are set to the mean
+        usable = np.isfinite(std) & (std > 0)
+        block = (block[:, usable] - mean[usable]) / std[usable]
+        block[np.isnan(block)] = 0
+        if block.shape[1] != 0:
+            blocks.append(block / np.sqrt(block.shape[1]))
+
+    if len(blocks) == 0:
+        return np.zeros((noOfFrames, 0), dtype=np.float32), fullyVisible
+    return np.concatenate(blocks, axis=1).astype(np.float32), fullyVisible
+
+
+def farthestPointSampling(descriptors, noOfFrames, selected = None):
+    """
+    Greedy selection of the frames with largest distance to all frames selected before
+    :param descriptors: array (F,D)
+    :param noOfFrames: number of frames to select
+    :param selected: list of indices which are already selected (e.g. frames annotated before)
+    :return: list of selected indices (without the given ones)
+    """
+    minDistances = np.full(descriptors.shape[0], np.inf, dtype=np.float32)
+    hasSelection = selected is not None and len(selected) != 0
+    if hasSelection:
+        for index in selected:
+            np.minimum(minDistances, np.sum((descriptors - descriptors[index]) ** 2, axis=1), out=minDistances)
+        minDistances[selected] = -1
+    elif descriptors.shape[0] != 0:
+        # Start with the most unusual frame
+        minDistances = np.sum((descriptors - descriptors.mean(axis=0)) ** 2, axis=1)
+
+    newSelection = []
+    for _ in range(min(noOfFrames, descriptors.shape[0])):
+        index = int(np.argmax(minDistances))
+        if minDistances[index] <= 0 and (hasSelection or len(newSelection) != 0):
+            # Remaining frames are duplicates of selected frames
+            break
+        newSelection.append(index)
+        np.minimum(minDistances, np.sum((descriptors - descriptors[index]) ** 2, axis=1), out=minDistances)
+        minDistances[index] = -1
+
+    return newSelection
+
+
+def snapToFrames(videoFrames, frames):
+    """
+    Nearest video frame of the grid for every given frame
+    :param videoFrames: sorted array (F,) of video frames
+    :param frames: array (N,) of frames
+    :return: array (N,) of video frames
+    """
+    frames = np.asarray(frames, dtype=videoFrames.dtype)
+    position = np.clip(np.searchsorted(videoFrames, frames), 1, len(videoFrames) - 1)
+    if len(videoFrames) == 1:
+        return np.full(len(frames), videoFrames[0], dtype=videoFrames.dtype)
+    previous = videoFrames[position - 1]
+    following = videoFrames[position]
+    return np.where(np.abs(frames - previous) <= np.abs(following - frames), previous, following)
+
+
+def selectDiverseFrames(projection, videoFrames, poses, validity, noOfFrames, excludeFrames = None,
+                        fullyVisibleOnly = True):
+    """
+    Select the most diverse frames of a session for annotation
+    :param projection: instance of sessionProjection.SessionProjection
+    :param videoFrames: sorted array (F,) of video frame numbers
+    :param poses: array (F,O,7)
+    :param validity: array (F,O)
+    :param noOfFrames: number of frames to select
+    :param excludeFrames: video frames selected before, new frames are chosen to differ from them (frames which are not
+                          in videoFrames are replaced by the nearest video frame)
+    :param fullyVisibleOnly: bool, only select frames with all objects tracked and all features visible in all cameras
+    :return: sorted array of selected video frames
+    """
+    videoFrames = np.asarray(videoFrames)
+    descriptors, fullyVisible = computeFrameDescriptors(projection, poses, validity)
+    candidates = fullyVisible if fullyVisibleOnly else np.any(validity, axis=1)
+
+    excluded = np.zeros(len(videoFrames), dtype=bool)
+    if excludeFrames is not None and len(excludeFrames) != 0 and len(videoFrames) != 0:
+        # Frames selected before with another step size are replaced by the nearest frame of the grid
+        excludeFrames = np.asarray(excludeFrames, dtype=videoFrames.dtype)
+        snappedFrames = snapToFrames(videoFrames, excludeFrames)
+        offGrid = snappedFrames != excludeFrames
+        if np.any(offGrid):
+            print("Frames selected before are not on the frame grid, nearest frames are used : ",
+                  dict(zip(excludeFrames[offGrid].tolist(), snappedFrames[offGrid].tolist())))
+        excluded = np.isin(videoFrames, snappedFrames)
+
+    candidateIndex = np.flatnonzero(candidates & ~excluded)
+    excludedIndex = np.flatnonzero(excluded)
+    print("Frames : ", len(videoFrames), " Candidates : ", len(candidateIndex))
+    if len(candidateIndex) < noOfFrames:
+        print("Only ", len(candidateIndex), " candidate frames for ", noOfFrames, " requested frames")
+
+    # Frames selected before are placed in front of the candidates
+    descriptors = np.concatenate([descriptors[excludedIndex], descriptors[candidateIndex]], axis=0)
+    selection = farthestPointSampling(descriptors, noOfFrames, list(range(len(excludedIndex))))
+    selection = np.asarray(selection, dtype=np.int64) - len(excludedIndex)
+    return np.sort(videoFrames[candidateIndex[selection]])
+
+
+def unitTest():
+    """
+    Select frames of an object at a few distinct rotations, each rotation has to be picked once
+    :return: None
+    """
+    class objectMock:
+        def __init__(self, name, featureDict, rotation = (0, 0, 0, 1), translation = (0, 0, 0)):
+            self.name = name
+            self.featureDict = featureDict
+            self.rotation = list(rotation)
+            self.translation = list(translation)
+
+    class imageMock:
+        intrinsicMatrix = np.array([[100, 0, 50], [0, 100, 50], [0, 0, 1]], dtype=np.float64)
+        distortionMatrix = np.zeros((1, 5))
+        imageHeight = 100
+        imageWidth = 100
+
+    from VICONMath import sessionProjection
+    viconObjects = [objectMock("body", {"body_tail": [-1, 0, 0]}),
+                    objectMock("head", {"head_beak": [1, 0, 0]})]
+    projection = sessionProjection.SessionProjection(viconObjects, [objectMock(1, {})], [imageMock()],
+                                                     ["head_beak", "body_tail"])
+
+    # Head rotated around z relative to the body, 4 distinct postures repeated with noise
+    angles = np.repeat(np.array([0, 0.3, 0.6, 0.9]), 25)
+    noOfFrames = len(angles)
+    poses = np.zeros((noOfFrames, 2, 7))
+    poses[:, :, 3] = 1
+    poses[:, :, 4:7] = [0, 0, 10]
+    poses[:, 1, 2] = np.sin(angles / 2) + np.random.RandomState(0).normal(0, 0.001, noOfFrames)
+    poses[:, 1, 3] = np.cos(angles / 2)
+    validity = np.ones((noOfFrames, 2), dtype=bool)
+    videoFrames = np.arange(0, 2 * noOfFrames, 2)
+
+    frames = selectDiverseFrames(projection, videoFrames, poses, validity, 4)
+    print("Selected angles (should be 0 0.3 0.6 0.9): ", np.sort(angles[frames // 2]))
+    frames = selectDiverseFrames(projection, videoFrames, poses, validity, 2, excludeFrames=frames[:2])
+    print("Selected angles (should be the two others): ", np.sort(angles[frames // 2]))
+    frames = selectDiverseFrames(projection, videoFrames, poses, validity, 2, excludeFrames=frames + 1)
+    print("Seeds off the grid (should be the two others): ", np.sort(angles[frames // 2]))
+
+    # A feature without object (not annotated yet) does not make all frames ineligible
+    projection = sessionProjection.SessionProjection(viconObjects, [objectMock(1, {})], [imageMock()],
+                                                     ["head_beak", "body_tail", "extra"])
+    frames = selectDiverseFrames(projection, videoFrames, poses, validity, 4)
+    print("Selected angles with unknown feature (should be 0 0.3 0.6 0.9): ", np.sort(angles[frames // 2]))
+
+
+if __name__ == '__main__':
+    unitTest()
@@ -34,6 +34,24 @@ def projectPointCamSpaceToImgSpace(point3d, k, dist):
 
     return imgPoints
 
+def projectPointArrayCamSpaceToImgSpace(point3d, k, dist):
+    """
+    Projects an (N,3) array of 3D points from camera space to image space in one call, array version of
+    projectPointCamSpaceToImgSpace
+    :param point3d: array (N,3) (or (...,3), all leading dimensions are projected at once)
+    :param k: intrinsic matrix 3x3
+    :param dist: distortion parameters
+    :return: array (...,2) of image points
+    """
+    point3d = np.ascontiguousarray(point3d, dtype=np.float64)
+    shape = point3d.shape[:-1]
+    assert (point3d.size != 0), "No points given in list"
+
+    # Identity rotation and zero translation, points are already in camera space
+    imgProjections, jacobian = cv.projectPoints(point3d.reshape(-1, 1, 3), np.zeros(3), np.zeros(3),
+                                                np.asarray(k, dtype=np.float64), np.asarray(dist, dtype=np.float64))
+    return imgProjections.reshape(shape + (2,))
+
 # todo : Write a function that projects points from world space to image space
 def prointPointWorldSpaceToImgSpace(points3D, k , dist , rot , trans):
     imgPoints = []
@@ -47,6 +65,52 @@ def isPointValid(point, rows, cols ):
         status = True
     return status
 
+def computePointValidity(points, rows, cols):
+    """
+    Array version of isPointValid
+    :param points: array (...,2) of image points (x, y)
+    :param rows: image height
+    :param cols: image width
+    :return: array (...) bool, True if the point is inside the image (NaN points are not valid)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        x = np.trunc(points[..., 0])
+        y = np.trunc(points[..., 1])
+        return (0 <= x) & (x < cols) & (0 <= y) & (y < rows)
+
+def scaleImagePoints(points, scale):
+    """
+    Map image points to an image of other resolution (e.g. proxy videos), pixel centres are mapped to pixel centres
+    :param points: [x,y] or array (...,2) of image points
+    :param scale: [sx, sy] size of the target image / size of the source image
+    :return: array (...,2)
+    """
+    return (np.asarray(points, dtype=np.float64) + 0.5) * np.asarray(scale, dtype=np.float64) - 0.5
+
+def computeRoiArray(points, rows, cols, size = 100):
+    """
+    Regions of interest around many points at once, array version of ImageVicon.getRoi
+    :param points: array (...,2) of image points (x, y)
+    :param rows: image height
+    :param cols: image width
+    :param size: half size of the region
+    :return: array (...,4) of int regions [x1, x2, y1, y2], array (...) bool, True if the point is annotated and inside
+             the image (see isPointValid)
+    """
+    points = np.asarray(points, dtype=np.float64)
+    with np.errstate(invalid='ignore'):
+        x = np.trunc(points[..., 0])
+        y = np.trunc(points[..., 1])
+        valid = (x != 0) & (y != 0) & (0 <= x) & (x < cols) & (0 <= y) & (y < rows)
+    x = np.where(valid, x, 0).astype(np.int64)
+    y = np.where(valid, y, 0).astype(np.int64)
+
+    roi = np.stack([np.maximum(x - size, 0), x + size, np.maximum(y - size, 0), y + size], axis=-1)
+    roi[..., 1] = np.where(roi[..., 1] > cols, cols - 1, roi[..., 1])
+    roi[..., 3] = np.where(roi[..., 3] > rows, rows - 1, roi[..., 3])
+    return roi, valid
+
 def filterBBoxPoints(points):
     origin =  [0,0]
     distances = []
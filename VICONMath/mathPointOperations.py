@@ -49,6 +49,19 @@ def findDistance3D(point1, point2):
     dist = np.sqrt((xDist*xDist) + (yDist*yDist) + (zDist*zDist))
     return dist
 
+def pointDistance3DArray(points1, points2):
+    """
+    Compute distance between two sets of points in one operation, array version of findDistance3D
+    :param points1: array (...,3) of points
+    :param points2: array (...,3) of points
+    :return: array (...) of distances, NaN where one of the points is missing
+    """
+    points1 = np.asarray(points1, dtype=np.float64)
+    points2 = np.asarray(points2, dtype=np.float64)
+    assert (points1.shape == points2.shape), " Shape of given array do not match"
+
+    return np.sqrt(np.sum(np.square(points1 - points2), axis=-1))
+
 def filterData(data):
     """
     Removes points with no data from 3xN matrix.
@@ -124,6 +137,9 @@ def main():
 
     print("Dist Dict : ", distDict)
 
+    distArray = pointDistance3DArray([point1, point2], [point2, point2])
+    print("Dist Array : ", distArray)
+
     point = np.zeros((3, 4))
     point[:, 1] = 1
     output, index = filterData(point)
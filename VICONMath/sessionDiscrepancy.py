@@ -0,0 +1,169 @@
+# The file compares the marker positions computed from the Tracker output (pose of objects + .mp files) with the marker
+# positions exported by Nexus, for the whole session at once instead of frame by frame.
+
+import numpy as np
+import pandas as pd
+from VICONMath import transformations as tf
+from VICONMath import mathPointOperations as pointOp
+
+
+class SessionDiscrepancy:
+    """
+    The class aligns the frame axes of the Tracker and Nexus readers once and computes per marker Euclidean errors for
+    every frame as one array operation.
+    """
+    def __init__(self, trackerDataObject, nexusDataObject, viconObjects, videoFramesOnly = True):
+        """
+        Initialize the comparison between the two readers
+        :param trackerDataObject: instance of rwOperations.TrackerDatabaseReader
+        :param nexusDataObject: instance of rwOperations.NexusDatabaseReader
+        :param viconObjects: list of ObjectVicon instances (features in object space, .mp markers)
+        :param videoFramesOnly: bool, only compare data frames which have a matching video frame
+        """
+        assert (len(viconObjects) != 0), "No vicon objects given for the comparison"
+        self.trackerDataObject = trackerDataObject
+        self.nexusDataObject = nexusDataObject
+        self.viconObjects = viconObjects
+        self.videoFramesOnly = videoFramesOnly
+
+        self.markers = []
+        self.frames = np.zeros(0, dtype=np.int64)
+        self.videoFrames = np.zeros(0)
+        self.errors = np.zeros((0, 0))
+
+    def alignFrames(self):
+        """
+        Find the data frames present in both the readers
+        :return: array of common frames, index of the frames in tracker data, index of the frames in nexus data
+        """
+        trackerFrames = self.trackerDataObject.getPoseArrays()[0]
+        nexusFrames = self.nexusDataObject.getPointArrays()[0]
+        commonFrames, trackerIndex, nexusIndex = np.intersect1d(trackerFrames, nexusFrames, return_indices=True)
+
+        if self.videoFramesOnly:
+            videoFrames = self.trackerDataObject.computeVideoFrameNoFromDataFrameNo(commonFrames)
+            keep = ~np.isnan(videoFrames)
+            commonFrames, trackerIndex, nexusIndex = commonFrames[keep], trackerIndex[keep], nexusIndex[keep]
+
+        return commonFrames, trackerIndex, nexusIndex
+
+    def computeTrackerPoints(self, poses, validity):
+        """
+        Transfer the features of all objects to vicon space for all given poses
+        :param poses: array (F,O,7) rotation and translation per object
+        :param validity: array (F,O) validity of the poses
+        :return: list of marker names, array (F,N,3) of points in vicon space (NaN if pose is not valid)
+        """
+        objectNames = self.trackerDataObject.objectsToTrack
+        markerNames = []
+        pointArrays = []
+        for viconObject in self.viconObjects:
+            objectIndex = objectNames.index(viconObject.name)
+            featurePoints = np.array(list(viconObject.featureDict.values()), dtype=np.float64)
+            rotationMatrix = tf.quaternionViconArrayToMatrix(poses[:, objectIndex, 0:4])
+            points = tf.transformPointArray(featurePoints, rotationMatrix, poses[:, objectIndex, 4:7])
+            points[~validity[:, objectIndex]] = np.nan
+
+            markerNames.extend(list(viconObject.featureDict))
+            pointArrays.append(points)
+
+        return markerNames, np.concatenate(pointArrays, axis=1)
+
+    def compute(self):
+        """
+        Compute the error between Tracker and Nexus points for all common markers and frames
+        :return: array (F,M) of errors
+        """
+        commonFrames, trackerIndex, nexusIndex = self.alignFrames()
+        _, poses, validity = self.trackerDataObject.getPoseArrays()
+        _, nexusPoints = self.nexusDataObject.getPointArrays()
+
+        trackerMarkers, trackerPoints = self.computeTrackerPoints(poses[trackerIndex], validity[trackerIndex])
+        nexusMarkers = self.nexusDataObject.featureList
+
+        self.markers = [marker for marker in trackerMarkers if marker in nexusMarkers]
+        if len(self.markers) == 0:
+            print("No common markers between Tracker and Nexus data")
+
+        trackerMarkerIndex = [trackerMarkers.index(marker) for marker in self.markers]
+        nexusMarkerIndex = [nexusMarkers.index(marker) for marker in self.markers]
+
+        self.frames = commonFrames
+        self.videoFrames = self.trackerDataObject.computeVideoFrameNoFromDataFrameNo(commonFrames)
+        self.errors = pointOp.pointDistance3DArray(trackerPoints[:, trackerMarkerIndex],
+                                                   nexusPoints[nexusIndex][:, nexusMarkerIndex])
+        return self.errors
+
+    def summary(self, noOfWorstFrames = 5):
+        """
+        Compact summary of the errors per marker
+        :param noOfWorstFrames: number of frames with highest error reported per marker
+        :return: data frame (pandas), one row per marker
+        """
+        rows = []
+        for index, marker in enumerate(self.markers):
+            errors = self.errors[:, index]
+            valid = ~np.isnan(errors)
+            row = {"marker": marker, "validFrames": int(np.sum(valid)), "totalFrames": len(errors),
+                   "mean": np.nan, "p95": np.nan, "max": np.nan, "worstFrames": ""}
+            if np.any(valid):
+                validErrors = errors[valid]
+                worstIndex = np.argsort(validErrors)[::-1][:noOfWorstFrames]
+                row["mean"] = np.mean(validErrors)
+                row["p95"] = np.percentile(validErrors, 95)
+                row["max"] = np.max(validErrors)
+                row["worstFrames"] = " ".join(str(frame) for frame in self.frames[valid][worstIndex])
+            rows.append(row)
+
+        return pd.DataFrame(rows, columns=["marker", "validFrames", "totalFrames", "mean", "p95", "max", "worstFrames"])
+
+    def writeReport(self, outputPrefix, noOfWorstFrames = 5):
+        """
+        Write the summary (.csv) and the full error array (.npz)
+        :param outputPrefix: str, path without extension
+        :return: data frame (pandas) of the summary
+        """
+        summary = self.summary(noOfWorstFrames)
+        summary.to_csv(outputPrefix + ".summary.csv", index=False)
+        np.savez_compressed(outputPrefix + ".errors.npz", frames=self.frames, videoFrames=self.videoFrames,
+                            markers=np.array(self.markers), errors=self.errors)
+        return summary
+
+
+def unitTest():
+    """
+    Compare points with themselves shifted by a known offset
+    :return: None
+    """
+    class readerMock:
+        objectsToTrack = ["obj"]
+        featureList = ["obj1", "obj2"]
+        videoCameraFrameRateRatio = 0.5
+        startIndex = 0
+
+        def getPoseArrays(self):
+            frames = np.array([1, 2, 3, 5])
+            poses = np.tile([0, 0, 0, 1, 10, 0, 0], (4, 1, 1)).astype(np.float64)
+            return frames, poses, np.ones((4, 1), dtype=bool)
+
+        def getPointArrays(self):
+            frames = np.array([1, 3, 4, 5])
+            points = np.tile([[10, 0, 0], [13, 4, 0]], (4, 1, 1)).astype(np.float64)
+            return frames, points
+
+        def computeVideoFrameNoFromDataFrameNo(self, dataFrameNo):
+            offset = np.asarray(dataFrameNo, dtype=np.float64) - 1
+            return np.where(np.mod(offset, 2) == 0, offset / 2, np.nan)
+
+    class objectMock:
+        name = "obj"
+        featureDict = {"obj1": [0, 0, 0], "obj2": [0, 0, 0]}
+
+    reader = readerMock()
+    comparison = SessionDiscrepancy(reader, reader, [objectMock()])
+    print("Errors (should be 0 and 5): ", comparison.compute())
+    print(comparison.summary())
+
+
+if __name__ == '__main__':
+    unitTest()
@@ -0,0 +1,282 @@
+# The file projects the features of the tracked objects to the images of all cameras for many frames at once. It is the
+# array version of the frame by frame loop (object space -> vicon space -> camera space -> image space) of the
+# automatic annotation tool, the result is stored in the columns of the annotation database.
+
+import numpy as np
+from VICONMath import transformations as tf
+from VICONMath import imageOperations as imageOp
+
+# Features used for the bounding box, see imageVicon.computeBoundingBox
+boundingBoxFeatures = ["head_beak", "body_tail"]
+boundingBoxOffset = 40
+
+
+def getAnnotationColumns(featureList):
+    """
+    Column names of the annotation database in the order of rwOperations.annotationDatabase.generateDataSeries
+    :param featureList: list of features
+    :return: list of str
+    """
+    columns = ["frame"]
+    for feature in featureList:
+        columns += [feature + "_2d_x", feature + "_2d_y"]
+    for feature in featureList:
+        columns += [feature + "_3d_x", feature + "_3d_y", feature + "_3d_z"]
+    columns += ["lCorner_2d_x", "lCorner_2d_y", "rCorner_2d_x", "rCorner_2d_y"]
+    return columns
+
+
+def getPosesForVideoFrames(dataObject, videoFrames):
+    """
+    Pose of all objects for the given video frames, array version of TrackerDatabaseReader.getDataForVideoFrame
+    :param dataObject: instance of rwOperations.TrackerDatabaseReader
+    :param videoFrames: array (F,) of video frame numbers
+    :return: array (F,O,7) poses, array (F,O) validity (False if the data frame is missing)
+    """
+    dataFrames, poses, validity = dataObject.getPoseArrays()
+    dataFrameNos = dataObject.computeDataFrameNoFromVideoFrameNo(np.asarray(videoFrames))
+
+    # First row of each data frame, like the frame lookup of the reader
+    order = np.argsort(dataFrames, kind="stable")
+    position = np.clip(np.searchsorted(dataFrames[order], dataFrameNos), 0, max(len(order) - 1, 0))
+    found = np.zeros(len(dataFrameNos), dtype=bool)
+    if len(order) != 0:
+        found = dataFrames[order][position] == dataFrameNos
+
+    rowIndex = order[position] if len(order) != 0 else np.zeros(len(dataFrameNos), dtype=np.int64)
+    framePoses = np.zeros((len(dataFrameNos),) + poses.shape[1:])
+    frameValidity = np.zeros((len(dataFrameNos), poses.shape[1]), dtype=bool)
+    framePoses[found] = poses[rowIndex[found]]
+    frameValidity[found] = validity[rowIndex[found]]
+    return framePoses, frameValidity
+
+
+class SessionProjection:
+    """
+    Static data of a session (object features, camera parameters) as arrays, the class only holds arrays so it can be
+    sent to worker processes.
+    """
+    def __init__(self, viconObjects, viconCamObjects, imageObjects, featureList):
+        """
+        Initialize the projection
+        :param viconObjects: list of ObjectVicon instances (features in object space), in the order of the tracker data
+        :param viconCamObjects: list of ObjectVicon instances of the cameras (inverted camera rotation)
+        :param imageObjects: list of ImageVicon instances (intrinsic and distortion), same order as the cameras
+        :param featureList: list of features saved in the annotation database
+        """
+        assert (len(viconCamObjects) == len(imageObjects)), "Camera objects and image objects do not match"
+        self.featureList = list(featureList)
+        self.columns = getAnnotationColumns(self.featureList)
+
+        # Features of all objects, later objects overwrite features with the same name (like FeatureSet.update)
+        self.objectFeatures = []
+        featureOwner = {}
+        for objectIndex, viconObject in enumerate(viconObjects):
+            names = list(viconObject.featureDict)
+            self.objectFeatures.append(np.array([viconObject.featureDict[name] for name in names],
+                                                dtype=np.float64).reshape(len(names), 3))
+            for featureIndex, name in enumerate(names):
+                featureOwner[name] = (objectIndex, featureIndex)
+        self.objectHasFeatures = np.array([len(features) != 0 for features in self.objectFeatures], dtype=bool)
+
+        # Features required for the database and the bounding box : owner object and index in the object features
+        self.features = self.featureList + [feature for feature in boundingBoxFeatures if feature not in self.featureList]
+        self.featureObject = np.array([featureOwner.get(feature, (-1, -1))[0] for feature in self.features],
+                                      dtype=np.int64)
+        self.featureIndex = np.array([featureOwner.get(feature, (-1, -1))[1] for feature in self.features],
+                                     dtype=np.int64)
+
+        # Camera space : P_c = R_inv . (P_v - T)
+        self.cameraIds = []
+        self.cameraRotations = []
+        self.cameraTranslations = []
+        self.intrinsicMatrices = []
+        self.distortionMatrices = []
+        self.imageSizes = []
+        for viconCamObject, imageObject in zip(viconCamObjects, imageObjects):
+            rotationMatrixInv, translation = tf.transformationParamListToMatrix(viconCamObject.rotation,
+                                                                                viconCamObject.translation,
+                                                                                inversion=True)
+            self.cameraIds.append(viconCamObject.name)
+            self.cameraRotations.append(np.asarray(rotationMatrixInv, dtype=np.float64))
+            self.cameraTranslations.append(np.asarray(translation, dtype=np.float64).reshape(3))
+            self.intrinsicMatrices.append(np.asarray(imageObject.intrinsicMatrix, dtype=np.float64))
+            self.distortionMatrices.append(np.asarray(imageObject.distortionMatrix, dtype=np.float64))
+            self.imageSizes.append((getattr(imageObject, "imageHeight", 1080), getattr(imageObject, "imageWidth", 1920)))
+
+    def computeFrameValidity(self, validity):
+        """
+        Frames with at least one tracked object having features, other frames are skipped by the annotation tool
+        :param validity: array (F,O)
+        :return: array (F,) bool
+        """
+        return np.any(validity & self.objectHasFeatures, axis=1)
+
+    def computeViconSpacePoints(self, poses, validity):
+        """
+        Features in vicon space for all frames
+        :param poses: array (F,O,7)
+        :param validity: array (F,O)
+        :return: array (F,M,3) of points, array (F,M) validity of the points
+        """
+        noOfFrames = poses.shape[0]
+        points = np.zeros((noOfFrames, len(self.features), 3))
+        pointValidity = np.zeros((noOfFrames, len(self.features)), dtype=bool)
+
+        for objectIndex, objectFeatures in enumerate(self.objectFeatures):
+            columns = np.flatnonzero(self.featureObject == objectIndex)
+            if len(columns) == 0:
+                continue
+            objectValidity = validity[:, objectIndex]
+            rotationMatrix = tf.quaternionViconArrayToMatrix(poses[objectValidity, objectIndex, 0:4])
+            objectPoints = tf.transformPointArray(objectFeatures[self.featureIndex[columns]], rotationMatrix,
+                                                  poses[objectValidity, objectIndex, 4:7])
+            points[np.ix_(objectValidity, columns)] = objectPoints
+            pointValidity[np.ix_(objectValidity, columns)] = True
+
+        return points, pointValidity
+
+    def computeBoundingBoxes(self, imagePoints, pointValidity):
+        """
+        Bounding box corners, array version of imageVicon.computeBoundingBox
+        :param imagePoints: array (F,M,2)
+        :param pointValidity: array (F,M)
+        :return: array (F,4) [lCorner x, lCorner y, rCorner x, rCorner y], zeros if no bounding box
+        """
+        head = imagePoints[:, self.features.index(boundingBoxFeatures[0])]
+        tail = imagePoints[:, self.features.index(boundingBoxFeatures[1])]
+        hasBox = (pointValidity[:, self.features.index(boundingBoxFeatures[0])] &
+                  pointValidity[:, self.features.index(boundingBoxFeatures[1])] &
+                  np.any(head != 0, axis=1) & np.any(tail != 0, axis=1))
+        headLeft = head[:, 0] < tail[:, 0]
+        offset = boundingBoxOffset
+
+        boxes = np.where(headLeft[:, np.newaxis],
+                         np.stack([head[:, 0] - offset, head[:, 1] - offset, tail[:, 0] + offset, tail[:, 1] + offset], axis=1),
+                         np.stack([tail[:, 0] - offset, tail[:, 1] + offset, head[:, 0] + offset, head[:, 1] - offset], axis=1))
+        boxes[~hasBox] = 0
+        return boxes
+
+    def projectToCamera(self, viconPoints, cameraIndex):
+        """
+        Transfer points from vicon space to camera space and project them on the image of the camera
+        :param viconPoints: array (F,M,3)
+        :param cameraIndex: int
+        :return: array (F,M,3) points in camera space, array (F,M,2) image points
+        """
+        cameraPoints = tf.transformPointArray(viconPoints, self.cameraRotations[cameraIndex],
+                                              self.cameraTranslations[cameraIndex], inverse=True)
+        imagePoints = imageOp.projectPointArrayCamSpaceToImgSpace(cameraPoints, self.intrinsicMatrices[cameraIndex],
+                                                                  self.distortionMatrices[cameraIndex])
+        return cameraPoints, imagePoints
+
+    def compute(self, videoFrames, poses, validity, cameraIndices = None):
+        """
+        Annotation of all cameras for the given frames
+        :param videoFrames: array (F,) of video frame numbers
+        :param poses: array (F,O,7)
+        :param validity: array (F,O)
+        :param cameraIndices: list of cameras to compute, default all cameras
+        :return: list (one per camera) of dict {column: array}, only frames with tracking data are included
+        """
+        if cameraIndices is None:
+            cameraIndices = range(len(self.cameraIds))
+        keep = self.computeFrameValidity(validity)
+        videoFrames = np.asarray(videoFrames)[keep]
+        viconPoints, pointValidity = self.computeViconSpacePoints(poses[keep], validity[keep])
+        noOfFeatures = len(self.featureList)
+
+        cameraColumns = []
+        for cameraIndex in cameraIndices:
+            columns = {"frame": videoFrames}
+            if len(videoFrames) == 0:
+                for column in self.columns[1:]:
+                    columns[column] = np.zeros(0)
+                cameraColumns.append(columns)
+                continue
+
+            cameraPoints, imagePoints = self.projectToCamera(viconPoints, cameraIndex)
+            # Features of objects without tracking data are saved as 0
+            cameraPoints[~pointValidity] = 0
+            imagePoints[~pointValidity] = 0
+
+            for featureIndex, feature in enumerate(self.featureList):
+                columns[feature + "_2d_x"] = imagePoints[:, featureIndex, 0]
+                columns[feature + "_2d_y"] = imagePoints[:, featureIndex, 1]
+            for featureIndex, feature in enumerate(self.featureList):
+                columns[feature + "_3d_x"] = cameraPoints[:, featureIndex, 0]
+                columns[feature + "_3d_y"] = cameraPoints[:, featureIndex, 1]
+                columns[feature + "_3d_z"] = cameraPoints[:, featureIndex, 2]
+
+            boxes = self.computeBoundingBoxes(imagePoints, pointValidity)
+            for boxIndex, column in enumerate(self.columns[1 + 5 * noOfFeatures:]):
+                columns[column] = boxes[:, boxIndex]
+
+            cameraColumns.append(columns)
+
+        return cameraColumns
+
+
+def loadSessionProjection(projectSettings, stepSize = 2, computeColumns = True):
+    """
+    Session setup of the headless tools : system with the custom tracking features, projection of the features in the
+    feature file and poses of every stepSize-th video frame. The videos must have the same number of frames, the frame
+    count is taken from the video objects without opening a reader.
+    :param projectSettings: instance of settingsGenerator.xmlSettingsParser
+    :param stepSize: step between video frames
+    :param computeColumns: bool, compute the annotation columns of all cameras
+    :return: viconSystemData, projection, videoFrames, poses, validity, cameraColumns (None if not computed)
+    """
+    import os
+    from VICONSystem import systemInit as system
+    from VICONFileOperations import rwOperations
+
+    directoryName = projectSettings.settingsDict["rootDirectory"]
+    viconSystemData = system.VICONSystemInit(projectSettings, directoryName, parallelLoad=True, useSnapshot=True)
+    viconSystemData.loadCustomTrackingFeaturesToTrackingObjects()
+
+    frameCounts = [video.totalFrameCount for video in viconSystemData.viconVideoObjects]
+    if len(frameCounts) == 0 or frameCounts.count(frameCounts[0]) != len(frameCounts):
+        raise ValueError("Video files do not have same frame number : " + str(frameCounts))
+
+    featureFile = os.path.join(directoryName, projectSettings.settingsDict["customFeatureFile"])
+    featureList = rwOperations.readFeaturesFromFile(featureFile)
+    projection = SessionProjection(viconSystemData.viconObjects, viconSystemData.viconCameraObjets,
+                                   viconSystemData.viconImageObjects, featureList)
+
+    videoFrames = np.arange(0, frameCounts[0], stepSize)
+    poses, validity = getPosesForVideoFrames(viconSystemData.dataObject, videoFrames)
+    cameraColumns = projection.compute(videoFrames, poses, validity) if computeColumns else None
+    return viconSystemData, projection, videoFrames, poses, validity, cameraColumns
+
+
+def unitTest():
+    """
+    Project one feature of an object at the origin of a camera looking along z
+    :return: None
+    """
+    class objectMock:
+        def __init__(self, name, featureDict, rotation = (0, 0, 0, 1), translation = (0, 0, 0)):
+            self.name = name
+            self.featureDict = featureDict
+            self.rotation = list(rotation)
+            self.translation = list(translation)
+
+    class imageMock:
+        intrinsicMatrix = np.array([[100, 0, 50], [0, 100, 50], [0, 0, 1]], dtype=np.float64)
+        distortionMatrix = np.zeros((1, 5))
+
+    viconObjects = [objectMock("bird", {"head_beak": [0, 0, 10], "body_tail": [1, 0, 10]})]
+    cameraObjects = [objectMock(1, {})]
+    projection = SessionProjection(viconObjects, cameraObjects, [imageMock()], ["head_beak", "body_tail"])
+
+    poses = np.array([[[0, 0, 0, 1, 0, 0, 0]], [[0, 0, 0, 1, 0, 0, 0]], [[np.nan] * 7]])
+    validity = ~np.any(np.isnan(poses), axis=2)
+    columns = projection.compute(np.array([0, 2, 4]), poses, validity)[0]
+    print("Frames (should be 0 2): ", columns["frame"])
+    print("head_beak 2D (should be 50 50): ", columns["head_beak_2d_x"], columns["head_beak_2d_y"])
+    print("Bounding box: ", [columns[column] for column in projection.columns[-4:]])
+
+
+if __name__ == '__main__':
+    unitTest()
@@ -132,6 +132,28 @@ def triangulatePoints( image1Object, viconCam1Object, image2Object, viconCam2Obj
 
     return triangulatedPointsMatrix.tolist()
 
+def triangulatePointArray(image1Object, viconCam1Object, image2Object, viconCam2Object, img1Points, img2Points):
+    """
+    Triangulate all given point pairs (e.g. all features of all frames of a session) with one call, array version of
+    triangulatePoints. Result is in 3D space of camera 1.
+    :param img1Points: array (N,2) of points in image 1
+    :param img2Points: array (N,2) of points in image 2
+    :return: array (N,3) of points
+    """
+    img1Points = np.asarray(img1Points, dtype=np.float64).reshape(-1, 2)
+    img2Points = np.asarray(img2Points, dtype=np.float64).reshape(-1, 2)
+    assert (img1Points.shape == img2Points.shape), "Number of points in the images do not match"
+    if img1Points.shape[0] == 0:
+        return np.zeros((0, 3))
+
+    rotationMatrix, translationMatrix = computeExtrinsicsFromViconCamObject(viconCam2Object, viconCam1Object)
+    projectionMatrixCam1 = image1Object.projectionMatrix(np.identity(3), np.zeros((3, 1)))
+    projectionMatrixCam2 = image2Object.projectionMatrix(rotationMatrix, translationMatrix)
+
+    homogeneousPoints = cv.triangulatePoints(np.asarray(projectionMatrixCam1), np.asarray(projectionMatrixCam2),
+                                             np.float32(img1Points.T), np.float32(img2Points.T))
+    return cv.convertPointsFromHomogeneous(homogeneousPoints.T).reshape(-1, 3).astype(np.float64)
+
 
 def unitTest():
     # FYI : Inverted angles as stored in the file
@@ -190,6 +212,8 @@ def unitTest():
     triangulatorObject = StereoTrinagulator([viconCam1Object,viconCam2Object],[image1Object,image2Object])
     triangulatedPoints = triangulatorObject.getTriangulatedPoints()# triangulatePoints(image1Object, viconCam1Object, image2Object, viconCam2Object)
     print("Triangulated Points", triangulatedPoints)
+    print("Triangulated Point Array", triangulatePointArray(image1Object, viconCam1Object, image2Object, viconCam2Object,
+                                                            list(img1Points.values()), list(img2Points.values())))
 
 
     # Testing the filter function for the traingulation and filtering
@@ -345,6 +345,58 @@ def transformationParamListToMatrix(rotation, translation, inversion = False):
     return rotationMatrix, translationmatrix
 
 
+def quaternionViconArrayToMatrix(rotationArray, inversion = False):
+    """
+    Convert an array of quaternions (vicon format x,y,z,w) to rotation matrices in one operation, array version of
+    quaternionViconListToMatrix. Quaternions are normalised the same way pyquaternion does it.
+    :param rotationArray: array (...,4) of rotation parameters
+    :param inversion: Bool, return matrices for backward transformation
+    :return: array (...,3,3) of rotation matrices (NaN for missing rotation data)
+    """
+    rotationArray = np.asarray(rotationArray, dtype=np.float64)
+    assert (rotationArray.shape[-1] == 4), "Method expects 4 parameters per quaternion"
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        norm = np.linalg.norm(rotationArray, axis=-1, keepdims=True)
+        x, y, z, w = np.moveaxis(rotationArray / norm, -1, 0)
+
+    rotationMatrix = np.empty(rotationArray.shape[:-1] + (3, 3))
+    rotationMatrix[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    rotationMatrix[..., 0, 1] = 2 * (x * y - z * w)
+    rotationMatrix[..., 0, 2] = 2 * (x * z + y * w)
+    rotationMatrix[..., 1, 0] = 2 * (x * y + z * w)
+    rotationMatrix[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    rotationMatrix[..., 1, 2] = 2 * (y * z - x * w)
+    rotationMatrix[..., 2, 0] = 2 * (x * z - y * w)
+    rotationMatrix[..., 2, 1] = 2 * (y * z + x * w)
+    rotationMatrix[..., 2, 2] = 1 - 2 * (x * x + y * y)
+
+    if inversion:
+        # Inverse of a rotation matrix is its transpose
+        rotationMatrix = np.swapaxes(rotationMatrix, -1, -2)
+
+    return rotationMatrix
+
+def transformPointArray(pointArray, rotationMatrix, translation, inverse = False):
+    """
+    Transform points for many poses at once, array version of transformPoints and invertPoints.
+    :param pointArray: array (...,N,3) of points
+    :param rotationMatrix: array (...,3,3), already inverted when inverse is True (see invertPoints)
+    :param translation: array (...,3)
+    :param inverse: Bool, P_out = R.(P - T) instead of P_out = R.P + T
+    :return: array (...,N,3) of transformed points
+    """
+    pointArray = np.asarray(pointArray, dtype=np.float64)
+    translation = np.asarray(translation, dtype=np.float64)[..., np.newaxis, :]
+
+    if inverse:
+        # P_out (Nx3) = (P_in (Nx3) - T) . R_inv^T
+        return np.matmul(pointArray - translation, np.swapaxes(rotationMatrix, -1, -2))
+
+    # P_out (Nx3) = P (Nx3) . R^T + T
+    return np.matmul(pointArray, np.swapaxes(rotationMatrix, -1, -2)) + translation
+
+
 def rotMatrixToQuat(rotMatrix):
     """convert rotation matrix to quaternion form"""
 
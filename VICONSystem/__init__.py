@@ -4,4 +4,7 @@ from VICONSystem import systemInit
 from VICONSystem import objectVicon
 from VICONSystem import imageVicon
 from VICONSystem import videoVicon
-from VICONSystem import pointVicon
\ No newline at end of file
+from VICONSystem import pointVicon
+from VICONSystem import featureSet
+from VICONSystem import dataStreamClient
+from VICONSystem import dataStreamReplay
\ No newline at end of file
@@ -0,0 +1,623 @@
+# The file receives the Vicon DataStream on a dedicated thread. The SDK pull loop (GetFrame and the data calls) writes
+# every frame in a slot of a ring buffer of preallocated frame records, the processing reads the frames through an
+# asyncio async iterator (or blocking getFrame) and does not delay the reception. When the consumer is behind, the
+# oldest or the newest frame is dropped and counted, gaps in the stream frame numbers are counted as well.
+# The vicon_dssdk package is only needed for a live system, FakeViconClient serves synthetic frames for the tests.
+
+import time
+import asyncio
+import threading
+from collections import deque
+import numpy as np
+
+# Policies when the ring buffer is full
+dropOldest = "dropOldest"
+dropNewest = "dropNewest"
+
+
+class FrameRecord:
+    """
+    View on one slot of the ring buffer, valid until it is released (the async iterator releases it with the next frame)
+    """
+    def __init__(self, ringBuffer, slot):
+        self.ringBuffer = ringBuffer
+        self.slot = slot
+        self.frameNumber = int(ringBuffer.frameNumbers[slot])
+        self.timestamp = float(ringBuffer.timestamps[slot])
+        self.subjectNames = ringBuffer.subjectNames[slot]
+        self.markerNames = ringBuffer.markerNames[slot]
+        noOfSubjects = len(self.subjectNames)
+        self.noOfMarkers = ringBuffer.noOfMarkers[slot, :noOfSubjects]
+        self.markerPositions = ringBuffer.markerPositions[slot, :noOfSubjects]
+        self.markerOcclusions = ringBuffer.markerOcclusions[slot, :noOfSubjects]
+        self.rotations = ringBuffer.rotations[slot, :noOfSubjects]
+        self.translations = ringBuffer.translations[slot, :noOfSubjects]
+        self.segmentOcclusions = ringBuffer.segmentOcclusions[slot, :noOfSubjects]
+        self.qualities = ringBuffer.qualities[slot, :noOfSubjects]
+
+    def release(self):
+        """
+        Return the slot to the ring buffer, the arrays of the record must not be used afterwards
+        :return: None
+        """
+        if self.slot is not None:
+            self.ringBuffer.release(self.slot)
+            self.slot = None
+
+    def __repr__(self):
+        return "FrameRecord(frame={}, subjects={})".format(self.frameNumber, self.subjectNames)
+
+
+class FrameRingBuffer:
+    """
+    Fixed number of preallocated frame records (frame number, receive time, root segment pose, quality and marker
+    positions of every subject). The receive thread fills free slots, the consumer leases the queued slots in order.
+    """
+    def __init__(self, capacity = 64, maxSubjects = 8, maxMarkers = 16, policy = dropOldest):
+        """
+        Initialize the records
+        :param capacity: number of frames in the buffer
+        :param maxSubjects: maximum number of subjects of a frame
+        :param maxMarkers: maximum number of markers of a subject
+        :param policy: dropOldest (keep the latest frames) or dropNewest (keep the queued frames)
+        """
+        if policy not in (dropOldest, dropNewest):
+            raise ValueError("Unknown drop policy : {}".format(policy))
+        assert (capacity > 1), "Ring buffer needs at least 2 slots"
+        self.capacity = capacity
+        self.maxSubjects = maxSubjects
+        self.maxMarkers = maxMarkers
+        self.policy = policy
+
+        self.frameNumbers = np.zeros(capacity, dtype=np.int64)
+        self.timestamps = np.zeros(capacity, dtype=np.float64)
+        self.subjectNames = [[] for _ in range(capacity)]
+        self.markerNames = [[] for _ in range(capacity)]
+        self.noOfMarkers = np.zeros((capacity, maxSubjects), dtype=np.int64)
+        self.markerPositions = np.zeros((capacity, maxSubjects, maxMarkers, 3), dtype=np.float64)
+        self.markerOcclusions = np.ones((capacity, maxSubjects, maxMarkers), dtype=bool)
+        self.rotations = np.zeros((capacity, maxSubjects, 4), dtype=np.float64)
+        self.translations = np.zeros((capacity, maxSubjects, 3), dtype=np.float64)
+        self.segmentOcclusions = np.ones((capacity, maxSubjects), dtype=bool)
+        self.qualities = np.full((capacity, maxSubjects), np.nan)
+
+        self.freeSlots = deque(range(capacity))
+        self.queuedSlots = deque()
+        self.condition = threading.Condition()
+        self.closed = False
+
+        self.received = 0
+        self.droppedOldest = 0
+        self.droppedNewest = 0
+        self.frameGaps = 0
+        self.missedFrames = 0
+        self.lastFrameNumber = None
+
+    def acquire(self):
+        """
+        Free slot for the next frame, the oldest queued frame is dropped if the buffer is full (dropOldest)
+        :return: slot index or None if the frame has to be dropped (dropNewest or all slots leased by the consumer)
+        """
+        with self.condition:
+            if len(self.freeSlots) != 0:
+                return self.freeSlots.popleft()
+            if self.policy == dropOldest and len(self.queuedSlots) != 0:
+                self.droppedOldest += 1
+                return self.queuedSlots.popleft()
+            self.droppedNewest += 1
+            return None
+
+    def commit(self, slot):
+        """
+        Queue the filled slot for the consumer and update the frame gap counters
+        :param slot: slot index of acquire
+        :return: None
+        """
+        with self.condition:
+            self.updateCounters(int(self.frameNumbers[slot]))
+            self.queuedSlots.append(slot)
+            self.condition.notify()
+
+    def countReceived(self, frameNumber):
+        """
+        Frame received but dropped before it was written (dropNewest), the frame number is still used for the gaps
+        :param frameNumber: int
+        :return: None
+        """
+        with self.condition:
+            self.updateCounters(frameNumber)
+
+    def updateCounters(self, frameNumber):
+        # Called with the lock held
+        if self.lastFrameNumber is not None and frameNumber > self.lastFrameNumber + 1:
+            self.frameGaps += 1
+            self.missedFrames += frameNumber - self.lastFrameNumber - 1
+        self.lastFrameNumber = frameNumber
+        self.received += 1
+
+    def pop(self, timeout = 0):
+        """
+        Lease the oldest queued frame
+        :param timeout: seconds to wait for a frame, None waits until a frame arrives or the buffer is closed
+        :return: FrameRecord or None
+        """
+        with self.condition:
+            if len(self.queuedSlots) == 0 and timeout != 0 and not self.closed:
+                self.condition.wait_for(lambda: len(self.queuedSlots) != 0 or self.closed, timeout)
+            if len(self.queuedSlots) == 0:
+                return None
+            slot = self.queuedSlots.popleft()
+        return FrameRecord(self, slot)
+
+    def release(self, slot):
+        with self.condition:
+            self.freeSlots.append(slot)
+
+    def close(self):
+        """
+        No more frames are written, waiting consumers return
+        :return: None
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def getStatistics(self):
+        """
+        :return: dict with received, dropped (oldest, newest), frame gaps, missed frames and queued frames
+        """
+        with self.condition:
+            return {"received": self.received, "droppedOldest": self.droppedOldest,
+                    "droppedNewest": self.droppedNewest, "frameGaps": self.frameGaps,
+                    "missedFrames": self.missedFrames, "queued": len(self.queuedSlots)}
+
+
+class StreamArrayAdapter:
+    """
+    Array access over the per subject and per marker calls of the SDK. Subject, root segment and marker names are
+    resolved once when the subject list of the stream changes, every frame is written in place to preallocated arrays
+    (no tuples or lists are built for the caller).
+    """
+    def __init__(self, client, subjects = None, maxMarkers = None, readQuality = False):
+        """
+        Initialize the adapter, the arrays are allocated with the first frame
+        :param client: ViconDataStream.Client (or FakeViconClient, dataStreamReplay.ReplayViconClient)
+        :param subjects: subject order of the arrays, default the order of the stream. Subjects which are not in the
+                         stream are occluded
+        :param maxMarkers: markers per subject in the arrays, default the maximum number of markers in the stream
+        :param readQuality: bool, read GetObjectQuality of every subject (Tracker only, NaN if not available)
+        """
+        self.client = client
+        self.requestedSubjects = None if subjects is None else list(subjects)
+        self.maxMarkers = maxMarkers
+        self.readQuality = readQuality
+        self.streamSubjects = None
+        # Incremented when the names and arrays are rebuilt
+        self.layoutVersion = 0
+        self.allocate([], [], [])
+
+    def allocate(self, subjectNames, segmentNames, markerNames):
+        noOfSubjects = len(subjectNames)
+        noOfMarkers = max([len(names) for names in markerNames] + [0])
+        if self.maxMarkers is not None:
+            if noOfMarkers > self.maxMarkers:
+                raise ValueError("Stream has {} markers per subject, adapter has space for {}".format(
+                    noOfMarkers, self.maxMarkers))
+            noOfMarkers = self.maxMarkers
+
+        self.subjectNames = subjectNames
+        self.segmentNames = segmentNames
+        self.markerNames = markerNames
+        self.noOfMarkers = np.array([len(names) for names in markerNames], dtype=np.int64).reshape(noOfSubjects)
+        self.markerPositions = np.zeros((noOfSubjects, noOfMarkers, 3), dtype=np.float64)
+        self.markerOcclusions = np.ones((noOfSubjects, noOfMarkers), dtype=bool)
+        self.rotations = np.zeros((noOfSubjects, 4), dtype=np.float64)
+        self.rotations[:, 3] = 1
+        self.translations = np.zeros((noOfSubjects, 3), dtype=np.float64)
+        self.segmentOcclusions = np.ones(noOfSubjects, dtype=bool)
+        self.qualities = np.full(noOfSubjects, np.nan)
+
+    def resolve(self, streamSubjects):
+        """
+        Resolve the names of the subjects, their root segment and their markers and reallocate the arrays
+        :param streamSubjects: subject names of the stream
+        :return: None
+        """
+        self.streamSubjects = list(streamSubjects)
+        subjectNames = self.streamSubjects if self.requestedSubjects is None else list(self.requestedSubjects)
+        segmentNames = []
+        markerNames = []
+        for subject in subjectNames:
+            if subject in self.streamSubjects:
+                # Tracker streams the pose of the root segment only
+                segmentNames.append(self.client.GetSubjectRootSegmentName(subject))
+                markerNames.append([markerName for markerName, parentSegment in self.client.GetMarkerNames(subject)])
+            else:
+                segmentNames.append(None)
+                markerNames.append([])
+        self.allocate(subjectNames, segmentNames, markerNames)
+        self.layoutVersion += 1
+
+    def update(self):
+        """
+        Write the current frame of the client (after GetFrame) to the arrays
+        :return: frame number
+        """
+        client = self.client
+        streamSubjects = client.GetSubjectNames()
+        if streamSubjects != self.streamSubjects:
+            self.resolve(streamSubjects)
+
+        for subjectIndex, subject in enumerate(self.subjectNames):
+            segment = self.segmentNames[subjectIndex]
+            if segment is None:
+                self.segmentOcclusions[subjectIndex] = True
+            else:
+                rotation, occluded = client.GetSegmentGlobalRotationQuaternion(subject, segment)
+                translation, occluded = client.GetSegmentGlobalTranslation(subject, segment)
+                self.rotations[subjectIndex] = rotation
+                self.translations[subjectIndex] = translation
+                self.segmentOcclusions[subjectIndex] = occluded
+
+            positions = self.markerPositions[subjectIndex]
+            occlusions = self.markerOcclusions[subjectIndex]
+            for markerIndex, markerName in enumerate(self.markerNames[subjectIndex]):
+                positions[markerIndex], occlusions[markerIndex] = client.GetMarkerGlobalTranslation(subject,
+                                                                                                     markerName)
+
+            if self.readQuality:
+                try:
+                    self.qualities[subjectIndex] = client.GetObjectQuality(subject)
+                except Exception:
+                    self.qualities[subjectIndex] = np.nan
+
+        return client.GetFrameNumber()
+
+
+def readFrame(adapter, ringBuffer, slot):
+    """
+    Copy the current frame of the client to the slot : root segment pose and marker positions of every subject
+    :param adapter: StreamArrayAdapter of the client (after GetFrame)
+    :param ringBuffer: FrameRingBuffer
+    :param slot: slot index
+    :return: None
+    """
+    frameNumber = adapter.update()
+    noOfSubjects, noOfMarkers = adapter.markerOcclusions.shape
+    if noOfSubjects > ringBuffer.maxSubjects or noOfMarkers > ringBuffer.maxMarkers:
+        raise ValueError("Stream has {} subjects with {} markers, ring buffer has space for {} with {}".format(
+            noOfSubjects, noOfMarkers, ringBuffer.maxSubjects, ringBuffer.maxMarkers))
+
+    ringBuffer.frameNumbers[slot] = frameNumber
+    ringBuffer.timestamps[slot] = time.perf_counter()
+    # Name lists are replaced (not modified) by the adapter, the slots share them
+    ringBuffer.subjectNames[slot] = adapter.subjectNames
+    ringBuffer.markerNames[slot] = adapter.markerNames
+    ringBuffer.noOfMarkers[slot, :noOfSubjects] = adapter.noOfMarkers
+    ringBuffer.markerPositions[slot, :noOfSubjects, :noOfMarkers] = adapter.markerPositions
+    ringBuffer.markerOcclusions[slot, :noOfSubjects, :noOfMarkers] = adapter.markerOcclusions
+    ringBuffer.rotations[slot, :noOfSubjects] = adapter.rotations
+    ringBuffer.translations[slot, :noOfSubjects] = adapter.translations
+    ringBuffer.segmentOcclusions[slot, :noOfSubjects] = adapter.segmentOcclusions
+    ringBuffer.qualities[slot, :noOfSubjects] = adapter.qualities
+
+
+class DataStreamClient:
+    """
+    Streaming client : the SDK pull loop runs on a dedicated thread into a FrameRingBuffer, the frames are read with
+    "async for frame in client" (or getFrame). Records are released when the next frame is requested.
+    """
+    def __init__(self, address = "localhost:801", client = None, capacity = 64, policy = dropOldest, maxSubjects = 8,
+                 maxMarkers = 16, connectTimeout = 10.0, retryInterval = 0.5, pollInterval = 0.001, subjects = None,
+                 readQuality = False):
+        """
+        Initialize the client, the connection is opened by start
+        :param address: "host:port" of Tracker or Nexus
+        :param client: object with the ViconDataStream.Client interface, default a new ViconDataStream.Client
+        :param capacity: number of frames in the ring buffer
+        :param policy: dropOldest or dropNewest
+        :param maxSubjects: maximum number of subjects of a frame
+        :param maxMarkers: maximum number of markers of a subject
+        :param connectTimeout: seconds until start gives up connecting
+        :param retryInterval: seconds between connection attempts
+        :param pollInterval: seconds to wait when GetFrame returns no frame
+        :param subjects: subject order of the frames, default the order of the stream (see StreamArrayAdapter)
+        :param readQuality: bool, read the object quality of the subjects (Tracker only)
+        """
+        if client is None:
+            # The SDK is only installed on the computers connected to the live system
+            from vicon_dssdk import ViconDataStream
+            client = ViconDataStream.Client()
+        self.address = address
+        self.client = client
+        self.adapter = StreamArrayAdapter(client, subjects, readQuality=readQuality)
+        self.ringBuffer = FrameRingBuffer(capacity, maxSubjects, maxMarkers, policy)
+        self.connectTimeout = connectTimeout
+        self.retryInterval = retryInterval
+        self.pollInterval = pollInterval
+        self.thread = None
+        self.stopEvent = threading.Event()
+        self.error = None
+        self.currentRecord = None
+        self.loop = None
+        self.frameEvent = None
+
+    def connect(self):
+        """
+        Connect to the stream, retries until the timeout without busy waiting
+        :return: None
+        """
+        deadline = time.perf_counter() + self.connectTimeout
+        while not self.client.IsConnected():
+            try:
+                self.client.Connect(self.address)
+            except Exception as error:
+                print("Connection to {} failed : {}".format(self.address, error))
+            if self.client.IsConnected():
+                break
+            if time.perf_counter() > deadline:
+                raise RuntimeError("No connection to the DataStream at {}".format(self.address))
+            time.sleep(self.retryInterval)
+
+    def start(self):
+        """
+        Connect, enable marker and segment data and start the receive thread
+        :return: self
+        """
+        self.connect()
+        self.client.EnableMarkerData()
+        self.client.EnableSegmentData()
+        self.stopEvent.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def run(self):
+        try:
+            while not self.stopEvent.is_set() and self.client.IsConnected():
+                if not self.client.GetFrame():
+                    time.sleep(self.pollInterval)
+                    continue
+                slot = self.ringBuffer.acquire()
+                if slot is None:
+                    self.ringBuffer.countReceived(self.client.GetFrameNumber())
+                    continue
+                readFrame(self.adapter, self.ringBuffer, slot)
+                self.ringBuffer.commit(slot)
+                self.notify()
+        except Exception as error:
+            self.error = error
+        finally:
+            self.ringBuffer.close()
+            self.notify()
+
+    def notify(self):
+        # Wakes up the async iterator in its event loop
+        loop = self.loop
+        if loop is not None and not loop.is_closed():
+            try:
+                loop.call_soon_threadsafe(self.frameEvent.set)
+            except RuntimeError:
+                pass
+
+    def stop(self):
+        """
+        Stop the receive thread and disconnect
+        :return: statistics of the ring buffer
+        """
+        self.stopEvent.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        self.releaseCurrent()
+        if self.client.IsConnected():
+            self.client.Disconnect()
+        return self.ringBuffer.getStatistics()
+
+    def releaseCurrent(self):
+        if self.currentRecord is not None:
+            self.currentRecord.release()
+            self.currentRecord = None
+
+    def getFrame(self, timeout = None):
+        """
+        Blocking read of the next frame, the previous frame is released
+        :param timeout: seconds to wait, None waits until a frame arrives or the stream ends
+        :return: FrameRecord or None at the end of the stream (or timeout)
+        """
+        self.releaseCurrent()
+        self.currentRecord = self.ringBuffer.pop(timeout)
+        if self.currentRecord is None and self.error is not None:
+            raise self.error
+        return self.currentRecord
+
+    def getStatistics(self):
+        return self.ringBuffer.getStatistics()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, excType, excValue, traceback):
+        self.stop()
+
+    async def __aenter__(self):
+        return self.start()
+
+    async def __aexit__(self, excType, excValue, traceback):
+        self.stop()
+
+    def __aiter__(self):
+        self.loop = asyncio.get_running_loop()
+        self.frameEvent = asyncio.Event()
+        return self
+
+    async def __anext__(self):
+        self.releaseCurrent()
+        while True:
+            self.frameEvent.clear()
+            record = self.ringBuffer.pop()
+            if record is not None:
+                self.currentRecord = record
+                return record
+            if self.ringBuffer.closed:
+                if self.error is not None:
+                    raise self.error
+                raise StopAsyncIteration
+            await self.frameEvent.wait()
+
+
+class FakeViconClient:
+    """
+    Local stand in for ViconDataStream.Client : subjects with one segment and markers on a rotating circle, served at a
+    fixed frame rate. Frame numbers can skip to simulate gaps of the stream.
+    """
+    def __init__(self, subjects = ("object1", "object2"), noOfMarkers = 4, frameRate = 100.0, noOfFrames = None,
+                 skipFrames = ()):
+        """
+        Initialize the fake stream
+        :param subjects: subject names
+        :param noOfMarkers: number of markers per subject
+        :param frameRate: frames per second, None serves frames without waiting
+        :param noOfFrames: number of frames before the stream disconnects, None streams until Disconnect
+        :param skipFrames: frame numbers which are not served
+        """
+        self.subjects = list(subjects)
+        self.markers = ["{}_marker{}".format(subject, index) for subject in self.subjects for index in range(noOfMarkers)]
+        self.noOfMarkers = noOfMarkers
+        self.frameRate = frameRate
+        self.noOfFrames = noOfFrames
+        self.skipFrames = set(skipFrames)
+        self.connected = False
+        self.frameNumber = 0
+        self.nextFrameTime = None
+
+    def Connect(self, address):
+        self.connected = True
+
+    def IsConnected(self):
+        return self.connected
+
+    def Disconnect(self):
+        self.connected = False
+
+    def EnableMarkerData(self):
+        pass
+
+    def EnableSegmentData(self):
+        pass
+
+    def EnableUnlabeledMarkerData(self):
+        pass
+
+    def GetFrameRate(self):
+        return self.frameRate
+
+    def GetFrame(self):
+        if self.frameRate is not None:
+            now = time.perf_counter()
+            if self.nextFrameTime is None:
+                self.nextFrameTime = now
+            if now < self.nextFrameTime:
+                time.sleep(self.nextFrameTime - now)
+            self.nextFrameTime += 1.0 / self.frameRate
+        self.frameNumber += 1
+        while self.frameNumber in self.skipFrames:
+            self.frameNumber += 1
+        if self.noOfFrames is not None and self.frameNumber > self.noOfFrames:
+            self.connected = False
+            return False
+        return True
+
+    def GetFrameNumber(self):
+        return self.frameNumber
+
+    def GetSubjectNames(self):
+        return list(self.subjects)
+
+    def GetSegmentNames(self, subject):
+        return [subject]
+
+    def GetSubjectRootSegmentName(self, subject):
+        return subject
+
+    def GetMarkerNames(self, subject):
+        return [("{}_marker{}".format(subject, index), subject) for index in range(self.noOfMarkers)]
+
+    def getAngle(self, subject):
+        return 0.01 * self.frameNumber + self.subjects.index(subject)
+
+    def GetSegmentGlobalRotationQuaternion(self, subject, segment):
+        angle = self.getAngle(subject)
+        return (0.0, 0.0, float(np.sin(angle / 2)), float(np.cos(angle / 2))), False
+
+    def GetSegmentGlobalTranslation(self, subject, segment):
+        return (100.0 * self.subjects.index(subject), 0.0, float(self.frameNumber)), False
+
+    def GetMarkerGlobalTranslation(self, subject, markerName):
+        index = int(markerName.rsplit("marker", 1)[1])
+        angle = self.getAngle(subject) + 2 * np.pi * index / self.noOfMarkers
+        translation = self.GetSegmentGlobalTranslation(subject, subject)[0]
+        point = (translation[0] + 50 * np.cos(angle), translation[1] + 50 * np.sin(angle), translation[2])
+        # Last marker of every subject is occluded in odd frames
+        occluded = index == self.noOfMarkers - 1 and self.frameNumber % 2 == 1
+        return ((0.0, 0.0, 0.0) if occluded else point), occluded
+
+
+def unitTest():
+    """
+    Stream fake frames to a slow async consumer with both drop policies and check the counters, fill the arrays of the
+    adapter
+    :return: None
+    """
+    async def consume(client, delay):
+        frameNumbers = []
+        async with client:
+            async for frame in client:
+                frameNumbers.append(frame.frameNumber)
+                assert np.allclose(frame.translations[:, 2], frame.frameNumber)
+                await asyncio.sleep(delay)
+        return frameNumbers
+
+    for policy in (dropOldest, dropNewest):
+        fakeClient = FakeViconClient(frameRate=None, noOfFrames=2000, skipFrames=(10, 11, 12, 500))
+        client = DataStreamClient(client=fakeClient, capacity=16, policy=policy)
+        frameNumbers = asyncio.run(consume(client, 0.0005))
+        statistics = client.getStatistics()
+        print(policy, " consumed : ", len(frameNumbers), " last frame : ", frameNumbers[-1], " statistics : ",
+              statistics)
+        print("Frames in order : ", bool(np.all(np.diff(frameNumbers) > 0)))
+        print("Gaps (should be 2, 4 missed frames) : ", statistics["frameGaps"], statistics["missedFrames"])
+        print("Received = consumed + dropped : ", statistics["received"] == len(frameNumbers) +
+              statistics["droppedOldest"] + statistics["droppedNewest"])
+
+    # Adapter with a requested subject order, a subject missing in the stream and a change of the subject list
+    fakeClient = FakeViconClient(noOfMarkers=3, frameRate=None)
+    adapter = StreamArrayAdapter(fakeClient, subjects=["object2", "missing", "object1"])
+    fakeClient.GetFrame()
+    adapter.update()
+    markerPositions = adapter.markerPositions
+    print("Subjects : ", adapter.subjectNames, " occluded : ", adapter.segmentOcclusions, " markers : ",
+          adapter.noOfMarkers)
+    print("Marker matches the SDK call : ", np.allclose(adapter.markerPositions[2, 1],
+                                                        fakeClient.GetMarkerGlobalTranslation("object1",
+                                                                                              "object1_marker1")[0]))
+    fakeClient.GetFrame()
+    adapter.update()
+    print("Arrays reused : ", adapter.markerPositions is markerPositions, " layout version : ", adapter.layoutVersion)
+    fakeClient.subjects = ["object1"]
+    fakeClient.GetFrame()
+    adapter.update()
+    print("Layout after subject change (version 2, object2 occluded) : ", adapter.layoutVersion,
+          adapter.segmentOcclusions)
+
+    # Paced stream with blocking reads
+    with DataStreamClient(client=FakeViconClient(frameRate=200.0, noOfFrames=50), capacity=8) as client:
+        startTime = time.perf_counter()
+        count = 0
+        while client.getFrame(timeout=1.0) is not None:
+            count += 1
+        print("Frames : ", count, " duration (should be 0.25 s) : {:.2f} s".format(time.perf_counter() - startTime))
+
+
+if __name__ == '__main__':
+    unitTest()
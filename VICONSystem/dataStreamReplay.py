@@ -0,0 +1,360 @@
+# The file replays a recorded session (Tracker CSV or C3D) through the interface of ViconDataStream.Client, the live
+# pipeline (dataStreamClient and the streaming examples) runs offline without Tracker or Nexus. Frames are served at the
+# recorded frame rate, a multiple of it or as fast as possible, the serve time of every frame is kept to measure the
+# throughput and the latency of the pipeline.
+
+import os
+import time
+import asyncio
+import numpy as np
+import c3d
+from VICONFileOperations import rwOperations
+from VICONMath import transformations as tf
+from VICONSystem import dataStreamClient
+
+
+class ReplayViconClient:
+    """
+    Serves recorded frames with the calls of ViconDataStream.Client used by the examples : subjects, one segment per
+    subject (root pose), markers with global translation and occlusion flags, frame numbers and frame rate
+    """
+    def __init__(self, frameNumbers, subjects, markerNames, markerPositions, markerOcclusions, rotations, translations,
+                 segmentOcclusions, frameRate = 100.0, speed = 1.0, loop = False):
+        """
+        Initialize the replay from arrays
+        :param frameNumbers: array (F,) of recorded frame numbers
+        :param subjects: list of S subject names
+        :param markerNames: list (one per subject) of marker names, M is the maximum number of markers of a subject
+        :param markerPositions: array (F,S,M,3)
+        :param markerOcclusions: array (F,S,M) bool
+        :param rotations: array (F,S,4) quaternions of the root segments (x,y,z,w)
+        :param translations: array (F,S,3)
+        :param segmentOcclusions: array (F,S) bool
+        :param frameRate: recorded frame rate
+        :param speed: multiple of the recorded frame rate, None or 0 serves the frames as fast as possible
+        :param loop: bool, restart at the first frame (frame numbers keep increasing) instead of disconnecting
+        """
+        noOfFrames = len(frameNumbers)
+        assert (noOfFrames != 0), "No frames to replay"
+        assert (markerPositions.shape[0:2] == (noOfFrames, len(subjects))), "Shape mismatch : marker positions"
+        assert (rotations.shape == (noOfFrames, len(subjects), 4)), "Shape mismatch : rotations"
+        self.frameNumbers = np.asarray(frameNumbers, dtype=np.int64)
+        self.subjects = list(subjects)
+        self.subjectIndex = {subject: index for index, subject in enumerate(self.subjects)}
+        self.markerNames = [list(names) for names in markerNames]
+        self.markerIndex = [{name: index for index, name in enumerate(names)} for names in self.markerNames]
+        self.markerPositions = markerPositions
+        self.markerOcclusions = markerOcclusions
+        self.rotations = rotations
+        self.translations = translations
+        self.segmentOcclusions = segmentOcclusions
+        self.frameRate = float(frameRate)
+        self.speed = speed
+        self.loop = loop
+
+        self.connected = False
+        self.index = -1
+        self.loopOffset = 0
+        self.startTime = None
+        # Serve time of the frames (time.perf_counter), used for the latency of the pipeline
+        self.serveTimes = {}
+
+    @classmethod
+    def fromTrackerCsv(cls, fileName, objectsToTrack, markerPatterns = None, frameRate = 100.0, speed = 1.0,
+                       loop = False):
+        """
+        Replay of a Tracker CSV (pose of every object)
+        :param fileName: Tracker CSV
+        :param objectsToTrack: list of objects (subjects) in the file
+        :param markerPatterns: dict {subject: array (3,M) or (M,3) marker positions in subject space} e.g. read with
+                               rwOperations.readFeaturePointsFromViconFileAsArray, the markers are placed with the pose
+        :param frameRate: frame rate of the recording
+        :param speed: see __init__
+        :param loop: see __init__
+        :return: ReplayViconClient
+        """
+        dataObject = rwOperations.TrackerDatabaseReader(fileName, objectsToTrack)
+        frameNumbers, poses, validity = dataObject.getPoseArrays()
+        noOfFrames, noOfSubjects = validity.shape
+
+        markerNames = []
+        patterns = []
+        for subject in objectsToTrack:
+            pattern = np.zeros((0, 3))
+            if markerPatterns is not None and subject in markerPatterns:
+                pattern = np.asarray(markerPatterns[subject], dtype=np.float64)
+                if pattern.shape[0] == 3 and pattern.shape[1] != 3:
+                    pattern = pattern.T
+            patterns.append(pattern)
+            markerNames.append(["{}{}".format(subject, index + 1) for index in range(len(pattern))])
+        noOfMarkers = max([len(pattern) for pattern in patterns] + [0])
+
+        rotations = np.where(validity[..., np.newaxis], poses[..., 0:4], [0, 0, 0, 1])
+        translations = np.where(validity[..., np.newaxis], poses[..., 4:7], 0)
+        markerPositions = np.zeros((noOfFrames, noOfSubjects, noOfMarkers, 3))
+        markerOcclusions = np.ones((noOfFrames, noOfSubjects, noOfMarkers), dtype=bool)
+        for subjectIndex, pattern in enumerate(patterns):
+            if len(pattern) == 0:
+                continue
+            rotationMatrices = tf.quaternionViconArrayToMatrix(rotations[:, subjectIndex])
+            points = tf.transformPointArray(np.broadcast_to(pattern, (noOfFrames,) + pattern.shape), rotationMatrices,
+                                            translations[:, subjectIndex])
+            valid = validity[:, subjectIndex]
+            markerPositions[valid, subjectIndex, 0:len(pattern)] = points[valid]
+            markerOcclusions[valid, subjectIndex, 0:len(pattern)] = False
+
+        return cls(frameNumbers, list(objectsToTrack), markerNames, markerPositions, markerOcclusions, rotations,
+                   translations, ~validity, frameRate, speed, loop)
+
+    @classmethod
+    def fromC3D(cls, fileName, speed = 1.0, loop = False, subjectName = None):
+        """
+        Replay of the markers of a C3D file. Labels "Subject:Marker" are grouped by subject, other labels belong to one
+        subject named after the file (or subjectName). C3D has no segment poses, the segments are occluded.
+        :param fileName: .c3d file
+        :param speed: see __init__
+        :param loop: see __init__
+        :param subjectName: subject of the labels without subject prefix
+        :return: ReplayViconClient
+        """
+        if subjectName is None:
+            subjectName = os.path.splitext(os.path.basename(fileName))[0]
+        frameNumbers = []
+        points = []
+        with open(fileName, 'rb') as handle:
+            reader = c3d.Reader(handle)
+            labels = [label.strip() for label in reader.point_labels]
+            frameRate = reader.point_rate
+            for frameNo, framePoints, analog in reader.read_frames():
+                frameNumbers.append(frameNo)
+                points.append(framePoints[:, 0:4])
+        points = np.array(points, dtype=np.float64).reshape(len(frameNumbers), len(labels), 4)
+
+        subjects = []
+        markerNames = []
+        labelIndex = []
+        for index, label in enumerate(labels):
+            subject, markerName = label.split(":", 1) if ":" in label else (subjectName, label)
+            if subject not in subjects:
+                subjects.append(subject)
+                markerNames.append([])
+                labelIndex.append([])
+            markerNames[subjects.index(subject)].append(markerName)
+            labelIndex[subjects.index(subject)].append(index)
+
+        noOfFrames = len(frameNumbers)
+        noOfMarkers = max([len(names) for names in markerNames] + [0])
+        markerPositions = np.zeros((noOfFrames, len(subjects), noOfMarkers, 3))
+        markerOcclusions = np.ones((noOfFrames, len(subjects), noOfMarkers), dtype=bool)
+        for subjectIndex, indices in enumerate(labelIndex):
+            subjectPoints = points[:, indices]
+            # Negative residual marks points which were not reconstructed
+            occluded = (subjectPoints[..., 3] < 0) | np.any(np.isnan(subjectPoints[..., 0:3]), axis=-1)
+            markerPositions[:, subjectIndex, 0:len(indices)] = np.where(occluded[..., np.newaxis], 0,
+                                                                        subjectPoints[..., 0:3])
+            markerOcclusions[:, subjectIndex, 0:len(indices)] = occluded
+
+        rotations = np.zeros((noOfFrames, len(subjects), 4))
+        rotations[..., 3] = 1
+        translations = np.zeros((noOfFrames, len(subjects), 3))
+        segmentOcclusions = np.ones((noOfFrames, len(subjects)), dtype=bool)
+        return cls(frameNumbers, subjects, markerNames, markerPositions, markerOcclusions, rotations, translations,
+                   segmentOcclusions, frameRate, speed, loop)
+
+    def Connect(self, address):
+        self.connected = True
+        self.index = -1
+        self.loopOffset = 0
+        self.startTime = None
+
+    def IsConnected(self):
+        return self.connected
+
+    def Disconnect(self):
+        self.connected = False
+
+    def EnableMarkerData(self):
+        pass
+
+    def EnableSegmentData(self):
+        pass
+
+    def EnableUnlabeledMarkerData(self):
+        pass
+
+    def GetFrameRate(self):
+        return self.frameRate
+
+    def GetFrame(self):
+        """
+        Advance to the next recorded frame, waits until its time at the replay speed
+        :return: True, False at the end of the recording (the client disconnects)
+        """
+        if not self.connected:
+            return False
+        self.index += 1
+        if self.index == len(self.frameNumbers):
+            if not self.loop:
+                self.connected = False
+                return False
+            self.loopOffset += int(self.frameNumbers[-1] - self.frameNumbers[0]) + 1
+            self.index = 0
+
+        now = time.perf_counter()
+        if self.startTime is None:
+            self.startTime = now
+        if self.speed:
+            # Recorded time of the frame, gaps of the recording are replayed as gaps
+            elapsed = (self.GetFrameNumber() - self.frameNumbers[0]) / (self.frameRate * self.speed)
+            if now < self.startTime + elapsed:
+                time.sleep(self.startTime + elapsed - now)
+                now = time.perf_counter()
+        self.serveTimes[self.GetFrameNumber()] = now
+        return True
+
+    def GetFrameNumber(self):
+        return int(self.frameNumbers[self.index]) + self.loopOffset
+
+    def getServeTime(self, frameNumber):
+        """
+        Time (time.perf_counter) at which the frame was served
+        :param frameNumber: frame number of the stream
+        :return: float or None
+        """
+        return self.serveTimes.get(frameNumber)
+
+    def GetSubjectNames(self):
+        return list(self.subjects)
+
+    def GetSegmentNames(self, subject):
+        return [subject]
+
+    def GetSubjectRootSegmentName(self, subject):
+        return subject
+
+    def GetMarkerNames(self, subject):
+        return [(markerName, subject) for markerName in self.markerNames[self.subjectIndex[subject]]]
+
+    def GetSegmentGlobalRotationQuaternion(self, subject, segment):
+        subjectIndex = self.subjectIndex[subject]
+        return tuple(self.rotations[self.index, subjectIndex].tolist()), bool(
+            self.segmentOcclusions[self.index, subjectIndex])
+
+    def GetSegmentGlobalTranslation(self, subject, segment):
+        subjectIndex = self.subjectIndex[subject]
+        return tuple(self.translations[self.index, subjectIndex].tolist()), bool(
+            self.segmentOcclusions[self.index, subjectIndex])
+
+    def GetMarkerGlobalTranslation(self, subject, markerName):
+        subjectIndex = self.subjectIndex[subject]
+        markerIndex = self.markerIndex[subjectIndex][markerName]
+        return tuple(self.markerPositions[self.index, subjectIndex, markerIndex].tolist()), bool(
+            self.markerOcclusions[self.index, subjectIndex, markerIndex])
+
+
+def measurePipeline(replayClient, process = None, capacity = 64, policy = dataStreamClient.dropOldest):
+    """
+    Replay the session through dataStreamClient and measure throughput and latency (serve time of the frame until the
+    end of its processing)
+    :param replayClient: ReplayViconClient
+    :param process: function (FrameRecord) called for every frame, e.g. the pose computation of a live example
+    :param capacity: frames in the ring buffer
+    :param policy: dataStreamClient.dropOldest or dataStreamClient.dropNewest
+    :return: dict with frames, duration, frames/s, latency (mean, median, 95th percentile, max in ms) and stream
+             statistics
+    """
+    latencies = []
+
+    async def consume(client):
+        async for frame in client:
+            if process is not None:
+                process(frame)
+            latencies.append(time.perf_counter() - replayClient.getServeTime(frame.frameNumber))
+
+    client = dataStreamClient.DataStreamClient(client=replayClient, capacity=capacity, policy=policy,
+                                               maxSubjects=max(len(replayClient.subjects), 1),
+                                               maxMarkers=max(replayClient.markerPositions.shape[2], 1))
+    startTime = time.perf_counter()
+    with client:
+        asyncio.run(consume(client))
+    duration = time.perf_counter() - startTime
+
+    latencies = 1000 * np.array(latencies) if len(latencies) != 0 else np.zeros(1)
+    result = {"frames": len(latencies), "duration": duration, "framesPerSecond": len(latencies) / max(duration, 1e-9),
+              "latencyMean": float(np.mean(latencies)), "latencyMedian": float(np.median(latencies)),
+              "latency95": float(np.percentile(latencies, 95)), "latencyMax": float(np.max(latencies))}
+    result.update(client.getStatistics())
+    return result
+
+
+def main(fileName, objectsToTrack = None, speed = 1.0):
+    """
+    Replay a Tracker CSV (objectsToTrack given) or C3D session through the live pipeline and print the measurements
+    """
+    if fileName.lower().endswith(".c3d"):
+        replayClient = ReplayViconClient.fromC3D(fileName, speed=speed)
+    else:
+        replayClient = ReplayViconClient.fromTrackerCsv(fileName, objectsToTrack, speed=speed)
+    result = measurePipeline(replayClient)
+    print("Frames : {frames} in {duration:.2f} s ({framesPerSecond:.1f} frames/s)".format(**result))
+    print("Latency ms : mean {latencyMean:.2f} median {latencyMedian:.2f} 95% {latency95:.2f} "
+          "max {latencyMax:.2f}".format(**result))
+    print("Dropped : {droppedOldest} oldest {droppedNewest} newest, gaps : {frameGaps}".format(**result))
+    return result
+
+
+def unitTest():
+    """
+    Replay a synthetic Tracker CSV and a C3D file at native rate and as fast as possible
+    :return: None
+    """
+    import tempfile
+    directory = tempfile.mkdtemp()
+
+    # Tracker CSV of one object rotating around z, frame 6 is missing in the file
+    noOfFrames = 200
+    angles = np.linspace(0, np.pi, noOfFrames)
+    fileName = os.path.join(directory, "replayTest.csv")
+    with open(fileName, "w") as file:
+        file.write("Objects\n100\n,,object1,,,,,,\nFrame,Sub Frame,RX,RY,RZ,RW,TX,TY,TZ\n,,,,,,,,\n")
+        for frame, angle in enumerate(angles):
+            if frame + 1 != 6:
+                file.write("{},0,0,0,{},{},10,20,{}\n".format(frame + 1, np.sin(angle / 2), np.cos(angle / 2), frame))
+    pattern = np.array([[10, 0, 0], [0, 10, 0], [0, 0, 10]], dtype=np.float64)
+
+    for speed in (1.0, None):
+        replayClient = ReplayViconClient.fromTrackerCsv(fileName, ["object1"], {"object1": pattern}, frameRate=400.0,
+                                                        speed=speed)
+        markers = []
+        result = measurePipeline(replayClient, lambda frame: markers.append(frame.markerPositions[0, 0].copy()))
+        print("Speed ", speed, " frames : ", result["frames"], " dropped : ", result["droppedOldest"],
+              " duration : {:.3f} s (native 0.5 s)".format(result["duration"]), " gaps : ", result["frameGaps"],
+              " latency median : {:.3f} ms".format(result["latencyMedian"]))
+    # First marker of the last frame rotated by pi around z : (-10, 0, 0) + (10, 20, frame)
+    print("Marker position (should be 0 20 199) : ", np.round(markers[-1], 6))
+
+    # C3D with two subjects, one point occluded in every second frame
+    c3dFile = os.path.join(directory, "replayTest.c3d")
+    writer = c3d.Writer(point_rate=200.0)
+    frames = []
+    for frame in range(40):
+        framePoints = np.zeros((3, 5), dtype=np.float32)
+        framePoints[:, 0:3] = [[frame, 0, 0], [0, frame, 0], [0, 0, frame]]
+        framePoints[2, 3] = -1 if frame % 2 == 1 else 0
+        frames.append((framePoints, np.zeros((0, 0), dtype=np.float32)))
+    writer.add_frames(frames)
+    writer.set_point_labels(["bird:head", "bird:tail", "perch"])
+    with open(c3dFile, "wb") as handle:
+        writer.write(handle)
+
+    replayClient = ReplayViconClient.fromC3D(c3dFile, speed=None)
+    replayClient.Connect("localhost:801")
+    replayClient.GetFrame()
+    replayClient.GetFrame()
+    print("Subjects : ", replayClient.GetSubjectNames(), " markers : ", replayClient.GetMarkerNames("bird"))
+    print("Frame ", replayClient.GetFrameNumber(), " tail : ", replayClient.GetMarkerGlobalTranslation("bird", "tail"),
+          " perch (occluded) : ", replayClient.GetMarkerGlobalTranslation("replayTest", "perch"))
+
+
+if __name__ == '__main__':
+    unitTest()
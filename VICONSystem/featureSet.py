@@ -0,0 +1,332 @@
+# The file is the storage for named features (3D points of objects or 2D points of images). The points are stored in
+# one contiguous float array with a fixed name to row table, the class behaves like the old feature dictionaries.
+
+import numpy as np
+from collections.abc import MutableMapping
+
+
+class FeatureSet(MutableMapping):
+    """
+    Array backed feature storage {"Feature":[X,Y,Z]} with dict compatible accessors. The points are kept in an (N,d)
+    float array, rows follow the order in which the features were added.
+    """
+    def __init__(self, dimension = 3, featureDict = None):
+        """
+        Initialize an empty feature set or copy the features of the given dictionary
+        :param dimension: int, 3 for 3D features and 2 for 2D features
+        :param featureDict: dict or FeatureSet of features
+        """
+        assert (dimension == 2 or dimension == 3), "Feature dimension must be 2 or 3"
+        self.dimension = dimension
+        self.names = []
+        self.nameIndex = {}
+        self.buffer = np.zeros((0, dimension))
+        self.size = 0
+        # Name table is shared with another feature set until the structure is modified
+        self.sharedNames = False
+
+        if featureDict is not None:
+            self.setFeatures(featureDict)
+
+    @classmethod
+    def fromArray(cls, names, array, nameIndex = None):
+        """
+        Create feature set from list of names and (N,d) array, the array is used without copy
+        :param names: list of feature names
+        :param array: array (N,d)
+        :param nameIndex: dict name to row, shared with the caller when given
+        :return: FeatureSet
+        """
+        array = np.asarray(array, dtype=np.float64)
+        assert (array.ndim == 2 and array.shape[0] == len(names)), "Shape mismatch : names and feature array"
+        featureSet = cls(array.shape[1])
+        featureSet.names = names
+        featureSet.buffer = array
+        featureSet.size = len(names)
+        if nameIndex is None:
+            featureSet.nameIndex = {name: index for index, name in enumerate(names)}
+        else:
+            featureSet.nameIndex = nameIndex
+            featureSet.sharedNames = True
+
+        return featureSet
+
+    @property
+    def array(self):
+        """
+        View on the (N,d) array of the features
+        :return: array (N,d)
+        """
+        return self.buffer[:self.size]
+
+    def ownNames(self):
+        """
+        Copy the name table before the structure is modified if it is shared with another feature set
+        :return: None
+        """
+        if self.sharedNames:
+            self.names = list(self.names)
+            self.nameIndex = dict(self.nameIndex)
+            self.sharedNames = False
+
+    def reserve(self, size):
+        """
+        Grow the buffer to hold at least the given number of features
+        :param size: int
+        :return: None
+        """
+        if size > self.buffer.shape[0]:
+            buffer = np.zeros((max(size, 2 * self.buffer.shape[0]), self.dimension))
+            buffer[:self.size] = self.buffer[:self.size]
+            self.buffer = buffer
+
+    def __getitem__(self, feature):
+        return self.buffer[self.nameIndex[feature]].tolist()
+
+    def __setitem__(self, feature, point):
+        index = self.nameIndex.get(feature)
+        if index is None:
+            self.ownNames()
+            self.reserve(self.size + 1)
+            index = self.size
+            self.names.append(feature)
+            self.nameIndex[feature] = index
+            self.size += 1
+        self.buffer[index] = point[0:self.dimension]
+
+    def __delitem__(self, feature):
+        self.removeFeatures([feature])
+
+    def __iter__(self):
+        return iter(self.names[:self.size])
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, feature):
+        return feature in self.nameIndex
+
+    def __repr__(self):
+        return "FeatureSet({})".format(self.toDict())
+
+    def getPoint(self, feature):
+        """
+        Returns view on the point of given feature
+        :param feature: str
+        :return: array (d,)
+        """
+        return self.buffer[self.nameIndex[feature]]
+
+    def toDict(self):
+        """
+        Convert the features to a plain dictionary of lists
+        :return: dict
+        """
+        return dict(zip(self.names, self.array.tolist()))
+
+    def copy(self):
+        """
+        Copy of the feature set
+        :return: FeatureSet
+        """
+        return FeatureSet.fromArray(list(self.names), self.array.copy())
+
+    def clear(self):
+        """
+        Remove all features, the buffer is kept for reuse
+        :return: None
+        """
+        self.names = []
+        self.nameIndex = {}
+        self.size = 0
+        self.sharedNames = False
+
+    def setFeatures(self, featuresDict):
+        """
+        Set the given features, existing features are overwritten and new features are appended as one block
+        :param featuresDict: dict or FeatureSet
+        :return: True
+        """
+        if isinstance(featuresDict, FeatureSet):
+            names = featuresDict.names[:featuresDict.size]
+            points = featuresDict.array
+        else:
+            names = list(featuresDict)
+            points = np.array([list(featuresDict[feature])[0:self.dimension] for feature in names],
+                              dtype=np.float64).reshape(len(names), self.dimension)
+
+        if len(names) == 0:
+            return True
+
+        # Same feature table, copy the array directly
+        if names == self.names:
+            self.buffer[:self.size] = points
+            return True
+
+        index = np.array([self.nameIndex.get(feature, -1) for feature in names], dtype=np.int64)
+        existing = index >= 0
+        self.buffer[index[existing]] = points[existing]
+
+        newFeatures = np.flatnonzero(~existing)
+        if len(newFeatures) != 0:
+            self.ownNames()
+            self.reserve(self.size + len(newFeatures))
+            for feature in newFeatures:
+                # Duplicated names in the input keep the last value like a dictionary
+                if names[feature] in self.nameIndex:
+                    self.buffer[self.nameIndex[names[feature]]] = points[feature]
+                    continue
+                self.nameIndex[names[feature]] = self.size
+                self.names.append(names[feature])
+                self.buffer[self.size] = points[feature]
+                self.size += 1
+
+        return True
+
+    def update(self, other = (), **kwargs):
+        if isinstance(other, FeatureSet) or hasattr(other, "keys"):
+            self.setFeatures(other)
+        else:
+            self.setFeatures(dict(other))
+        if kwargs:
+            self.setFeatures(kwargs)
+
+    def removeFeatures(self, features):
+        """
+        Remove the given features in one pass over the array
+        :param features: list of features, unknown features are ignored
+        :return: True
+        """
+        removeIndex = [self.nameIndex[feature] for feature in features if feature in self.nameIndex]
+        if len(removeIndex) == 0:
+            return True
+
+        keep = np.ones(self.size, dtype=bool)
+        keep[removeIndex] = False
+        names = [name for name, kept in zip(self.names, keep) if kept]
+        self.buffer = self.array[keep]
+        self.names = names
+        self.nameIndex = {name: index for index, name in enumerate(names)}
+        self.size = len(names)
+        self.sharedNames = False
+        return True
+
+    def transform(self, rotationMatrix, translation, inverse = False, out = None):
+        """
+        Transform all the features with given rotation and translation, the result shares the name table
+        :param rotationMatrix: 3x3 rotation matrix (already inverted if inverse is True)
+        :param translation: translation (3,)
+        :param inverse: P_out = R.(P - T) instead of P_out = R.P + T
+        :param out: FeatureSet with same names to reuse its array
+        :return: FeatureSet
+        """
+        assert (self.dimension == 3), "Only 3D features can be transformed"
+        assert (self.size != 0), "Dicitonary empty!! No object features to transfer"
+        rotationMatrixT = np.asarray(rotationMatrix, dtype=np.float64).T
+        translation = np.asarray(translation, dtype=np.float64).reshape(3)
+
+        if out is None or out.names is not self.names or out.buffer.shape != (self.size, 3):
+            out = FeatureSet.fromArray(self.names, np.empty((self.size, 3)), self.nameIndex)
+            self.sharedNames = True
+
+        if inverse:
+            np.matmul(self.array - translation, rotationMatrixT, out=out.buffer)
+        else:
+            np.matmul(self.array, rotationMatrixT, out=out.buffer)
+            out.buffer += translation
+
+        return out
+
+
+class FeatureSequence:
+    """
+    Per frame variant of FeatureSet, same fixed name table with an (F,N,d) array
+    """
+    def __init__(self, names, array, frames = None):
+        """
+        Initialize the sequence
+        :param names: list of feature names
+        :param array: array (F,N,d)
+        :param frames: array (F,) of frame numbers, default 0..F-1
+        """
+        self.array = np.asarray(array, dtype=np.float64)
+        assert (self.array.ndim == 3 and self.array.shape[1] == len(names)), "Shape mismatch : names and feature array"
+        self.names = list(names)
+        self.nameIndex = {name: index for index, name in enumerate(self.names)}
+        if frames is None:
+            frames = np.arange(self.array.shape[0])
+        self.frames = np.asarray(frames)
+
+    @classmethod
+    def fromFeatureSet(cls, featureSet, noOfFrames):
+        """
+        Repeat the given features for all frames (e.g. features in object space)
+        :param featureSet: FeatureSet
+        :param noOfFrames: int
+        :return: FeatureSequence
+        """
+        array = np.broadcast_to(featureSet.array, (noOfFrames,) + featureSet.array.shape)
+        return cls(featureSet.names[:featureSet.size], array)
+
+    def __len__(self):
+        return self.array.shape[0]
+
+    def frame(self, index):
+        """
+        Features of one frame as FeatureSet, the array is a view on the sequence
+        :param index: int, position in the sequence
+        :return: FeatureSet
+        """
+        return FeatureSet.fromArray(self.names, self.array[index], self.nameIndex)
+
+    def getFeature(self, feature):
+        """
+        Trajectory of one feature
+        :param feature: str
+        :return: array (F,d)
+        """
+        return self.array[:, self.nameIndex[feature]]
+
+    def transform(self, rotationMatrices, translations, inverse = False):
+        """
+        Transform the features of each frame with its own rotation and translation
+        :param rotationMatrices: array (F,3,3), already inverted if inverse is True
+        :param translations: array (F,3)
+        :param inverse: P_out = R.(P - T) instead of P_out = R.P + T
+        :return: FeatureSequence
+        """
+        translations = np.asarray(translations, dtype=np.float64)[:, np.newaxis, :]
+        rotationMatricesT = np.swapaxes(rotationMatrices, -1, -2)
+        if inverse:
+            transformed = np.matmul(self.array - translations, rotationMatricesT)
+        else:
+            transformed = np.matmul(self.array, rotationMatricesT) + translations
+
+        return FeatureSequence(self.names, transformed, self.frames)
+
+
+def unitTest():
+    features = FeatureSet(3, {"head1": [0, 0, 0], "head2": [1, 0, 0]})
+    features["head3"] = [0, 1, 0]
+    print("Features: ", features, " Array shape: ", features.array.shape)
+
+    features.setFeatures({"head1": [1, 1, 1], "body1": [2, 2, 2]})
+    print("Updated features: ", dict(features))
+
+    del features["head2"]
+    print("Removed features: ", list(features), features.array)
+
+    transformed = features.transform(np.identity(3), [10, 0, 0])
+    print("Transformed: ", transformed)
+    print("Back transformed: ", transformed.transform(np.identity(3), [10, 0, 0], inverse=True))
+
+    sequence = FeatureSequence.fromFeatureSet(features, 4)
+    rotations = np.tile(np.identity(3), (4, 1, 1))
+    translations = np.arange(12).reshape(4, 3)
+    moved = sequence.transform(rotations, translations)
+    print("Frame 2 : ", moved.frame(2))
+    print("Trajectory head1: ", moved.getFeature("head1"))
+
+
+if __name__ == "__main__":
+    unitTest()
@@ -3,7 +3,9 @@ from VICONMath import transformations as transformationOp
 import numpy as np
 import cv2 as cv
 from VICONDrawingOperations import drawOp
+from VICONSystem import featureSet
 import os
+from concurrent.futures import ThreadPoolExecutor
 
 
 class ImageVicon:
@@ -25,7 +27,9 @@ class ImageVicon:
         assert (instrinsicMatrix.shape == (3, 3)),"Shape mismatch : Instrinsic matrix"
         self.intrinsicMatrix = instrinsicMatrix
 
-        self.featureDict = {}
+        self.featureDict = featureSet.FeatureSet(2)
+        # Undistortion maps per image size {(height, width, calibration): (map1, map2)}
+        self.undistortMaps = {}
 
     def drawFeatureLine(self,image,point1,point2,lineColor = (255,255,255), lineWidth = 3):
         """
@@ -36,41 +40,44 @@ class ImageVicon:
                 (int(point2[0]), int(point2[1])), lineColor , lineWidth)
 
 
-    def drawPosture(self, image):
+    def drawPosture(self, image, skeleton = None, lineWidth = 3):
+        """
+        Draw the posture lines between the features
+        :param image: image
+        :param skeleton: list of (first feature, second feature, color), default drawOp.defaultSkeleton
+        :param lineWidth: int
+        """
         # HYR =(Height, Y coordinate, Rows), WXC = (Width, X coordinate, Cols)
+        if skeleton is None:
+            skeleton = drawOp.defaultSkeleton
+        edges = [edge for edge in skeleton if edge[0] in self.featureDict and edge[1] in self.featureDict]
+        if len(edges) == 0:
+            return
+        firstPoints = np.array([self.featureDict[first] for first, second, color in edges])
+        secondPoints = np.array([self.featureDict[second] for first, second, color in edges])
+        colorGroups = drawOp.groupByColor([color for first, second, color in edges])
+        drawOp.drawLineArray(image, firstPoints, secondPoints, colorGroups, lineWidth)
+
+
+    def getRoiOnKeypoint(self,feature, tempImage, roiSize = 400, size = 100):
+        """
+        Region around the given feature resized to roiSize x roiSize, black image if the feature is not in the image
+        :param feature: str
+        :param tempImage: image, it is not modified
+        :param roiSize: size of the returned image
+        :param size: half size of the region in the image
+        :return: image (roiSize,roiSize,3)
+        """
+        height, width = tempImage.shape[0:2]
+        point = self.featureDict.getPoint(feature) if feature in self.featureDict else np.zeros(2)
 
-        # Draw head Vectors
-        if "head_beak" in self.featureDict and "head_leftEye" in self.featureDict:
-            self.drawFeatureLine(image, self.featureDict["head_beak"],self.featureDict["head_leftEye"],(0,0,255))
-        if "head_beak" in self.featureDict and "head_rightEye" in self.featureDict:
-            self.drawFeatureLine(image, self.featureDict["head_beak"],self.featureDict["head_rightEye"],(0,255,255))
-
-        if "body_tail" in self.featureDict and "body_leftShoulder" in self.featureDict:
-            self.drawFeatureLine(image, self.featureDict["body_tail"],self.featureDict["body_leftShoulder"],(255,255,0))
-        if "body_tail" in self.featureDict and "body_rightShoulder" in self.featureDict:
-            self.drawFeatureLine(image, self.featureDict["body_tail"],self.featureDict["body_rightShoulder"],(255,0,255))
-
-
-    def getRoiOnKeypoint(self,feature, tempImage, roiSize = 400):
-
-        point = [0,0]
-        clone = tempImage.copy()
-        height, width, channel = clone.shape
-
-        if feature in self.featureDict:
-            point = self.featureDict[feature]
-            point = [int(point[0]),int(point[1])]
-
-        resized = np.zeros((400,400,3), np.uint8)
-        if (point[0] != 0 and point[1] != 0) and imageOp.isPointValid(point, height,width):
-            roi = self.getRoi(point, height, width, 100)
-            roiWidth = roi[3] - roi[2]  # x2 - x1
-            roiHeight = roi[1] - roi[0]  # y2 - y1
-            roiImage = clone[roi[2]:roi[3], roi[0]:roi[1], :]
-            resized = cv.resize(roiImage, (400, 400), interpolation=cv.INTER_AREA)
-
-        # Fill in black frame if no feature was detected
-        #clone[0:resized.shape[0], 0:resized.shape[1]] = resized
+        resized = np.zeros((roiSize, roiSize, 3), np.uint8)
+        roi, valid = imageOp.computeRoiArray(point, height, width, size)
+        if valid:
+            # Slice is a view on the frame, only the region is read by the resize
+            roiImage = tempImage[roi[2]:roi[3], roi[0]:roi[1], :]
+            if roiImage.size != 0:
+                resized = cv.resize(roiImage, (roiSize, roiSize), interpolation=cv.INTER_AREA)
 
         return resized
 
@@ -155,30 +162,38 @@ class ImageVicon:
         return True
 
 
-    def drawFeatures(self, image, pointSize = 2):
+    def drawFeatures(self, image, pointSize = 2, featureScale = None):
         """
         Drawing feature points using the feature dict
         :param image:
+        :param featureScale: [sx, sy] scale of the feature coordinates for downscaled images (e.g. proxy videos), see
+                             imageOp.scaleImagePoints
         :return:
         """
 
-        #pointList = list(self.featureDict.values())
         assert (pointSize > 0)," Error in point size"
         # HYR =(Height, Y coordinate, Rows), WXC = (Width, X coordinate, Cols)
         height, width, channel = image.shape
-        for feature in self.featureDict:
-            if imageOp.isPointValid(self.featureDict[feature],height,width):
-                featureColor = drawOp.getColor(feature)
-                drawOp.drawPoint(image,self.featureDict[feature], pointSize, featureColor )
-            else:
-                drawOp.drawPoint(image,[0,0],8)
+        features = self.featureDict
+        if not isinstance(features, featureSet.FeatureSet):
+            features = featureSet.FeatureSet(2, features)
+        points = features.array
+        if featureScale is not None:
+            points = imageOp.scaleImagePoints(points, featureScale)
+
+        valid = imageOp.computePointValidity(points, height, width)
+        colors = drawOp.getColorTable(list(features))
+        drawOp.drawPointArray(image, points[valid], drawOp.groupByColor(colors[valid]), pointSize)
+        if not np.all(valid):
+            drawOp.drawPoint(image,[0,0],8)
 
     def clearFeatures(self):
         """
-        Clear all features
+        Clear all features in place, featureDict stays the same FeatureSet (references to it see the empty set) and
+        its buffer is reused
         :return: True
         """
-        self.featureDict = {}
+        self.featureDict.clear()
         return True
 
     def drawFeaturePointsOnImg(self, image, pointList, pointSize):
@@ -196,33 +211,71 @@ class ImageVicon:
             else:
                 drawOp.drawPoint(image,[0,0],8)
 
+    def getUndistortMaps(self, height, width):
+        """
+        Fixed point undistortion maps of the camera for the given image size, computed once and reused
+        :param height: image height
+        :param width: image width
+        :return: map1 (CV_16SC2), map2 (CV_16UC1) for cv.remap
+        """
+        # Calibration is part of the key, maps are recomputed if the matrices are replaced
+        key = (height, width, self.intrinsicMatrix.tobytes(), self.distortionMatrix.tobytes())
+        maps = self.undistortMaps.get(key)
+        if maps is None:
+            maps = cv.initUndistortRectifyMap(self.intrinsicMatrix, self.distortionMatrix, None, self.intrinsicMatrix,
+                                              (width, height), cv.CV_16SC2)
+            self.undistortMaps[key] = maps
+        return maps
+
     def undistortImage(self, image):
         """
-        Undistort the image send to the class
+        Undistort the image send to the class, same result as cv.undistort with one remap per image
         :return: Matrix (Image)
         """
-        undistortedImage = cv.undistort(image, self.intrinsicMatrix, self.distortionMatrix)
-        if( image.all() == undistortedImage.all()):
-            print("Image did not changed after undistortion")
-
-        return undistortedImage
+        map1, map2 = self.getUndistortMaps(image.shape[0], image.shape[1])
+        return cv.remap(image, map1, map2, cv.INTER_LINEAR)
 
-    def projectFeaturesFromCamSpaceToImageSpace(self, camFeaturesDict):
+    def undistortImages(self, images, noOfThreads = 4):
+        """
+        Undistort a sequence of frames on a thread pool (cv.remap releases the GIL), the frames are returned in order
+        :param images: iterable of images (e.g. frames of a video), None is passed through
+        :param noOfThreads: number of threads
+        :return: generator of undistorted images
+        """
+        def undistort(image):
+            return None if image is None else self.undistortImage(image)
+
+        with ThreadPoolExecutor(max_workers=noOfThreads) as executor:
+            # Limited number of frames in flight, the sequence is not read into memory
+            pending = []
+            for image in images:
+                if image is not None:
+                    # Maps are built in the caller thread, the workers only read the cache
+                    self.getUndistortMaps(image.shape[0], image.shape[1])
+                pending.append(executor.submit(undistort, image))
+                if len(pending) > 2 * noOfThreads:
+                    yield pending.pop(0).result()
+            for future in pending:
+                yield future.result()
+
+    def projectFeaturesFromCamSpaceToImageSpace(self, camFeaturesDict, out = None):
         """
         The function transfers given points from 3D space (in cam space) to 2D space of image
-        :param camFeaturesDict: Dictionary of 3D features to be transferred to 2D
-        :return: dictionary of transferred 2D points
+        :param camFeaturesDict: Dictionary (or FeatureSet) of 3D features to be transferred to 2D
+        :param out: FeatureSet returned by the previous call, its array is reused if the 3D features are the same
+        :return: FeatureSet of transferred 2D points, dict compatible
         """
-        pointListCameraSpace = list(camFeaturesDict.values())
-        imgPoints = imageOp.projectPointCamSpaceToImgSpace(pointListCameraSpace, self.intrinsicMatrix,
-                                                           self.distortionMatrix)
-        # Dict : {"Feature":[X,Y,Z]}
-        featureList = list(camFeaturesDict)
-        imgFeaturesDict = {}
-        for index in range(len(featureList)):
-            imgFeaturesDict[featureList[index]] = imgPoints[index]
-
-        return imgFeaturesDict
+        if not isinstance(camFeaturesDict, featureSet.FeatureSet):
+            camFeaturesDict = featureSet.FeatureSet(3, camFeaturesDict)
+
+        imgPoints = imageOp.projectPointArrayCamSpaceToImgSpace(camFeaturesDict.array, self.intrinsicMatrix,
+                                                                self.distortionMatrix)
+        # Projections share the feature table of the 3D features {"Feature":[X,Y]}
+        camFeaturesDict.sharedNames = True
+        if out is not None and out.names is camFeaturesDict.names and out.buffer.shape == imgPoints.shape:
+            out.buffer[:] = imgPoints
+            return out
+        return featureSet.FeatureSet.fromArray(camFeaturesDict.names, imgPoints, camFeaturesDict.nameIndex)
 
     def projectOnImageFromCamSpace(self, pointListCameraSpace):
         """
@@ -265,11 +318,7 @@ class ImageVicon:
         :param  set the features in the dict using given dict
         :return: True/False
         """
-        for feature in featuresDict:
-            self.featureDict[feature] = featuresDict[feature]
-
-        # self.generateFeatureMat()
-        return True
+        return self.featureDict.setFeatures(featuresDict)
 
 # TODO : Unit testing of the class and feature saving and management algorithm
 if __name__ == "__main__":
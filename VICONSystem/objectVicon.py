@@ -5,6 +5,7 @@ import numpy as np
 import os
 from VICONMath import transformations as transferOp
 from VICONFileOperations import rwOperations
+from VICONSystem import featureSet
 
 class ObjectVicon:
     """The class is object is base class for VICONTrackingObjects and VICONCameraObjects"""
@@ -22,50 +23,46 @@ class ObjectVicon:
         self.featurePoints = []
         self.featureList = []
 
-        self.featureDict = {}
+        self.featureDict = featureSet.FeatureSet(3)
 
     def clearFeatures(self):
         """
-        Clear all features
+        Clear all features in place, featureDict stays the same FeatureSet (references to it see the empty set) and
+        its buffer is reused
         :return: True
         """
-        self.featureDict = {}
+        self.featureDict.clear()
 
     def setTransformationParameters(self, rotation, translation ):
 
         self.rotation = rotation
         self.translation = translation
 
-    def transferFeaturesToViconSpace(self) :
+    def transferFeaturesToViconSpace(self, out = None) :
         """
         Transfer the features from Object space to target space
-        :return: dict (3D features)
+        :param out: FeatureSet returned by the previous call, its array is reused
+        :return: FeatureSet (3D features), dict compatible
         """
         assert (len(self.featureDict) != 0), "Dicitonary empty!! No object features to transfer"
-        featureList = list(self.featureDict.values())
-        targetPoints = transferOp.transformPoint3D(featureList, self.rotation, self.translation)
-        targetPoints = targetPoints.tolist()
-        transferedFeatureDict = {}
-        for feature,index in zip(self.featureDict,range(len(targetPoints)) ):
-            transferedFeatureDict[feature] = targetPoints[index]
+        rotationMatrix, translationMatrix = transferOp.transformationParamListToMatrix(self.rotation, self.translation)
+        return self.featureDict.transform(rotationMatrix, translationMatrix, out=out)
 
-        return transferedFeatureDict
-
-    def transferFeaturesToObjectSpace(self, featureDictViconSpace):
+    def transferFeaturesToObjectSpace(self, featureDictViconSpace, out = None):
         """
         Transfer feature points from given coordinate system to object space
-        :return: dictionary of features
+        :param featureDictViconSpace: dict or FeatureSet of features
+        :param out: FeatureSet returned by the previous call, its array is reused
+        :return: FeatureSet (3D features), dict compatible
         """
         assert (len(featureDictViconSpace) != 0), "Given featurelist is empty"
 
-        featureList = list(featureDictViconSpace.values())
-        targetPoints = transferOp.transformPoint3D(featureList, self.rotation, self.translation, True)
-        targetPoints = targetPoints.tolist()
-        transferedFeatureDict = {}
-        for feature, index in zip(featureDictViconSpace, range(len(targetPoints)) ):
-            transferedFeatureDict[feature] = targetPoints[index]
+        if not isinstance(featureDictViconSpace, featureSet.FeatureSet):
+            featureDictViconSpace = featureSet.FeatureSet(3, featureDictViconSpace)
 
-        return transferedFeatureDict
+        rotationMatrixInv, translationMatrix = transferOp.transformationParamListToMatrix(self.rotation, self.translation,
+                                                                                         inversion=True)
+        return featureDictViconSpace.transform(rotationMatrixInv, translationMatrix, inverse=True, out=out)
 
     def transferPointsToObjectSpace(self, pointList):
         """
@@ -89,10 +86,7 @@ class ObjectVicon:
         :param  set the features in the dict using given dict
         :return: True/False
         """
-        for feature in featuresDict:
-            self.featureDict[feature] = featuresDict[feature]
-
-        return True
+        return self.featureDict.setFeatures(featuresDict)
 
     def removeSelectedFeatures(self, features):
         """
@@ -100,11 +94,7 @@ class ObjectVicon:
         :param featureDict: dict
         :return: bool
         """
-        for feature in features:
-            if feature in self.featureDict:
-                del self.featureDict[feature]
-
-        return True
+        return self.featureDict.removeFeatures(features)
 
     def filterFeaturesBasedOnObject(self, dict):
         """
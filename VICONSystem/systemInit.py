@@ -1,5 +1,10 @@
 import glob
+import hashlib
+import json
 import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from VICONFileOperations import loadVICONCalib
 from VICONFileOperations import rwOperations
 from VICONFileOperations import rwCustomC3DFiles
@@ -9,18 +14,40 @@ from VICONSystem import videoVicon
 from VICONSystem import imageVicon
 import cv2 as cv
 from VICONSystem import camera
+from VICONSystem import featureSet
 import numpy as np
+import pandas as pd
 
 # VICON System class initialise the system and loads the important information regarding the session and VICON settings
 # Camera calibration and path for processing the video files
 class VICONSystemInit:
 
-    def __init__(self, projectSettings, directoryName = None):
+    # Independent load stages, loaded concurrently by loadAll, followed by the stages depending on them
+    independentStages = ["cameraInstances", "dataObject", "c3dDataObject", "viconObjects", "viconVideoObjects"]
+    dependentStages = ["viconCameraObjets", "viconImageObjects"]
+    # Stages each dependent stage is created from, a dependent stage is reset with them
+    stageDependencies = {"viconCameraObjets": ["cameraInstances", "viconObjects"],
+                         "viconImageObjects": ["cameraInstances"]}
+
+    # Stages saved in the session snapshot with the arrays and values stored per item, the snapshot version is derived
+    # from the schema. Other stages (e.g. viconCameraObjets) are created again from the restored stages.
+    snapshotSchema = {"cameraInstances": {"arrays": ["intrinsicParam", "distortionParam"],
+                                          "metadata": ["cameraType", "cameraID", "extrinsicRotation",
+                                                       "extrinsicTranslation"]},
+                      "dataObject": {"arrays": ["index", "column"],
+                                     "metadata": ["dataBaseFile", "objectsToTrack", "columns",
+                                                  "videoCameraFrameRateRatio", "startIndex"]},
+                      "viconObjects": {"arrays": ["points"], "metadata": ["name", "featureNames"]}}
+    snapshotStages = list(snapshotSchema)
+
+    def __init__(self, projectSettings, directoryName = None, parallelLoad = False, useSnapshot = False):
         """
         Constructor for initialising vicon system. Gets the root folder of VICON and Session to be worked on and created required
         file names for the .csv file and .xcp file. Also generates name for the video files.
         :param dirName: Directory which has vicon session data
         :param sessionName: Name of the recording session
+        :param parallelLoad: bool, load all the session data concurrently in the constructor (see loadAll)
+        :param useSnapshot: bool, restore unchanged session data from the snapshot file and save the loaded data to it
         """
         self.settingsDict = projectSettings.settingsDict
         directoryName = projectSettings.settingsDict["rootDirectory"]
@@ -35,27 +62,373 @@ class VICONSystemInit:
         # Generate information about the VICON session
         self.dataFileName =  self.generateCSVFileName()
         self.calibFileName = self.generateCalibFileName()
-
-        # Get information about camera objects
-        self.cameraInstances = self.loadCalibInfo()
         self.customCameraInstances = []
         self.sessionVideoFiles = self.generateVideoFileNames()
-        self.cameraInstances = self.filterObjectBasedOnVideoFile()
 
-        # Load CSV file and create object
-        self.dataObject = self.loadDataFile()
-        self.c3dDataObject = self.loadc3dFile()
-        # Create objects for camera and objects
-        self.viconObjects = self.loadVICONObjects()
-        self.viconCameraObjets = self.loadVICONCameraObjects()
-        self.viconVideoObjects = self.loadVideoObjects()
-        self.viconImageObjects = self.loadImageObjects()
+        # Calibration, data files, objects and videos are loaded on first access (see properties below) and cached
+        self.loadedStages = {}
+        self.loadTimings = {}
+        # Stages loaded by the current thread, used to compute the duration of each stage without nested stages
+        self.loadStack = threading.local()
+        self.stageLocks = {}
+        self.stageLocksLock = threading.Lock()
+
+        # Stored stages for the snapshot {stage: {"fingerprint": .., "metadata": [..], "arrays": {name: array}}}
+        self.useSnapshot = useSnapshot
+        self.snapshotArtifacts = {}
+        self.snapshotModified = False
+        if useSnapshot:
+            self.loadSnapshot()
+
+        if parallelLoad:
+            self.loadAll()
+            if useSnapshot:
+                self.saveSnapshot()
+
+    def loadStage(self, stage, loader):
+        """
+        Returns the cached result of the load stage, the stage is loaded on first access and its duration is saved in
+        loadTimings (without the duration of other stages loaded by it)
+        :param stage: str, name of the stage
+        :param loader: function loading the stage
+        :return: result of the loader
+        """
+        if stage in self.loadedStages:
+            return self.loadedStages[stage]
+
+        # Stage is loaded only once even if it is requested by several threads
+        with self.stageLocksLock:
+            stageLock = self.stageLocks.setdefault(stage, threading.Lock())
+
+        with stageLock:
+            if stage not in self.loadedStages:
+                if not hasattr(self.loadStack, "durations"):
+                    self.loadStack.durations = []
+                loadStack = self.loadStack.durations
+                loadStack.append(0.0)
+                startTime = time.perf_counter()
+                try:
+                    result = loader()
+                finally:
+                    duration = time.perf_counter() - startTime
+                    nestedDuration = loadStack.pop()
+                    if len(loadStack) != 0:
+                        loadStack[-1] += duration
+                self.loadTimings[stage] = duration - nestedDuration
+                self.loadedStages[stage] = result
+                if self.useSnapshot and stage in self.snapshotStages:
+                    # Stored right after loading, later modifications of the objects are not part of the snapshot
+                    metadata, arrays = self.encodeStage(stage, result)
+                    self.snapshotArtifacts[stage] = {"fingerprint": self.getArtifactFingerprint(stage),
+                                                     "metadata": metadata, "arrays": arrays}
+                    self.snapshotModified = True
+
+        return self.loadedStages[stage]
+
+    def loadAll(self, noOfWorkers = None, useProcessPool = False):
+        """
+        Load all the session data concurrently. The CSV parse, c3d decode, calibration parse and video opens are run on a
+        thread pool (optionally the CSV parse in a separate process), then the objects depending on them are created.
+        Errors of all stages are collected and reported together in the order of the stages.
+        :param noOfWorkers: number of threads, default one per independent stage
+        :param useProcessPool: bool, parse the CSV file in a separate process
+        :return: dict of load timings
+        """
+        loaders = {stage: getattr(VICONSystemInit, stage).fget for stage in self.independentStages}
+        processExecutor = ProcessPoolExecutor(max_workers=1) if useProcessPool else None
+        if processExecutor is not None:
+            dataFileName = self.dataFileName
+            loaders["dataObject"] = lambda session: session.loadStage("dataObject", lambda: processExecutor.submit(
+                rwOperations.TrackerDatabaseReader, dataFileName, self.settingsDict["objectsToTrack"]).result())
+
+        errors = []
+        try:
+            for stages in [self.independentStages, self.dependentStages]:
+                with ThreadPoolExecutor(max_workers=noOfWorkers or len(stages)) as executor:
+                    futures = [(stage, executor.submit(loaders.get(stage, getattr(VICONSystemInit, stage).fget), self))
+                               for stage in stages]
+                # Results are checked in the order of the stages, not in the order of completion
+                for stage, future in futures:
+                    if future.exception() is not None:
+                        errors.append((stage, future.exception()))
+                if len(errors) != 0:
+                    break
+        finally:
+            if processExecutor is not None:
+                processExecutor.shutdown()
+
+        if len(errors) != 0:
+            message = "; ".join("{} : {!r}".format(stage, error) for stage, error in errors)
+            raise ValueError("Loading of session data failed, " + message) from errors[0][1]
+
+        return dict(self.loadTimings)
+
+    def getSnapshotFileName(self):
+        """
+        Name of the snapshot file of the session
+        :return: str
+        """
+        return os.path.join(self.rootDirectory, self.sessionName + ".snapshot.npz")
+
+    @staticmethod
+    def getSnapshotVersion(schema):
+        """
+        Version of the snapshot format, derived from the schema of the stored stages
+        :param schema: dict {stage: {"arrays": [..], "metadata": [..]}}
+        :return: str
+        """
+        return hashlib.sha1(json.dumps(schema, sort_keys=True).encode("utf-8")).hexdigest()[:12]
+
+    def getArtifactFingerprint(self, stage):
+        """
+        Fingerprint of the files and settings a stage is loaded from, the stage in the snapshot is valid only if the
+        fingerprint did not change
+        :param stage: str, name of the stage
+        :return: list (json compatible)
+        """
+        objectFiles = [os.path.join(self.rootDirectory, object + ".mp") for object in self.settingsDict["objectsToTrack"]]
+        artifacts = {"cameraInstances": ([self.calibFileName], sorted(self.sessionVideoFiles)),
+                     "dataObject": ([self.dataFileName], list(self.settingsDict["objectsToTrack"])),
+                     "viconObjects": (objectFiles, list(self.settingsDict["objectsToTrack"]))}
+        files, settings = artifacts[stage]
+
+        fingerprint = []
+        for file in files:
+            if os.path.exists(file):
+                fileStat = os.stat(file)
+                fingerprint.append([os.path.abspath(file), fileStat.st_size, fileStat.st_mtime_ns])
+            else:
+                fingerprint.append([os.path.abspath(file), -1, -1])
+
+        return [fingerprint, list(settings)]
+
+    def encodeStage(self, stage, result):
+        """
+        Convert the loaded objects of a stage to json values and arrays following snapshotSchema
+        :param stage: str, name of the stage
+        :param result: loaded objects of the stage
+        :return: list of metadata (one dict per item), dict {name: array}
+        """
+        metadata = []
+        arrays = {}
+        if stage == "cameraInstances":
+            for i, cameraInstance in enumerate(result):
+                metadata.append({"cameraType": cameraInstance.cameraType, "cameraID": cameraInstance.cameraID,
+                                 "extrinsicRotation": [float(value) for value in cameraInstance.extrinsicRotation],
+                                 "extrinsicTranslation": [float(value) for value in cameraInstance.extrinsicTranslation]})
+                arrays["{}.intrinsicParam".format(i)] = np.array(cameraInstance.intrinsicParam)
+                arrays["{}.distortionParam".format(i)] = np.array(cameraInstance.distortionParam)
+        elif stage == "dataObject":
+            metadata.append({"dataBaseFile": result.dataBaseFile, "objectsToTrack": list(result.objectsToTrack),
+                             "columns": [str(column) for column in result.data.columns],
+                             "videoCameraFrameRateRatio": result.videoCameraFrameRateRatio,
+                             "startIndex": result.startIndex})
+            arrays["0.index"] = result.data.index.to_numpy(copy=True)
+            for i, column in enumerate(result.data.columns):
+                arrays["0.column{}".format(i)] = result.data[column].to_numpy(copy=True)
+        elif stage == "viconObjects":
+            for i, viconObject in enumerate(result):
+                metadata.append({"name": viconObject.name, "featureNames": list(viconObject.featureDict.keys())})
+                arrays["{}.points".format(i)] = np.array(viconObject.featureDict.array)
+        else:
+            raise ValueError("Stage is not part of the snapshot : " + stage)
+
+        return metadata, arrays
+
+    def decodeStage(self, stage, metadata, arrays):
+        """
+        Create the objects of a stage from the values and arrays stored by encodeStage
+        :param stage: str, name of the stage
+        :param metadata: list of metadata (one dict per item)
+        :param arrays: dict {name: array}
+        :return: objects of the stage
+        """
+        if stage == "cameraInstances":
+            cameraInstances = []
+            for i, item in enumerate(metadata):
+                cameraInstance = camera.Camera()
+                cameraInstance.setCameraInfo(item["cameraType"], item["cameraID"])
+                cameraInstance.setIntrinsicParam(arrays["{}.intrinsicParam".format(i)],
+                                                 np.matrix(arrays["{}.distortionParam".format(i)]))
+                cameraInstance.setExtrinsicParam(item["extrinsicRotation"], item["extrinsicTranslation"])
+                cameraInstances.append(cameraInstance)
+            return cameraInstances
+        elif stage == "dataObject":
+            item = metadata[0]
+            data = pd.DataFrame({column: arrays["0.column{}".format(i)] for i, column in enumerate(item["columns"])},
+                                index=arrays["0.index"])
+            return rwOperations.TrackerDatabaseReader.fromDataFrame(item["dataBaseFile"], item["objectsToTrack"], data,
+                                                                    item["videoCameraFrameRateRatio"],
+                                                                    item["startIndex"])
+        elif stage == "viconObjects":
+            viconObjects = []
+            for i, item in enumerate(metadata):
+                viconObject = objectVicon.ObjectVicon(name=item["name"])
+                viconObject.setFeatures(featureSet.FeatureSet.fromArray(item["featureNames"],
+                                                                        arrays["{}.points".format(i)]))
+                viconObjects.append(viconObject)
+            return viconObjects
+        else:
+            raise ValueError("Stage is not part of the snapshot : " + stage)
+
+    def loadSnapshot(self, fileName = None):
+        """
+        Read the snapshot file once and restore the stages whose files did not change, the other stages are loaded
+        from the files on access
+        :param fileName: str, default getSnapshotFileName()
+        :return: list of restored stages
+        """
+        if fileName is None:
+            fileName = self.getSnapshotFileName()
+        if not os.path.exists(fileName):
+            return []
+
+        try:
+            with np.load(fileName, allow_pickle=False) as snapshotFile:
+                manifest = json.loads(str(snapshotFile["manifest"]))
+                storedArrays = {name: snapshotFile[name] for name in snapshotFile.files if name != "manifest"}
+        except (OSError, ValueError, KeyError) as error:
+            print("Snapshot could not be read, session data is loaded from files : ", error)
+            return []
+
+        if (not isinstance(manifest, dict) or manifest.get("schema") != self.snapshotSchema or
+                manifest.get("version") != self.getSnapshotVersion(manifest.get("schema"))):
+            print("Snapshot version changed, session data is loaded from files")
+            return []
+
+        restoredStages = []
+        for stage, artifact in manifest["artifacts"].items():
+            if stage not in self.snapshotStages or stage in self.loadedStages:
+                continue
+            if artifact["fingerprint"] != self.getArtifactFingerprint(stage):
+                print("Snapshot outdated for : ", stage)
+                continue
+            arrays = {name: storedArrays[stage + "." + name] for name in artifact["arrays"]}
+            startTime = time.perf_counter()
+            self.loadedStages[stage] = self.decodeStage(stage, artifact["metadata"], arrays)
+            self.loadTimings[stage] = time.perf_counter() - startTime
+            self.snapshotArtifacts[stage] = {"fingerprint": artifact["fingerprint"],
+                                             "metadata": artifact["metadata"], "arrays": arrays}
+            restoredStages.append(stage)
+
+        print("Restored from snapshot : ", restoredStages)
+        return restoredStages
+
+    def saveSnapshot(self, fileName = None):
+        """
+        Save the stored stages to the snapshot file (.npz, values of the stages as json), the file is replaced only if a
+        stage was loaded from files
+        :param fileName: str, default getSnapshotFileName()
+        :return: bool, True if the file was written
+        """
+        if fileName is None:
+            fileName = self.getSnapshotFileName()
+        if not self.snapshotModified and os.path.exists(fileName):
+            return False
+
+        manifest = {"version": self.getSnapshotVersion(self.snapshotSchema), "schema": self.snapshotSchema,
+                    "artifacts": {}}
+        storedArrays = {}
+        for stage, artifact in self.snapshotArtifacts.items():
+            manifest["artifacts"][stage] = {"fingerprint": artifact["fingerprint"], "metadata": artifact["metadata"],
+                                            "arrays": sorted(artifact["arrays"])}
+            for name, array in artifact["arrays"].items():
+                storedArrays[stage + "." + name] = array
+
+        temporaryFileName = fileName + ".tmp"
+        with open(temporaryFileName, "wb") as file:
+            np.savez(file, manifest=np.array(json.dumps(manifest)), **storedArrays)
+        os.replace(temporaryFileName, fileName)
+        self.snapshotModified = False
+        return True
+
+    def resetStage(self, stage):
+        """
+        Remove cached result of the load stage and its snapshot artifact, it is loaded again on next access. The stages
+        created from it are reset too.
+        :param stage: str, name of the stage
+        :return: None
+        """
+        self.loadedStages.pop(stage, None)
+        self.loadTimings.pop(stage, None)
+        if self.snapshotArtifacts.pop(stage, None) is not None:
+            self.snapshotModified = True
+
+        for dependentStage, stages in self.stageDependencies.items():
+            if stage in stages:
+                self.resetStage(dependentStage)
+
+    def printLoadTimings(self):
+        """
+        Prints the duration of all loaded stages
+        :return: None
+        """
+        for stage, duration in self.loadTimings.items():
+            print("Load stage : ", stage, " {:.3f} s".format(duration))
+
+    # Get information about camera objects
+    @property
+    def cameraInstances(self):
+        return self.loadStage("cameraInstances", lambda: self.filterObjectBasedOnVideoFile(self.loadCalibInfo()))
+
+    @cameraInstances.setter
+    def cameraInstances(self, cameraInstances):
+        self.loadedStages["cameraInstances"] = cameraInstances
+
+    # Load CSV file and create object
+    @property
+    def dataObject(self):
+        return self.loadStage("dataObject", self.loadDataFile)
+
+    @dataObject.setter
+    def dataObject(self, dataObject):
+        self.loadedStages["dataObject"] = dataObject
+
+    @property
+    def c3dDataObject(self):
+        return self.loadStage("c3dDataObject", self.loadc3dFile)
+
+    @c3dDataObject.setter
+    def c3dDataObject(self, c3dDataObject):
+        self.loadedStages["c3dDataObject"] = c3dDataObject
+
+    # Create objects for camera and objects
+    @property
+    def viconObjects(self):
+        return self.loadStage("viconObjects", self.loadVICONObjects)
+
+    @viconObjects.setter
+    def viconObjects(self, viconObjects):
+        self.loadedStages["viconObjects"] = viconObjects
+
+    @property
+    def viconCameraObjets(self):
+        return self.loadStage("viconCameraObjets", self.loadVICONCameraObjects)
+
+    @viconCameraObjets.setter
+    def viconCameraObjets(self, viconCameraObjets):
+        self.loadedStages["viconCameraObjets"] = viconCameraObjets
+
+    @property
+    def viconVideoObjects(self):
+        return self.loadStage("viconVideoObjects", self.loadVideoObjects)
+
+    @viconVideoObjects.setter
+    def viconVideoObjects(self, viconVideoObjects):
+        self.loadedStages["viconVideoObjects"] = viconVideoObjects
+
+    @property
+    def viconImageObjects(self):
+        return self.loadStage("viconImageObjects", self.loadImageObjects)
+
+    @viconImageObjects.setter
+    def viconImageObjects(self, viconImageObjects):
+        self.loadedStages["viconImageObjects"] = viconImageObjects
 
     def loadDataFile(self):
         print("Load data file")
-        dataFileName = os.path.join(self.rootDirectory,self.settingsDict["dataFile"])
         # todo: videoToIRDataCaptureRatio should be saved in the settings file
-        dataObject = rwOperations.TrackerDatabaseReader(dataFileName, self.settingsDict["objectsToTrack"])  # Read the csv file
+        dataObject = rwOperations.TrackerDatabaseReader(self.dataFileName, self.settingsDict["objectsToTrack"])  # Read the csv file
         return dataObject
 
     def loadc3dFile(self):
@@ -124,6 +497,15 @@ class VICONSystemInit:
 
         return videoObjects
 
+    def loadMultiCameraReader(self, frameOffsets = None, checkFrameCount = True):
+        """
+        Create synchronized reader for the videos of all cameras, frames are decoded in parallel (one worker per camera)
+        :param frameOffsets: list of int, frame offset per camera in the order of the cameras in the settings
+        :param checkFrameCount: bool, raise error if the videos do not have the same number of frames
+        :return: instance of videoVicon.MultiCameraReader
+        """
+        return videoVicon.MultiCameraReader(self.viconVideoObjects, frameOffsets, checkFrameCount)
+
     def loadImageObjects(self, customObjects = False):
 
         imageObjects = []
@@ -182,33 +564,39 @@ class VICONSystemInit:
         """
         return os.path.exists(path)
 
-    def filterObjectBasedOnVideoFile(self):
+    def filterObjectBasedOnVideoFile(self, cameraInstances = None):
         """
         Remove camera objects not having video files to support video tracking
+        :param cameraInstances: list of camera instances, default the camera instances of the session
         :return:
         """
+        if cameraInstances is None:
+            cameraInstances = self.cameraInstances
         updatedCamObjects = []
-        for i in range(len(self.cameraInstances)):
-            if str(self.cameraInstances[i].__getattribute__("cameraID")) in self.sessionVideoFiles:
-                updatedCamObjects.append(self.cameraInstances[i])
+        for i in range(len(cameraInstances)):
+            if str(cameraInstances[i].__getattribute__("cameraID")) in self.sessionVideoFiles:
+                updatedCamObjects.append(cameraInstances[i])
 
         return updatedCamObjects
 
     def setCalibFileName(self, name):
         """
-        Sets custom file location for the calibration file. *.xcp
+        Sets custom file location for the calibration file. *.xcp, the cameras and the camera and image objects created
+        from them are loaded again on next access
         :param name: File Name
         :return: None
         """
         self.calibFileName = name
+        self.resetStage("cameraInstances")
 
     def setDataFileName(self,name):
         """
-        Sets custom file location for the data file. *.csv
+        Sets custom file location for the data file. *.csv, the data object is loaded again on next access
         :param name: File Name
         :return: None
         """
         self.dataFileName = name
+        self.resetStage("dataObject")
 
     def printSysteInfo(self):
         """
@@ -319,6 +707,7 @@ if __name__ == '__main__':
     # Get all the VICON camera instances
     camInstances = viconSystemData.cameraInstances
     printCalibInformation(camInstances)
+    viconSystemData.printLoadTimings()
 
     # create name for the annotation file
     dict = viconSystemData.generate2DAnnotationFileNames()
@@ -1,5 +1,13 @@
 import cv2 as cv
 import os
+import bisect
+import json
+import queue
+import shutil
+import subprocess
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from VICONMath import imageOperations as imageOp
 from VICONMath import transformations as transformationOp
 from VICONFileOperations import settingsGenerator
@@ -11,11 +19,397 @@ def setWindowName(path):
     windowName = windowName.split(".avi")[0]
     return windowName
 
+# Keyframe index of videos in which every frame is a keyframe (e.g. MJPEG), no frame list is stored
+allKeyframes = "all"
+
+
+def keyframeIndexFileName(path):
+    """
+    Name of the keyframe index cached next to the video
+    :param path: path of the video file
+    :return: str
+    """
+    return path + ".keyframes.json"
+
+
+def buildKeyframeIndex(path):
+    """
+    Find the keyframes of the video. Uses ffprobe (packet flags) if available; MJPEG videos only have keyframes.
+    :param path: path of the video file
+    :return: dict with frame numbers (list, display order) and timestamps (list, seconds from the first frame) of the
+             keyframes or with allKeyframes flag (all intra video), None if unknown
+    """
+    capture = cv.VideoCapture(path)
+    fourcc = int(capture.get(cv.CAP_PROP_FOURCC)).to_bytes(4, "little").decode("ascii", errors="ignore")
+    capture.release()
+
+    if fourcc.upper() == "MJPG":
+        return {"allKeyframes": True, "displayOrder": True}
+
+    ffprobe = shutil.which("ffprobe")
+    if ffprobe is None:
+        print("ffprobe not found, keyframe index not available for : ", path)
+        return None
+
+    command = [ffprobe, "-v", "error", "-select_streams", "v:0", "-show_entries", "packet=pts_time,flags",
+               "-of", "csv=print_section=0", path]
+    try:
+        output = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, check=True,
+                                universal_newlines=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        print("ffprobe failed, keyframe index not available for : ", path)
+        return None
+
+    # Packets are listed in decode order, the frame numbers follow the presentation timestamps (B frames)
+    timestamps = []
+    keyframeFlags = []
+    for line in output.splitlines():
+        entries = line.split(",")
+        if len(entries) < 2 or entries[0] in ("", "N/A"):
+            print("Packet without timestamp, keyframe index not available for : ", path)
+            return None
+        timestamps.append(float(entries[0]))
+        keyframeFlags.append("K" in entries[1])
+
+    if len(timestamps) == 0:
+        return None
+    timestamps = np.asarray(timestamps)
+    displayOrder = np.argsort(timestamps, kind="stable")
+    keyframes = np.flatnonzero(np.asarray(keyframeFlags)[displayOrder])
+    if len(keyframes) == 0 or keyframes[0] != 0:
+        return None
+
+    keyframeTimestamps = timestamps[displayOrder][keyframes] - timestamps[displayOrder[0]]
+    return {"frames": keyframes.tolist(), "timestamps": keyframeTimestamps.tolist(), "displayOrder": True}
+
+
+def loadKeyframeIndex(path):
+    """
+    Load the keyframe index cached next to the video, the index is (re)built if the video changed
+    :param path: path of the video file
+    :return: dict with sorted keyframe numbers and their timestamps, allKeyframes if every frame is a keyframe, None if
+             the index is not available
+    """
+    indexFile = keyframeIndexFileName(path)
+    fileStat = os.stat(path)
+
+    if os.path.exists(indexFile):
+        try:
+            with open(indexFile, "r") as file:
+                index = json.load(file)
+            # Indices without displayOrder were numbered in decode order
+            if (index.get("size") == fileStat.st_size and index.get("mtimeNs") == fileStat.st_mtime_ns and
+                    index.get("displayOrder", False)):
+                if index.get("allKeyframes", False):
+                    return allKeyframes
+                return {"frames": index["frames"], "timestamps": index["timestamps"]}
+        except (ValueError, KeyError):
+            print("Keyframe index corrupt, rebuild : ", indexFile)
+
+    index = buildKeyframeIndex(path)
+    if index is None:
+        return None
+
+    index["size"] = fileStat.st_size
+    index["mtimeNs"] = fileStat.st_mtime_ns
+    # Written to a temporary file first, readers never see a partially written index
+    temporaryFile = indexFile + ".tmp"
+    try:
+        with open(temporaryFile, "w") as file:
+            json.dump(index, file)
+        os.replace(temporaryFile, indexFile)
+    except OSError:
+        print("Keyframe index could not be written : ", indexFile)
+
+    if index.get("allKeyframes", False):
+        return allKeyframes
+    return {"frames": index["frames"], "timestamps": index["timestamps"]}
+
+
+def previousKeyframes(keyframes, frameNo, fps = 0, count = 1):
+    """
+    Nearest keyframes at or before the given frame, nearest first
+    :param keyframes: keyframe index (see loadKeyframeIndex)
+    :param frameNo: int
+    :param fps: frame rate of the video, used for the timestamps of all intra videos
+    :param count: maximum number of keyframes
+    :return: list of (keyframe no, timestamp in seconds or None)
+    """
+    if keyframes is allKeyframes:
+        return [(frameNo, frameNo / fps if fps > 0 else None)]
+    index = max(bisect.bisect_right(keyframes["frames"], frameNo) - 1, 0)
+    return [(keyframes["frames"][i], keyframes["timestamps"][i]) for i in range(index, max(index - count, -1), -1)]
+
+
+def previousKeyframe(keyframes, frameNo):
+    """
+    Nearest keyframe at or before the given frame
+    :param keyframes: keyframe index (see loadKeyframeIndex)
+    :param frameNo: int
+    :return: int
+    """
+    return previousKeyframes(keyframes, frameNo)[0][0]
+
+
+def seekCapture(capture, frameNo, timestamp = None):
+    """
+    Seek the capture to the timestamp (or the frame number) and check the position reported after the seek
+    :param capture: cv.VideoCapture
+    :param frameNo: int, frame returned by the next read after a correct seek
+    :param timestamp: seconds from the first frame, None to seek by frame number
+    :return: bool, True if the capture is at the frame
+    """
+    if timestamp is None or frameNo == 0:
+        capture.set(cv.CAP_PROP_POS_FRAMES, frameNo)
+    else:
+        capture.set(cv.CAP_PROP_POS_MSEC, 1000 * timestamp)
+    return int(round(capture.get(cv.CAP_PROP_POS_FRAMES))) == frameNo
+
+
+def seekToFrame(capture, frameNo, keyframes = None):
+    """
+    Position the capture such that the next read returns the given frame. With keyframe index the capture seeks to
+    the timestamp of the preceding keyframe and decodes forward with grab(). If the position reported after the seek is
+    off, earlier keyframes and finally the start of the video are used as previous good position to decode forward from.
+    :param capture: cv.VideoCapture
+    :param frameNo: int
+    :param keyframes: keyframe index (see loadKeyframeIndex) or None
+    :return: None
+    """
+    if keyframes is None:
+        candidates = [(frameNo, None)]
+    else:
+        candidates = previousKeyframes(keyframes, frameNo, capture.get(cv.CAP_PROP_FPS), count=3)
+
+    for keyframe, timestamp in candidates + [(0, None)]:
+        if seekCapture(capture, keyframe, timestamp):
+            break
+    else:
+        print("Capture position not verified after seek to frame : ", frameNo)
+
+    for skip in range(frameNo - keyframe):
+        capture.grab()
+
+
+def proxyFileName(path):
+    """
+    Name of the low resolution proxy of a video, saved next to the video
+    :param path: path of the video file
+    :return: str
+    """
+    return os.path.splitext(path)[0] + ".proxy.avi"
+
+
+def generateProxyVideo(path, scale = 0.25, overwrite = False):
+    """
+    Transcode the video once to a downscaled all intra (MJPEG) proxy for browsing
+    :param path: path of the video file
+    :param scale: scale of the proxy resolution w.r.t. the video
+    :param overwrite: bool, generate the proxy again even if it exists
+    :return: path of the proxy video
+    """
+    proxyPath = proxyFileName(path)
+    if os.path.exists(proxyPath) and not overwrite and os.path.getmtime(proxyPath) >= os.path.getmtime(path):
+        return proxyPath
+
+    capture = cv.VideoCapture(path)
+    if not capture.isOpened():
+        raise ValueError("Video could not be opened : " + path)
+    fps = capture.get(cv.CAP_PROP_FPS)
+    sourceFrameCount = int(capture.get(cv.CAP_PROP_FRAME_COUNT))
+    width = int(capture.get(cv.CAP_PROP_FRAME_WIDTH))
+    height = int(capture.get(cv.CAP_PROP_FRAME_HEIGHT))
+    proxySize = (max(int(round(width * scale)), 1), max(int(round(height * scale)), 1))
+    # Written to a temporary file (same extension for the writer), an interrupted run never leaves a truncated proxy
+    temporaryPath = os.path.splitext(proxyPath)[0] + ".tmp" + os.path.splitext(proxyPath)[1]
+    writer = cv.VideoWriter(temporaryPath, cv.VideoWriter_fourcc(*'MJPG'), fps if fps > 0 else 30, proxySize)
+
+    frameCount = 0
+    while True:
+        ret, frame = capture.read()
+        if not ret:
+            break
+        writer.write(cv.resize(frame, proxySize, interpolation=cv.INTER_AREA))
+        frameCount += 1
+
+    capture.release()
+    writer.release()
+    if frameCount != sourceFrameCount:
+        if os.path.exists(temporaryPath):
+            os.remove(temporaryPath)
+        raise ValueError("Proxy of " + path + " has " + str(frameCount) + " frames, the video has " +
+                         str(sourceFrameCount))
+    os.replace(temporaryPath, proxyPath)
+    print("Proxy generated : ", proxyPath, " frames : ", frameCount)
+    return proxyPath
+
+
+def generateProxyVideos(videoFiles, scale = 0.25, overwrite = False, noOfWorkers = None):
+    """
+    Generate the proxies of all videos in parallel, one process per video
+    :param videoFiles: list of video file paths
+    :param scale: scale of the proxy resolution w.r.t. the video
+    :param overwrite: bool, generate the proxies again even if they exist
+    :param noOfWorkers: number of processes, default number of videos
+    :return: list of proxy paths
+    """
+    if noOfWorkers is None:
+        noOfWorkers = max(len(videoFiles), 1)
+    with ProcessPoolExecutor(max_workers=noOfWorkers) as executor:
+        return list(executor.map(generateProxyVideo, videoFiles, [scale] * len(videoFiles),
+                                 [overwrite] * len(videoFiles)))
+
+
+class FrameCache:
+    """
+    LRU cache of decoded frames keyed by (video file, frame no) with a budget in bytes. Cached frames are read only, the
+    video objects return copies so the callers can draw on the images.
+    """
+    def __init__(self, maxBytes = 512 * 1024 * 1024):
+        """
+        Initialize the cache
+        :param maxBytes: memory budget for the cached frames
+        """
+        self.maxBytes = maxBytes
+        self.frames = OrderedDict()
+        self.currentBytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Returns cached frame and marks it as recently used
+        :param key: (video file, frame no)
+        :return: image (read only) or None
+        """
+        with self.lock:
+            frame = self.frames.get(key)
+            if frame is None:
+                self.misses += 1
+                return None
+            self.frames.move_to_end(key)
+            self.hits += 1
+            return frame
+
+    def put(self, key, frame):
+        """
+        Store a copy of the frame, least recently used frames are removed to stay within the budget
+        :param key: (video file, frame no)
+        :param frame: image
+        :return: None
+        """
+        if frame is None or frame.nbytes > self.maxBytes:
+            return
+        frame = frame.copy()
+        frame.flags.writeable = False
+        with self.lock:
+            previous = self.frames.pop(key, None)
+            if previous is not None:
+                self.currentBytes -= previous.nbytes
+            self.frames[key] = frame
+            self.currentBytes += frame.nbytes
+            while self.currentBytes > self.maxBytes:
+                _, removed = self.frames.popitem(last=False)
+                self.currentBytes -= removed.nbytes
+
+    def clear(self):
+        with self.lock:
+            self.frames.clear()
+            self.currentBytes = 0
+
+    def getStatistics(self):
+        """
+        :return: dict with hits, misses, number of frames and bytes in the cache
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "frames": len(self.frames), "bytes": self.currentBytes}
+
+
+# Cache shared by the interactive tools
+sharedFrameCache = FrameCache()
+
+
+class FramePrefetcher(threading.Thread):
+    """
+    Background thread decoding frames of a video ahead of the caller into a bounded queue. The thread owns its own
+    capture, short forward gaps are grabbed instead of decoded, longer gaps and backward jumps are seeked.
+    """
+    def __init__(self, path, frameNumbers, queueSize = 8, keyframes = None, maxGrabSkip = 30):
+        """
+        Initialize the thread
+        :param path: path of the video file
+        :param frameNumbers: increasing list of frame numbers to decode
+        :param queueSize: number of decoded frames kept ahead of the caller
+        :param keyframes: keyframe index (see loadKeyframeIndex) used for seeking, None to seek by frame number
+        :param maxGrabSkip: forward gaps up to this many frames are grabbed instead of seeked (as in VideoVicon.getFrame)
+        """
+        threading.Thread.__init__(self, daemon=True)
+        self.videoFilePath = path
+        self.frameNumbers = frameNumbers
+        self.keyframes = keyframes
+        self.maxGrabSkip = maxGrabSkip
+        self.frameQueue = queue.Queue(maxsize=queueSize)
+        self.stopEvent = threading.Event()
+
+    def put(self, item):
+        """
+        Put item in the queue, blocks while the queue is full (back pressure) unless the thread is stopped
+        :return: bool, False if the thread was stopped
+        """
+        while not self.stopEvent.is_set():
+            try:
+                self.frameQueue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self):
+        capture = cv.VideoCapture(self.videoFilePath)
+        try:
+            # Frame number returned by the next read of the capture, -1 if unknown
+            position = 0
+            for frameNo in self.frameNumbers:
+                if self.stopEvent.is_set():
+                    break
+                framesToSkip = frameNo - position
+                # Same rule as VideoVicon.getFrame, forward gaps within maxGrabSkip or the current group of pictures are
+                # grabbed, seeking would decode from the same keyframe again
+                if position >= 0 and 0 <= framesToSkip and (framesToSkip <= self.maxGrabSkip or (
+                        self.keyframes is not None and 0 <= previousKeyframe(self.keyframes, frameNo) < position)):
+                    for skip in range(framesToSkip):
+                        capture.grab()
+                else:
+                    seekToFrame(capture, frameNo, self.keyframes)
+                ret, frame = capture.read()
+                position = frameNo + 1 if ret else -1
+                if not self.put((frameNo, frame if ret else None)):
+                    break
+            self.put(None)
+        except Exception as error:
+            self.put(error)
+        finally:
+            capture.release()
+
+    def stop(self):
+        """
+        Stop decoding and wait until the capture of the thread is released
+        :return: None
+        """
+        self.stopEvent.set()
+        self.join()
+
+
 class VideoVicon:
     # todo : Global variable must have serialNo savedfor each object, so we can check declaration of same camera
-    def __init__(self, path, serialNo):
+    def __init__(self, path, serialNo, maxGrabSkip = 30, useKeyframeIndex = True, frameCache = None):
         """
         Initialization of class, gets path for the video files and return images
+        :param maxGrabSkip: forward jumps up to this many frames are done by grabbing frames instead of seeking
+        :param useKeyframeIndex: bool, seek with keyframe index (built on the first backward or long seek and cached
+                                 next to the video)
+        :param frameCache: FrameCache for decoded frames (e.g. sharedFrameCache), None to decode every request
         """
         if os.path.exists(path):
             self.videoFilePath = path
@@ -23,9 +417,27 @@ class VideoVicon:
             self.totalFrameCount = int(self.capture.get(cv.CAP_PROP_FRAME_COUNT))
             self.windowName = setWindowName(self.videoFilePath)
             self.objectID = serialNo
+            self.maxGrabSkip = maxGrabSkip
+            # Frame number returned by the next read of the capture, -1 if unknown
+            self.nextFrameNo = 0
+            self.useKeyframeIndex = useKeyframeIndex
+            self.keyframeIndex = None
+            self.keyframeIndexLoaded = False
+            self.frameCache = frameCache
         else:
             raise ValueError("Image path does not exist")
 
+    @property
+    def keyframes(self):
+        """
+        Keyframe index of the video, loaded (or built) on first access, i.e. on the first backward or long seek
+        :return: keyframe index (see loadKeyframeIndex) or None if not available
+        """
+        if self.useKeyframeIndex and not self.keyframeIndexLoaded:
+            self.keyframeIndex = loadKeyframeIndex(self.videoFilePath)
+            self.keyframeIndexLoaded = True
+        return self.keyframeIndex
+
 
     def getFrame(self, frameNo):
         """
@@ -35,19 +447,213 @@ class VideoVicon:
         """
        # capture = cv.VideoCapture(self.videoFilePath)
         # Sanity check for the given frame number
-        frameNo = np.floor(frameNo)
-        if frameNo <= self.totalFrameCount:
-            self.capture.set(cv.CAP_PROP_POS_FRAMES, frameNo)
-        else:
+        frameNo = int(np.floor(frameNo))
+        if frameNo > self.totalFrameCount:
             raise ValueError(" Frame no does not exist")
 
+        if self.frameCache is not None:
+            frame = self.frameCache.get((self.videoFilePath, frameNo))
+            if frame is not None:
+                return frame.copy()
+
+        framesToSkip = frameNo - self.nextFrameNo
+        # Forward access within the current group of pictures is also decoded forward, seeking would decode from the
+        # same keyframe again
+        if self.nextFrameNo >= 0 and 0 <= framesToSkip and (framesToSkip <= self.maxGrabSkip or
+                                                            0 <= self.keyframeBefore(frameNo) < self.nextFrameNo):
+            # Forward sequential access, grabbing is cheaper than seeking (re-decode from the previous keyframe)
+            for skip in range(framesToSkip):
+                self.capture.grab()
+        else:
+            seekToFrame(self.capture, frameNo, self.keyframes)
+
         ret, frame = self.capture.read()
+        self.nextFrameNo = frameNo + 1 if ret else -1
+        if ret and self.frameCache is not None:
+            self.frameCache.put((self.videoFilePath, frameNo), frame)
 
         return frame
 
+    def keyframeBefore(self, frameNo):
+        """
+        Nearest keyframe at or before the given frame
+        :param frameNo: int
+        :return: int, -1 if the keyframe index is not available
+        """
+        keyframes = self.keyframes
+        if keyframes is None:
+            return -1
+        return previousKeyframe(keyframes, frameNo)
+
+    def iterateFrames(self, startFrame = 0, endFrame = None, stepSize = 1, prefetch = 8, frameNumbers = None):
+        """
+        Streaming mode, decodes the frames on a background thread ahead of the caller
+        :param startFrame: first frame
+        :param endFrame: frame after the last frame (default: end of the video)
+        :param stepSize: step between frames
+        :param prefetch: number of frames decoded ahead
+        :param frameNumbers: increasing list of frames to decode instead of the range (e.g. annotated frames)
+        :return: generator of (frameNo, image), image is None if the frame could not be decoded
+        """
+        if endFrame is None or endFrame > self.totalFrameCount:
+            endFrame = self.totalFrameCount
+        if frameNumbers is None:
+            frameNumbers = range(int(startFrame), int(endFrame), int(stepSize))
+
+        frameNumbers = [int(frameNo) for frameNo in frameNumbers]
+        # The keyframe index is only needed if a gap (e.g. sparse annotated frames) is longer than maxGrabSkip
+        longSeek = len(frameNumbers) != 0 and np.max(np.diff([0] + frameNumbers)) > self.maxGrabSkip
+        prefetcher = FramePrefetcher(self.videoFilePath, frameNumbers, prefetch, self.keyframes if longSeek else None,
+                                     self.maxGrabSkip)
+        prefetcher.start()
+        try:
+            while True:
+                item = prefetcher.frameQueue.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            prefetcher.stop()
+
     def __del__(self):
         del self.capture
 
+class ProxyVideoVicon(VideoVicon):
+    """
+    Video object reading the low resolution proxy of a video for browsing. Frame numbers are the same as in the video,
+    the full resolution frame is only decoded on request.
+    """
+    def __init__(self, path, serialNo, frameCache = None):
+        """
+        Initialize the proxy reader
+        :param path: path of the full resolution video file, the proxy must exist (see generateProxyVideo)
+        :param serialNo: serial no of the camera
+        """
+        proxyPath = proxyFileName(path)
+        if not os.path.exists(proxyPath):
+            raise ValueError("Proxy video does not exist, generate the proxies first : " + proxyPath)
+        VideoVicon.__init__(self, proxyPath, serialNo, frameCache=frameCache)
+        self.fullResolutionPath = path
+        self.windowName = setWindowName(path)
+        self.fullResolutionVideo = None
+
+        capture = cv.VideoCapture(path)
+        fullSize = (capture.get(cv.CAP_PROP_FRAME_WIDTH), capture.get(cv.CAP_PROP_FRAME_HEIGHT))
+        fullFrameCount = int(capture.get(cv.CAP_PROP_FRAME_COUNT))
+        capture.release()
+        proxySize = (self.capture.get(cv.CAP_PROP_FRAME_WIDTH), self.capture.get(cv.CAP_PROP_FRAME_HEIGHT))
+        if fullFrameCount != self.totalFrameCount:
+            print("Warning: Proxy and video do not have same frame number : ", self.totalFrameCount, fullFrameCount)
+        # Scale from proxy coordinates to full resolution coordinates
+        self.scale = np.array([fullSize[0] / proxySize[0], fullSize[1] / proxySize[1]])
+
+    def getFullResolutionFrame(self, frameNo):
+        """
+        Returns the frame of the full resolution video
+        :param frameNo: Required frame no
+        :return: image
+        """
+        if self.fullResolutionVideo is None:
+            self.fullResolutionVideo = VideoVicon(self.fullResolutionPath, self.objectID, frameCache=self.frameCache)
+        return self.fullResolutionVideo.getFrame(frameNo)
+
+    def proxyToFullResolution(self, point):
+        """
+        Map image point (e.g. mouse click) from proxy to full resolution coordinates
+        :param point: [x,y] or array (...,2)
+        :return: array (...,2)
+        """
+        return imageOp.scaleImagePoints(point, self.scale)
+
+    def fullResolutionToProxy(self, point):
+        """
+        Map image point from full resolution to proxy coordinates
+        :param point: [x,y] or array (...,2)
+        :return: array (...,2)
+        """
+        return imageOp.scaleImagePoints(point, 1 / self.scale)
+
+
+class MultiCameraReader:
+    """
+    Synchronized reader for the videos of all cameras. Each camera has its own decode worker (single thread executor),
+    the frame of all cameras is decoded in parallel and returned as tuple in the order of the video objects.
+    """
+    def __init__(self, videoObjects, frameOffsets = None, checkFrameCount = True):
+        """
+        Initialize the reader
+        :param videoObjects: list of VideoVicon instances
+        :param frameOffsets: list of int, frame of camera j is (frameNo + frameOffsets[j]), default 0 for all cameras
+        :param checkFrameCount: bool, raise error if the cameras do not have the same number of (offset) frames
+        """
+        assert (len(videoObjects) != 0), "No video objects given for the reader"
+        if frameOffsets is None:
+            frameOffsets = [0] * len(videoObjects)
+        assert (len(frameOffsets) == len(videoObjects)), "Frame offset required for each video object"
+
+        self.videoObjects = videoObjects
+        self.frameOffsets = [int(offset) for offset in frameOffsets]
+        self.windowNames = [video.windowName for video in videoObjects]
+
+        # Number of synchronized frames, i.e. frames available for all cameras after applying the offsets
+        frameCounts = [video.totalFrameCount - offset for video, offset in zip(self.videoObjects, self.frameOffsets)]
+        if checkFrameCount and frameCounts.count(frameCounts[0]) != len(frameCounts):
+            raise ValueError("Video files do not have same frame number : " + str(frameCounts))
+        self.totalFrameCount = min(frameCounts)
+
+        # The capture of a video object is only used by its own worker
+        self.workers = [ThreadPoolExecutor(max_workers=1) for video in self.videoObjects]
+
+    def readFrame(self, cameraIndex, frameNo):
+        """
+        Decode the frame of one camera, frames outside the video return None
+        :param cameraIndex: int
+        :param frameNo: synchronized frame number
+        :return: image
+        """
+        videoFrameNo = int(frameNo) + self.frameOffsets[cameraIndex]
+        if videoFrameNo < 0 or videoFrameNo >= self.videoObjects[cameraIndex].totalFrameCount:
+            return None
+        return self.videoObjects[cameraIndex].getFrame(videoFrameNo)
+
+    def getFrames(self, frameNo):
+        """
+        Returns the images of all cameras for the given frame number
+        :param frameNo: synchronized frame number
+        :return: tuple of images
+        """
+        futures = [worker.submit(self.readFrame, cameraIndex, frameNo) for cameraIndex, worker in enumerate(self.workers)]
+        return tuple(future.result() for future in futures)
+
+    def iterateFrames(self, startFrame = 0, endFrame = None, stepSize = 1, prefetch = 8):
+        """
+        Streaming mode, every camera decodes its frames on a background thread ahead of the caller
+        :param startFrame: first frame
+        :param endFrame: frame after the last frame (default: end of the videos)
+        :param stepSize: step between frames
+        :param prefetch: number of frames decoded ahead per camera
+        :return: generator of (frameNo, tuple of images)
+        """
+        if endFrame is None or endFrame > self.totalFrameCount:
+            endFrame = self.totalFrameCount
+        startFrame = max(int(startFrame), -min(self.frameOffsets))
+
+        iterators = [video.iterateFrames(startFrame + offset, endFrame + offset, stepSize, prefetch)
+                     for video, offset in zip(self.videoObjects, self.frameOffsets)]
+        try:
+            for frameNo in range(startFrame, int(endFrame), int(stepSize)):
+                yield frameNo, tuple(next(iterator)[1] for iterator in iterators)
+        finally:
+            for iterator in iterators:
+                iterator.close()
+
+    def close(self):
+        for worker in self.workers:
+            worker.shutdown(wait=True)
+
+
 def makeEntryToFile(fileName, frameNo):
     assert (os.path.exists(fileName)), "File does no exist"
     file = open(fileName, 'a')
@@ -56,11 +662,13 @@ def makeEntryToFile(fileName, frameNo):
     file.close()
 
 
-def defineVideoFramesForAnnotation(settingsDict):
+def defineVideoFramesForAnnotation(settingsDict, useProxies = True):
     """
     Reads the settings dict and prepares the video files for annotation, i.e. allows the user to select good frames for annotation of features.
     The output is a file generated with name framesToCaptureFile.txt which will be followed by the annotation program to select frames for annotation.
     :param settingsDict: Dictionary
+    :param useProxies: bool, browse the low resolution proxies of the videos if they exist for all cameras (see
+                       generateProxyVideos)
     :return: None
     """
     videoFiles = settingsDict["videoFiles"]
@@ -85,13 +693,22 @@ def defineVideoFramesForAnnotation(settingsDict):
         file.close()
 
 
+    # The images of all cameras are combined, proxies are only used if all cameras have one (same image sizes)
+    if useProxies and not all(os.path.exists(proxyFileName(videoFile)) for videoFile in videoFiles):
+        print("Proxies missing for some cameras, full resolution videos are used")
+        useProxies = False
+
     for i in range(len(videoFiles)):
-        videoObjects.append(VideoVicon(videoFiles[i], i))
+        if useProxies:
+            videoObjects.append(ProxyVideoVicon(videoFiles[i], i, frameCache=sharedFrameCache))
+        else:
+            videoObjects.append(VideoVicon(videoFiles[i], i, frameCache=sharedFrameCache))
 
     #todo: Introduce a printed message for support of only two camera images
 
-    frameCount = videoObjects[0].totalFrameCount
-    frameCount2 = videoObjects[1].totalFrameCount
+    # Raises error if the video files do not have same frame number
+    reader = MultiCameraReader(videoObjects)
+    frameCount = reader.totalFrameCount
     cv.namedWindow("temp", cv.WINDOW_NORMAL)
     testImageName = ["testImage1", "testImage2"]
     testImage = False
@@ -100,19 +717,16 @@ def defineVideoFramesForAnnotation(settingsDict):
         cv.namedWindow(testImageName[0], cv.WINDOW_NORMAL)
         cv.namedWindow(testImageName[1], cv.WINDOW_NORMAL)
 
-    assert (frameCount == frameCount2), " Video files do not have same frame number"
     frameNo = 0
 
     # captureStatus= False
 
-    while 0<= frameNo <= frameCount:
-        images = []
-        for j in range(len(videoObjects)):
-            print("Frame No: ", frameNo)
-            image = videoObjects[j].getFrame(frameNo)
-            if testImage:
-                cv.imshow(testImageName[j], image)
-            images.append(image)
+    while 0<= frameNo < frameCount:
+        print("Frame No: ", frameNo)
+        images = reader.getFrames(frameNo)
+        if testImage:
+            for j in range(len(images)):
+                cv.imshow(testImageName[j], images[j])
 
         combinedImage = np.concatenate((images[0], images[1]), axis=1)
 
@@ -149,8 +763,56 @@ def defineVideoFramesForAnnotation(settingsDict):
             print("b : previous frame \n ")
             print("S : Enter frame status in log file \n ")
 
+    reader.close()
     print("Program terminated frame No/totalFrame : ", frameNo, "/", frameCount)
 
+def unitTest():
+    """
+    Compare random access getFrame with a sequential decode of an all intra (MJPEG) and an inter coded (XVID) video
+    :return: None
+    """
+    import tempfile
+
+    directory = tempfile.mkdtemp()
+    randomGenerator = np.random.RandomState(0)
+    for fourcc in ["MJPG", "XVID"]:
+        path = os.path.join(directory, "test_" + fourcc + ".avi")
+        writer = cv.VideoWriter(path, cv.VideoWriter_fourcc(*fourcc), 25, (64, 48))
+        for frameNo in range(120):
+            image = np.zeros((48, 64, 3), dtype=np.uint8)
+            cv.putText(image, str(frameNo), (2, 30), cv.FONT_HERSHEY_SIMPLEX, 0.7, (255, 255, 255), 2)
+            writer.write(image)
+        writer.release()
+
+        capture = cv.VideoCapture(path)
+        sequentialFrames = []
+        while True:
+            ret, frame = capture.read()
+            if not ret:
+                break
+            sequentialFrames.append(frame)
+        capture.release()
+
+        video = VideoVicon(path, 0, maxGrabSkip=3)
+        frameNumbers = randomGenerator.randint(0, len(sequentialFrames), 40)
+        same = all(np.array_equal(video.getFrame(frameNo), sequentialFrames[frameNo]) for frameNo in frameNumbers)
+        print(fourcc, " keyframe index : ", "all" if video.keyframes is allKeyframes else video.keyframes,
+              " random access same as sequential decode : ", same)
+
+        # Sparse streaming, long gaps are seeked and short gaps grabbed by the prefetch thread
+        frameNumbers = sorted(set(randomGenerator.randint(0, len(sequentialFrames), 12).tolist()))
+        same = all(np.array_equal(frame, sequentialFrames[frameNo]) for frameNo, frame in
+                   video.iterateFrames(frameNumbers=frameNumbers))
+        print(fourcc, " sparse iterateFrames same as sequential decode : ", same)
+
+        # Seek through the timestamp of a keyframe
+        capture = cv.VideoCapture(path)
+        seekToFrame(capture, 97, {"frames": [0, 50], "timestamps": [0.0, 2.0]} if fourcc == "MJPG" else
+                    {"frames": [0], "timestamps": [0.0]})
+        print(fourcc, " keyframe seek same as sequential decode : ",
+              np.array_equal(capture.read()[1], sequentialFrames[97]))
+        capture.release()
+
 def main(settingsFile):
     # Example will use this class to make small application of viewing the video files
     settingsObject = settingsGenerator.xmlSettingsParser(settingsFile)